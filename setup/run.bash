@@ -1,10 +1,12 @@
 #!/usr/bin/env bash
 
-VIRTUAL_ENV=${VIRTUAL_ENV:-$(poetry env info -p 2>/dev/null || find . -type d -name '*venv' -exec realpath {} \;)}
+# A virtual env in the project dir is preferred to asking poetry, which takes longer to start than the app itself
+VIRTUAL_ENV=${VIRTUAL_ENV:-$(find . -maxdepth 2 -type d -name '*venv' -exec realpath {} \; | head -1)}
+VIRTUAL_ENV=${VIRTUAL_ENV:-$(poetry env info -p 2>/dev/null)}
 
 if [ -d "$VIRTUAL_ENV" ]; then
-  PACKAGES_DIR="$(find "$VIRTUAL_ENV" -type d -name site-packages | tail -1)"
-  DEPENDENCIES="$(realpath "$PACKAGES_DIR")"
+  PACKAGES_DIR="$(ls -d "$VIRTUAL_ENV"/lib/python*/site-packages 2>/dev/null | tail -1)"
+  DEPENDENCIES="$(realpath "${PACKAGES_DIR:-$(find "$VIRTUAL_ENV" -type d -name site-packages | tail -1)}")"
   PYTHON_BIN="$VIRTUAL_ENV/bin/python"
 
 else
@@ -14,4 +16,4 @@ else
 fi
 
 [ ! -e .env ] && eval PYTHONPATH="$DEPENDENCIES:src" "$PYTHON_BIN" setup/dotenv-from-toml.py > .env
-eval PYTHONPATH="$DEPENDENCIES:src" "$PYTHON_BIN" -m app
+PYTHONPATH="$DEPENDENCIES:src" exec "$PYTHON_BIN" -m app "$@"
@@ -0,0 +1,49 @@
+"""Collection agent, serving the snapshots of its host to a gateway
+
+A gateway (see app.Gateway) keeps one agent running per host, as in `ssh <host> ... bash setup/run.bash --agent`,
+and requests collections over the agent stdin: each request line is answered by one JSON line on stdout. The
+Collector is kept between requests, so probes keep their open files, counters and nvidia-smi stream.
+"""
+from json import dumps
+from sys import stdin as _stdin, stdout as _stdout
+
+from .Collector import Collector
+
+REQUEST = 'collect'
+
+
+def serve(collector: Collector, stdin=None, stdout=None, device: str = None) -> int:
+    """Answer collection requests until stdin is closed
+
+    Answers are the data points of Collector.data with the device name, as in {'device': 'host1', 'cpu': ...},
+    or {'error': '<message>'} if the request is unknown or the collection fails.
+
+    Args:
+        collector (Collector): Collector of this host
+        stdin (file, optional): Requests, one per line, defaults to sys.stdin
+        stdout (file, optional): Answers, one per line, defaults to sys.stdout
+        device (str, optional): Device name to answer with, instead of collector.device (i.e.: stand-in hosts)
+
+    Returns:
+        (int): Number of requests answered
+    """
+    stdin = stdin or _stdin
+    stdout = stdout or _stdout
+
+    answered = 0
+    for line in stdin:
+        request = line.strip()
+        if request != REQUEST:
+            answer = {'error': f'unknown request {request!r}: use {REQUEST!r}'}
+
+        else:
+            try:
+                answer = {**collector.data, 'device': device or collector.device}
+            except Exception as e:  # reported by the gateway for this host, while the agent keeps serving
+                answer = {'error': str(e) or type(e).__name__}
+
+        stdout.write(dumps(answer, separators=(',', ':'), default=str) + '\n')
+        stdout.flush()
+        answered += 1
+
+    return answered
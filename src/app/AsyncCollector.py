@@ -0,0 +1,264 @@
+"""Collector running its probes as tasks of an asyncio event loop
+
+Commands are started with asyncio.create_subprocess_exec, without a shell, and procfs and sysfs files are read
+in the loop, as they are served from kernel memory. Each probe runs within an asyncio.wait_for deadline, so one
+loop hosts every probe, and the Kafka delivery reports, with no thread per probe.
+"""
+from asyncio import (
+    CancelledError,
+    TimeoutError as AsyncTimeoutError,
+    create_subprocess_exec,
+    create_task,
+    gather,
+    to_thread,
+    wait_for,
+)
+from glob import glob
+from subprocess import DEVNULL, PIPE
+from time import monotonic, time
+
+from .Collector import Collector
+from .config import (
+    CAT_CMD_PATH,
+    NVIDIA_CMD_PATH,
+    SENSORS_CMD_PATH,
+)
+from .Nvidia import parse_line, query_args
+from .Probes import Probe
+from .Readers import (
+    FileReader,
+    HwmonReader,
+    ThermalZonesReader,
+    HWMON_ROOT,
+    NET_DEV_PATH,
+    THERMAL_ROOT,
+)
+
+
+class AsyncCollector(Collector):
+    async def collect(self) -> dict:
+        """Retrieve all available data points from the probes in the registry, as Collector.data does
+
+        Due probes run concurrently as tasks of the running loop. Probes past their deadline are cancelled,
+        which kills the commands they started. Probes with a blocking method run in threads of the loop,
+        and cannot be interrupted: their threads are left to return, and the probes skipped until then.
+        """
+        self._log('Start data retrieval')
+
+        if (time() - self._last_probe['epoch']) < self.cache_sec:
+            self._log(f'Return recent data (queried less than {self.cache_sec} seconds ago)')
+            return self._last_probe
+
+        checkpoint = monotonic()
+
+        submitted = []
+        for probe in self.probes.values():
+            if probe.running:
+                self._log(f'Skip probe {probe.name!r}: its previous run did not return yet', 30)
+                continue
+
+            if not probe.due(checkpoint):
+                continue
+
+            probe.started_at = checkpoint
+            probe.future = create_task(probe.run_async(), name=f'probe-{probe.name}')
+            submitted.append(probe)
+
+        await gather(*(self._wait_for_async(probe) for probe in submitted))
+
+        return self._merge_probes(checkpoint)
+
+    def _default_probes(self) -> list:
+        methods = {
+            'sensors': self._probe_lm_sensors_async,
+            'thermal_zones': self._fetch_thermal_zones_async,
+            'nvidia': self._probe_nvidia_gpu_async,
+            'net': self._fetch_networks_async,
+            'storage': self._shutil_storage_use,  # in a thread: statvfs blocks on unresponsive mounts (i.e.: NFS)
+            'cpu_usage': self._psutil_cpu_general_usage_async,
+            'cpu_usage_detail': self._psutil_cpu_usage_detail_async,
+            'ram_usage': self._psutil_memory_usage_async,
+            'samples': self._sample_aggregates_async,
+        }
+
+        return [(name, methods[name], label, merge) for name, _, label, merge in super()._default_probes()]
+
+    async def _wait_for_async(self, probe: Probe):
+        try:
+            res = await wait_for(probe.future, timeout=max(probe.started_at + probe.timeout_sec - monotonic(), 0))
+        except AsyncTimeoutError:
+            probe.stats.timeouts += 1
+            self._log(f'Task {probe.label!r} ({probe.name}) exceeded its {probe.timeout_sec} seconds deadline', 30)
+            return
+        except CancelledError:
+            raise
+        except Exception as e:
+            probe.stats.errors += 1
+            self._log(f'Task {probe.label!r} raised an exception: {e}', 30)
+            return
+
+        if not res:
+            self._log(f'No data from {probe.label}')
+
+        probe.update(res or {})
+
+    async def _probe_lm_sensors_async(self) -> dict:
+        """Data from hwmon sensors, as lm-sensors reports them, or from the sensors command if none can be read"""
+        self._log('Start sensors probe')
+
+        names = tuple(key for keys in self.SENSOR_KEYS.values() for key in keys)
+
+        try:
+            if not self._hwmon:
+                self._hwmon = HwmonReader(HWMON_ROOT, names=names)
+
+            data = self._hwmon.read()
+            if not data:
+                raise OSError('no hwmon data')
+
+        except OSError as e:
+            self._log(f'Could not read hwmon sensors in-process: {e}. Fallback to {SENSORS_CMD_PATH}')
+
+            try:
+                data = self._parse_sensors(await self._exec([SENSORS_CMD_PATH]))
+                if not data:
+                    raise OSError('no sensors data')
+
+            except OSError as e:
+                if 'not found' in str(e):
+                    e = 'update variable SENSORS_CMD_PATH in the env.toml file and then check .env'
+                raise OSError(f'Could not probe sensors: install lm-sensors, if possible\n{e}')
+
+        return self._group_sensors(data)
+
+    async def _fetch_thermal_zones_async(self) -> dict:
+        """Data from CPU thermal zones (cores), catted only if the zone files cannot be opened"""
+        self._log('Start thermal zone fetch')
+
+        try:
+            if not self._thermal_zones:
+                self._thermal_zones = ThermalZonesReader(THERMAL_ROOT)
+
+            data = self._thermal_zones.read()
+
+        except OSError as e:
+            self._log(f'Could not read thermal zones in-process: {e}. Fallback to {CAT_CMD_PATH}')
+
+            try:
+                lines = await self._exec([CAT_CMD_PATH, *sorted(glob(f'{THERMAL_ROOT}/thermal_zone*/temp'))])
+                if not lines:
+                    raise OSError('no thermal zone data')
+
+            except OSError as e:
+                if 'not found' in str(e):
+                    e = 'update variable CAT_CMD_PATH in the env.toml file and then check .env'
+                raise OSError(f'Could not fetch thermal zones: hardware may not report thermal zones\n{e}')
+
+            data = [round(float(t) / 1000, 3) for t in lines]
+
+        self._log(f'Fetched data: {data}')
+
+        res = {'cpu': data} if data else {}
+        return res
+
+    async def _probe_nvidia_gpu_async(self) -> dict:
+        """Data of every GPU from the nvidia modules, from the nvidia-smi stream or from a single call"""
+        self._log('Start nvidia probe')
+
+        try:
+            if self._nvidia and self._nvidia.ready:
+                data = self._nvidia.read()
+
+            elif self._nvidia:  # (re)started: wait for its first report in a thread
+                data = await to_thread(self._nvidia.read, timeout=self._probe_timeout('nvidia') / 2)
+
+            else:
+                data = {}
+                for line in await self._exec(query_args(NVIDIA_CMD_PATH)):
+                    data.update(parse_line(line))
+
+            if not data:
+                raise OSError('no nvidia data')
+
+        except OSError as e:
+            if 'not found' in str(e) or isinstance(e, FileNotFoundError):
+                e = 'update variable NVIDIA_CMD_PATH (nvidia-smi) in the env.toml file and then check .env'
+            raise OSError(f'Could not probe nvidia: install nvidia-smi, if compatible\n{e}')
+
+        self._log(f'Fetched data: {data}')
+
+        res = {'gpu': data}
+        return res
+
+    async def _fetch_networks_async(self) -> dict:
+        """Data from network devices, as Collector._fetch_networks returns"""
+        self._log('Start network devices fetch')
+
+        try:
+            if not self._net_dev:
+                self._net_dev = FileReader(NET_DEV_PATH)
+
+            lines = self._net_dev.read().splitlines()
+
+        except OSError as e:
+            self._log(f'Could not read {NET_DEV_PATH} in-process: {e}. Fallback to {CAT_CMD_PATH}')
+
+            try:
+                lines = await self._exec([CAT_CMD_PATH, NET_DEV_PATH])
+
+            except OSError as e:
+                if 'not found' in str(e):
+                    e = 'update variable CAT_CMD_PATH in the env.toml file and then check .env'
+                raise OSError(f'Could not fetch network devices: hardware may not report via /proc\n{e}')
+
+        return self._parse_networks(lines)
+
+    async def _psutil_cpu_general_usage_async(self) -> dict:
+        """CPU usage, from the sampler shared with the detail probe"""
+        return self._psutil_cpu_general_usage()
+
+    async def _psutil_cpu_usage_detail_async(self) -> dict:
+        """Detailed CPU usage, from the sampler shared with the general usage probe"""
+        return self._psutil_cpu_usage_detail()
+
+    async def _psutil_memory_usage_async(self) -> dict:
+        """RAM usage, read from /proc/meminfo"""
+        return self._psutil_memory_usage()
+
+    async def _sample_aggregates_async(self) -> dict:
+        """Aggregates of the metrics sampled since the previous collection, kept in memory"""
+        return self._sample_aggregates()
+
+    @staticmethod
+    async def _exec(args: list) -> list:
+        """Run a command without a shell, killed if the probe running it is cancelled
+
+        Args:
+            args (list): Command and arguments, as in ['/usr/bin/sensors']
+
+        Returns:
+            (list): Non-empty stdout lines
+
+        Raises:
+            OSError: If the command is not found or exits with an error
+        """
+        try:
+            proc = await create_subprocess_exec(*args, stdin=DEVNULL, stdout=PIPE, stderr=PIPE)
+        except FileNotFoundError:
+            raise OSError(f'{args[0]}: not found. Declare paths in env.toml and check the .env file.')
+
+        try:
+            stdout, stderr = await proc.communicate()
+        except CancelledError:  # deadline exceeded
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            raise
+
+        if proc.returncode:
+            err = stderr.decode(errors='replace').strip().split('\n')
+            raise OSError(err[-1].strip() or f'{args[0]} exited with code {proc.returncode}')
+
+        return [line for line in stdout.decode(errors='replace').strip().split('\n') if line]
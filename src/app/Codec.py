@@ -0,0 +1,308 @@
+"""Wire formats for telemetry messages
+
+Messages are either JSON (the default) or MessagePack (the binary format). Binary messages start with a header
+naming their codec, so consumers tell them apart from JSON (which never starts with a NUL byte) and decode both.
+This module only depends on msgpack, a C extension, to be shared by publishers and consumers.
+
+Messages of a same key may also be framed as keyframes and deltas: a delta holds only the fields that
+changed since its keyframe, and names it by the keyframe timestamp (see DeltaEncoder and DeltaDecoder).
+
+Snapshots (see Snapshot) are read-only views of a message: publishers build one per collection over the probed
+data points, and consumers over each decoded message, with no copy. Messages and data points are never mutated
+once built, so keyframes and rebuilt messages share their unchanged values instead of copying them.
+"""
+from collections.abc import Mapping
+from json import dumps, loads
+from struct import Struct
+
+from msgpack import packb, unpackb
+
+ENCODINGS = ('json', 'binary')
+
+MAGIC = 0x00
+MSGPACK = 0x02  # 0x01 was a pure Python codec, retired
+HEADER = Struct('!BB')  # magic, codec
+
+FRAME = '_frame'
+
+
+class Snapshot(Mapping):
+    __slots__ = ('epoch', 'device', 'collected_at', 'points')
+
+    RESERVED = ('epoch', 'device', 'collected_at')  # fields of the snapshot, left out of its data points
+
+    def __init__(self, epoch: float, device: str = None, collected_at: str = None, points: dict = None):
+        """Data points of a device at a time, as published in one message
+
+        The message is {'device': ..., 'collected_at': ..., **points}, without the epoch, sent as the message
+        timestamp. Points are referenced, not copied, and RESERVED names in points are skipped.
+
+        Args:
+            epoch (float): Collection time, in seconds
+            device (str, optional): Device name, left out of the message if None
+            collected_at (str, optional): Collection time, as in '2024-11-01 10:00:00 +00:00', left out if None
+            points (dict, optional): Data points, as in {'cpu': {'usage': 1.0}, 'net': {...}}
+        """
+        self.epoch = epoch
+        self.device = device
+        self.collected_at = collected_at
+        self.points = points if points is not None else {}
+
+    @classmethod
+    def from_message(cls, message: dict, epoch: float) -> 'Snapshot':
+        """View a message (i.e.: decoded, or as in {'epoch': ..., 'cpu': ...}) as a snapshot, with no copy
+
+        Args:
+            message (dict): Message, with its device and collected_at, if any
+            epoch (float): Message time, in seconds (i.e.: its Kafka timestamp)
+
+        Returns:
+            (Snapshot): Snapshot over the message
+        """
+        return cls(epoch, message.get('device'), message.get('collected_at'), message)
+
+    @property
+    def timestamp(self) -> int:
+        """Epoch in milliseconds, as the Kafka message timestamp"""
+        return int(self.epoch * 10 ** 3)
+
+    def get(self, key: str, default=None):
+        """Value of a message field (i.e.: 'device', or a data point), or default if missing"""
+        if key in self.RESERVED:
+            return self[key] if key in self else default
+        return self.points.get(key, default)
+
+    def as_dict(self) -> dict:
+        """Message as a dict, only copying the top level"""
+        return dict(self._pairs())
+
+    def _pairs(self) -> iter:  # message fields and values, with no view over them as items() builds
+        if self.device is not None:
+            yield 'device', self.device
+        if self.collected_at is not None:
+            yield 'collected_at', self.collected_at
+
+        for key, val in self.points.items():
+            if key not in self.RESERVED:
+                yield key, val
+
+    def __getitem__(self, key: str):
+        if key == 'device' and self.device is not None:
+            return self.device
+        if key == 'collected_at' and self.collected_at is not None:
+            return self.collected_at
+        if key in self.RESERVED:
+            raise KeyError(key)
+        return self.points[key]
+
+    def __iter__(self) -> iter:
+        return (key for key, _ in self._pairs())
+
+    def __len__(self) -> int:
+        reserved = sum(1 for key in self.RESERVED if key in self.points)
+        return len(self.points) - reserved + (self.device is not None) + (self.collected_at is not None)
+
+    def __repr__(self) -> str:
+        return f'Snapshot(epoch={self.epoch!r}, {self.as_dict()!r})'
+
+
+def encode(message: dict, encoding: str = 'json') -> bytes:
+    """Encode a message
+
+    Args:
+        message (dict or Snapshot): Message to be encoded
+        encoding (str, optional): One of ENCODINGS
+
+    Returns:
+        (bytes): Encoded message
+
+    Raises:
+        ValueError: If the encoding is unknown
+    """
+    if isinstance(message, Snapshot):
+        message = message.as_dict()
+
+    if encoding == 'json':
+        return dumps(message, separators=(',', ':'), default=str).encode()
+
+    if encoding == 'binary':
+        return HEADER.pack(MAGIC, MSGPACK) + packb(message, default=str)
+
+    raise ValueError(f'Unknown encoding {encoding!r}: use one of {ENCODINGS}')
+
+
+def decode(value: bytes) -> dict:
+    """Decode a message in any of the ENCODINGS
+
+    Args:
+        value (bytes): Encoded message, as consumed from Kafka
+
+    Returns:
+        (dict): Decoded message
+
+    Raises:
+        ValueError: If the message is corrupted, or binary in an unknown codec
+    """
+    if not value or value[0] != MAGIC:
+        return loads(value.decode(errors='replace'))
+
+    _, codec = HEADER.unpack_from(value)
+    if codec != MSGPACK:
+        raise ValueError(f'Unknown binary codec #{codec}: update the consumer')
+
+    try:
+        return unpackb(value[HEADER.size:], raw=False, strict_map_key=False)
+    except (ValueError, TypeError) as e:  # msgpack errors, as ExtraData and FormatError, are ValueErrors
+        raise ValueError(f'Corrupted binary message: {e}')
+
+
+class DeltaEncoder:
+    def __init__(self, keyframe_every: int = 10):
+        """Frame the messages of a same key as keyframes and deltas
+
+        Deltas are computed against the last keyframe, not the previous message, so a lost delta does not
+        corrupt the next ones. Keyframes are kept as referenced, as messages are not mutated once framed.
+
+        Args:
+            keyframe_every (int, optional): Send a full keyframe every keyframe_every messages
+        """
+        self.keyframe_every = keyframe_every
+        self._keyframe = None
+        self._keyframe_id = None
+        self._counter = 0
+
+    def frame(self, message: dict, timestamp: int) -> dict:
+        """Frame a message as a keyframe or as a delta
+
+        Args:
+            message (dict or Snapshot): Full message, left untouched
+            timestamp (int): Message timestamp, in milliseconds, to identify keyframes
+
+        Returns:
+            (dict): Keyframe, as in {'_frame': {'id': timestamp}, ...message}, or delta,
+                as in {'_frame': {'base': keyframe timestamp, 'unset': [['net', 'eth1']]}, ...changed fields}
+        """
+        if isinstance(message, Snapshot):
+            message = message.as_dict()
+
+        if self._keyframe is None or self._counter % self.keyframe_every == 0:
+            self._keyframe = message
+            self._keyframe_id = timestamp
+            self._counter = 1
+            return {FRAME: {'id': timestamp}, **message}
+
+        self._counter += 1
+        changed, unset = _diff(self._keyframe, message)
+
+        header = {'base': self._keyframe_id}
+        if unset:
+            header['unset'] = unset
+
+        return {FRAME: header, **changed}
+
+
+class DeltaDecoder:
+    def __init__(self, keep: int = 4, keyframes: dict = None):
+        """Rebuild full messages from keyframes and deltas, per key
+
+        Deltas may be consumed before their keyframe, as messages replayed from a spool: these are buffered
+        until their keyframe arrives, and then rebuilt into self.released.
+
+        Args:
+            keep (int, optional): Keyframes kept per key, for deltas replayed late (i.e.: from a spool),
+                and keyframes waited for per key, for deltas replayed before them
+            keyframes (dict, optional): Keyframes by timestamp, by key, as kept in self.keyframes by a previous decoder
+        """
+        self.keep = keep
+        self.keyframes = keyframes or {}
+        self.pending = {}  # key: {keyframe timestamp: [(tag, header, delta)]}, of deltas waiting for their keyframe
+        self.released = []  # (tag, message) of buffered deltas rebuilt by the last keyframe, to be cleared by readers
+
+    def rebuild(self, key: str, message: dict, tag=None) -> dict:
+        """Rebuild a full message
+
+        Args:
+            key (str): Message key, as in the host name
+            message (dict): Decoded message, framed or not
+            tag (optional): Kept along with a delta buffered for its keyframe, and released with it
+                (i.e.: the message timestamp)
+
+        Returns:
+            (dict): Full message without its frame, or None for a delta whose keyframe was not seen (yet). Values
+                not changed since the keyframe are shared with it: rebuilt messages are not to be mutated
+        """
+        header = message.pop(FRAME, None)
+        if header is None:
+            return message
+
+        keyframes = self.keyframes.setdefault(key, {})
+
+        if 'id' in header:
+            keyframes[header['id']] = message
+            for old in sorted(keyframes)[:-self.keep]:
+                del keyframes[old]
+
+            waiting = self.pending.get(key)
+            if waiting and header['id'] in waiting:
+                self.released += [
+                    (delta_tag, _rebuilt(message, delta_header, delta))
+                    for delta_tag, delta_header, delta in waiting.pop(header['id'])
+                ]
+            return message
+
+        keyframe = keyframes.get(header.get('base'))
+        if keyframe is None:
+            waiting = self.pending.setdefault(key, {})
+            waiting.setdefault(header.get('base'), []).append((tag, header, message))
+            for old in sorted(waiting)[:-self.keep]:
+                del waiting[old]
+            return None
+
+        return _rebuilt(keyframe, header, message)
+
+
+def _rebuilt(keyframe: dict, header: dict, delta: dict) -> dict:
+    rebuilt = _patched(keyframe, delta)
+    for path in header.get('unset', []):
+        _unset(rebuilt, path)
+    return rebuilt
+
+
+def _diff(base: dict, current: dict) -> tuple:
+    changed = {}
+    unset = []
+
+    for key, val in current.items():
+        previous = base.get(key)
+
+        if isinstance(val, dict) and isinstance(previous, dict):
+            sub_changed, sub_unset = _diff(previous, val)
+            if sub_changed:
+                changed[key] = sub_changed
+            unset += [[key] + path for path in sub_unset]
+
+        elif key not in base or previous != val:
+            changed[key] = val
+
+    unset += [[key] for key in base if key not in current]
+    return changed, unset
+
+
+def _patched(base: dict, changed: dict) -> dict:
+    patched = dict(base)  # copied along the changed paths only, other values are shared with base
+    for key, val in changed.items():
+        previous = patched.get(key)
+        patched[key] = _patched(previous, val) if isinstance(val, dict) and isinstance(previous, dict) else val
+
+    return patched
+
+
+def _unset(target: dict, path: list):
+    parent = target  # a copy, whose nested dicts are copied along the path before being changed
+    for key in path[:-1]:
+        child = parent.get(key)
+        if not isinstance(child, dict):
+            return
+        parent[key] = parent = dict(child)
+
+    parent.pop(path[-1], None)
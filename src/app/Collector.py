@@ -4,94 +4,315 @@ Description
 
 todo: test `hwinfo --sensors`
 """
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from copy import deepcopy
-from psutil import cpu_percent, virtual_memory, disk_partitions
+from json import dumps
+from pathlib import Path
+from psutil import virtual_memory, disk_partitions
+from os import killpg
 from shutil import disk_usage
-from subprocess import run
+from signal import SIGKILL
+from subprocess import Popen, PIPE, TimeoutExpired
 from re import sub
-from time import time
+from time import monotonic, time
 
 from .config import (
+    COLLECTOR_WORKERS,
+    CPU_SAMPLE_MIN_WINDOW_SEC,
+    CPU_USAGE_DETAIL,
+    CPU_USAGE_PER_CORE,
+    NET_RAW_COUNTERS,
     HOSTNAME_CMD_PATH,
     GREP_CMD_PATH,
     CAT_CMD_PATH,
     SENSORS_CMD_PATH,
     NVIDIA_CMD_PATH,
+    NVIDIA_STREAM_MS,
+    PARTITIONS_REFRESH_SEC,
+    PROBE_INTERVALS,
+    PROBE_META,
+    PROBE_STATS_PATH,
+    PROBE_TIMEOUT_SEC,
+    PROBE_TIMEOUTS,
+    SAMPLE_BUFFER_SIZE,
+    SAMPLE_INTERVAL_SEC,
+    SAMPLE_METRICS,
 )
+from .Nvidia import NvidiaSmiStream, parse_line, query_args
+from .Probes import Probe
+from .Readers import (
+    FileReader,
+    HwmonReader,
+    ThermalZonesReader,
+    hostname,
+    parse_net_dev,
+    HWMON_ROOT,
+    NET_DEV_FIELDS,
+    NET_DEV_PATH,
+    THERMAL_ROOT,
+)
+from .Samplers import CpuSampler, HighFrequencySampler
 
 
 class Collector:
     TEMPLATE = {'temperature': None, 'method': None, 'source': None}
-
-    def __init__(self, logger=None):
+    SENSOR_KEYS = {  # data point: sensor labels, as reported by lm-sensors, or chip names (see HwmonReader)
+        'cpu': ('Package id 0', 'Tctl', 'CPU', 'coretemp'),
+        'gpu': ('GPU', 'GPU temp', 'edge'),
+    }
+    SENSOR_FILTERS = ('Package', 'Tctl', 'CPU', 'GPU', 'edge')  # lines kept from the sensors command output
+    NET_SKIP = ('lo', 'podman', 'podman0', 'docker', 'docker0', 'veth0')
+
+    def __init__(
+            self, logger=None, cache_sec: float = 20, workers: int = COLLECTOR_WORKERS, streaming: bool = False,
+            meta: bool = PROBE_META, stats_path: Path = PROBE_STATS_PATH, sample_metrics: list = SAMPLE_METRICS,
+    ):
+        """Instantiate the data collector
+
+        The Collector owns its worker threads and the probes' state (open files, previous counters,
+        discovered devices) for its whole life, so call close() when it is no longer needed.
+
+        Args:
+            logger (logging.Logger, optional): Logger to send debug and warning messages to
+            cache_sec (float, optional): Seconds during which a previous probe is returned instead of a new one
+            workers (int, optional): Threads running probes concurrently
+            streaming (bool, optional): Keep long-lived tool processes reporting in loop (i.e.: nvidia-smi),
+                which pays off only if the Collector probes more than once
+            meta (bool, optional): Add the probe stats to the snapshot, in a '_meta' section
+            stats_path (Path, optional): JSON file to write the probe stats to after each collection
+            sample_metrics (list, optional): In streaming mode, metrics to sample every SAMPLE_INTERVAL_SEC
+                between collections, and to publish as aggregates in a 'samples' section (see HighFrequencySampler)
+        """
         self.logger = logger
+        self.cache_sec = cache_sec
+        self.meta = meta
+        self.stats_path = stats_path
         self._last_cpu_data = deepcopy(self.TEMPLATE)
         self._last_gpu_data = deepcopy(self.TEMPLATE)
         self._last_probe = {'epoch': 0}
 
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='probe')
+        self._thermal_zones = None
+        self._hwmon = None
+        self._net_dev = None
+        self._partitions = {'at': None, 'mountpoints': []}
+        self._nvidia = NvidiaSmiStream(NVIDIA_CMD_PATH, NVIDIA_STREAM_MS) if streaming else None
+        self._cpu_sampler = CpuSampler(min_window_sec=CPU_SAMPLE_MIN_WINDOW_SEC, per_core=CPU_USAGE_PER_CORE)
+        self._sampler = None
+        if streaming and sample_metrics:
+            self._sampler = HighFrequencySampler(
+                sample_metrics, interval_sec=SAMPLE_INTERVAL_SEC, size=SAMPLE_BUFFER_SIZE,
+                hwmon_names=tuple(key for keys in self.SENSOR_KEYS.values() for key in keys), net_skip=self.NET_SKIP,
+                thermal_root=THERMAL_ROOT, hwmon_root=HWMON_ROOT, net_dev_path=NET_DEV_PATH,
+            )
+            for metric in self._sampler.unavailable:
+                self._log(f'Could not sample {metric!r}: its source cannot be read in-process', 30)
+
+        self.probes = {}
+        self._register_default_probes()
+
         self.device = None
         self._identify()
 
     @property
     def data(self) -> dict:
-        """Retrieve all available CPU and GPU temperatures"""
+        """Retrieve all available data points from the probes in the registry
+
+        Only the probes that are due run, each one within its own deadline. Probes past their deadline are
+        skipped, and not run again until their pending run returns. The snapshot is built from the freshest
+        value of each probe, so probes with longer intervals publish their cached values.
+        """
         self._log('Start data retrieval')
 
-        retrieval_threshold_sec: int = 20
-        if (time() - self._last_probe['epoch']) < retrieval_threshold_sec:
-            self._log(f'Return recent data (queried less than {retrieval_threshold_sec} seconds ago)')
+        if (time() - self._last_probe['epoch']) < self.cache_sec:
+            self._log(f'Return recent data (queried less than {self.cache_sec} seconds ago)')
             return self._last_probe
 
-        self._last_probe = {'epoch': int(time())}
-
-        checkpoint = time()
-        with ThreadPoolExecutor() as thread:
-            for future, config in {
-                thread.submit(self._probe_lm_sensors): {'label': 'sensors', 'append_label': True},
-                thread.submit(self._fetch_thermal_zones): {'label': 'thermal_zones', 'append_label': True},
-                thread.submit(self._probe_nvidia_gpu): {'label': 'nvidia', 'append_label': True},
-                thread.submit(self._fetch_networks): {'label': 'procfs', 'append_label': False},
-                thread.submit(self._shutil_storage_use): {'label': 'shutil', 'append_label': False},
-                thread.submit(self._psutil_cpu_general_usage): {'label': 'usage', 'append_label': True},
-                thread.submit(self._psutil_memory_usage): {'label': 'usage', 'append_label': True},
-                # Default config is to not append the label in net or storage, because both have single data sources
-            }.items():
-                label, append_label = config.values()
-
-                try:
-                    res = future.result()  # Get the return value from the method
-                except Exception as e:
-                    self._log(f'Task {label!r} raised an exception: {e}', 30)
-                    continue
+        checkpoint = monotonic()
 
-                if not res:
-                    self._log(f'No data from {label}')
-                    continue
+        submitted = []
+        for probe in self.probes.values():
+            if probe.running:
+                self._log(f'Skip probe {probe.name!r}: its previous run did not return yet', 30)
+                continue
 
-                for data_point, values in res.items():
-                    if data_point not in self._last_probe:
-                        self._last_probe[data_point] = {}
+            if not probe.due(checkpoint):
+                continue
 
-                    if append_label:
-                        self._last_probe[data_point][label] = values
-                    else:
-                        self._last_probe[data_point] = values
+            probe.started_at = checkpoint
+            probe.future = self._executor.submit(probe.run)
+            submitted.append(probe)
 
-        self._log('Probe took {:.3f} seconds'.format(time() - checkpoint))
+        for probe in submitted:
+            self._wait_for(probe)
+
+        return self._merge_probes(checkpoint)
+
+    def _merge_probes(self, checkpoint: float) -> dict:
+        snapshot = {'epoch': int(time())}
+        now = monotonic()
+        for probe in self.probes.values():
+            if probe.fresh(now):
+                probe.merge_into(snapshot)
+
+        if self.meta or self.stats_path:
+            stats = self.stats(now)
+            if self.meta:
+                snapshot['_meta'] = {'probes': stats}
+            if self.stats_path:
+                self._write_stats(stats)
+
+        self._last_probe = snapshot
+        self._log('Probe took {:.3f} seconds'.format(monotonic() - checkpoint))
         return self._last_probe
 
+    def stats(self, now: float = None) -> dict:
+        """Stats of the probes in the registry
+
+        Args:
+            now (float, optional): Monotonic time, to compute the age of the last successes
+
+        Returns:
+            (dict): Stats by probe name, as in {'sensors': {'runs': 10, 'errors': 0, ...}} (see ProbeStats.as_dict)
+        """
+        now = now or monotonic()
+        return {name: probe.stats.as_dict(now) for name, probe in self.probes.items()}
+
+    def close(self):
+        """Stop the worker threads and release the files kept open by the probes"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+        if self._net_dev:
+            self._net_dev.close()
+            self._net_dev = None
+
+        if self._thermal_zones:
+            for reader in self._thermal_zones.readers:
+                reader.close()
+            self._thermal_zones = None
+
+        if self._hwmon:
+            self._hwmon.close()
+            self._hwmon = None
+
+        if self._nvidia:
+            self._nvidia.close()
+
+        if self._sampler:
+            self._sampler.close()
+
+    def register(self, probe: Probe):
+        """Add a probe to the registry, or replace the one registered with the same name
+
+        Args:
+            probe (Probe): Probe to run in the next collections
+        """
+        self.probes[probe.name] = probe
+
+    def _register_default_probes(self):
+        for name, method, label, merge in self._default_probes():
+            self.register(
+                Probe(
+                    name, method, label, merge=merge,
+                    interval_sec=PROBE_INTERVALS.get(name, 0),
+                    timeout_sec=PROBE_TIMEOUTS.get(name, PROBE_TIMEOUT_SEC),
+                ),
+            )
+
+    def _default_probes(self) -> list:
+        defaults = [
+            ('sensors', self._probe_lm_sensors, 'sensors', 'label'),
+            ('thermal_zones', self._fetch_thermal_zones, 'thermal_zones', 'label'),
+            ('nvidia', self._probe_nvidia_gpu, 'nvidia', 'label'),
+            ('net', self._fetch_networks, 'procfs', 'replace'),  # net and storage have single data sources
+            ('storage', self._shutil_storage_use, 'shutil', 'replace'),
+            ('cpu_usage', self._psutil_cpu_general_usage, 'usage', 'label'),
+            ('ram_usage', self._psutil_memory_usage, 'usage', 'label'),
+        ]
+
+        if CPU_USAGE_DETAIL or CPU_USAGE_PER_CORE:
+            defaults.append(('cpu_usage_detail', self._psutil_cpu_usage_detail, 'usage_detail', 'label'))
+
+        if self._sampler:
+            defaults.append(('samples', self._sample_aggregates, 'samples', 'replace'))
+
+        return defaults
+
+    def _wait_for(self, probe: Probe):
+        try:
+            res = probe.future.result(timeout=max(probe.started_at + probe.timeout_sec - monotonic(), 0))
+        except FutureTimeoutError:
+            probe.future.cancel()
+            probe.stats.timeouts += 1
+            self._log(f'Task {probe.label!r} ({probe.name}) exceeded its {probe.timeout_sec} seconds deadline', 30)
+            return
+        except Exception as e:
+            probe.stats.errors += 1
+            self._log(f'Task {probe.label!r} raised an exception: {e}', 30)
+            return
+
+        if not res:
+            self._log(f'No data from {probe.label}')
+
+        probe.update(res or {})
+
+    def _write_stats(self, stats: dict):
+        try:
+            self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.stats_path.with_name(f'.{self.stats_path.name}.tmp')
+            tmp.write_text(dumps({'device': self.device, 'probes': stats}, indent=2))
+            tmp.replace(self.stats_path)  # readers never see a partial file
+        except OSError as e:
+            self._log(f'Could not write probe stats to {self.stats_path}: {e}', 30)
+
+    def _probe_timeout(self, name: str) -> float:
+        return self.probes[name].timeout_sec if name in self.probes else PROBE_TIMEOUT_SEC
+
     def _probe_lm_sensors(self) -> dict:
-        """Update self._last_cpu_data property with data from the sensors command"""
+        """Update self._last_cpu_data property with data from hwmon sensors, as lm-sensors reports them
+
+        The hwmon sensor files are found once and kept open between probes.
+        The sensors command is called only if no hwmon sensor can be read.
+        """
         self._log('Start sensors probe')
 
-        filters = ('Package', 'Tctl', 'CPU', 'GPU', 'edge')
+        names = tuple(key for keys in self.SENSOR_KEYS.values() for key in keys)
+
+        try:
+            if not self._hwmon:
+                self._hwmon = HwmonReader(HWMON_ROOT, names=names)
+
+            data = self._hwmon.read()
+            if not data:
+                raise OSError('no hwmon data')
+
+        except OSError as e:
+            self._log(f'Could not read hwmon sensors in-process: {e}. Fallback to {SENSORS_CMD_PATH}')
+            data = self._run_lm_sensors()
+
+        return self._group_sensors(data)
+
+    def _group_sensors(self, data: dict) -> dict:
+        self._log(f'Parsed data: {data}')
+
+        res = {}
+        for data_point, keys in self.SENSOR_KEYS.items():
+            for key in keys:
+                if key in data:
+                    if data_point not in res:
+                        res[data_point] = {}
+
+                    res[data_point][key] = data[key]
+
+        return res
+
+    def _run_lm_sensors(self) -> dict:
         cmd = '{s} | {g} -e {f} | {g} °C'.format(
-            s=SENSORS_CMD_PATH, f=' -e '.join(filters), g=GREP_CMD_PATH,
+            s=SENSORS_CMD_PATH, f=' -e '.join(self.SENSOR_FILTERS), g=GREP_CMD_PATH,
         )
 
         try:
-            res = self._run_os_command(cmd)
+            res = self._run_os_command(cmd, timeout=self._probe_timeout('sensors'))
             self._log(f'Command returned: {res}')  # expected: ['Package id 0:      +70.0°C ... ']
 
             if not res['stdout']:
@@ -102,42 +323,49 @@ class Collector:
                 e = 'update variables SENSORS_CMD_PATH and GREP_CMD_PATH in the env.toml file and then check .env'
             raise OSError(f'Could not probe sensors: install lm-sensors, if possible\n{e}')
 
+        return self._parse_sensors(res['stdout'])
+
+    def _parse_sensors(self, lines: list) -> dict:
         data = {}
-        for line in res['stdout']:
+        for line in lines:
+            if '°C' not in line or not any(f in line for f in self.SENSOR_FILTERS):  # as grepped
+                continue
+
             chunks = line.split(':')
             key = chunks[0].strip()
             val = sub(r'[^0-9.+-]', '', chunks[1].split()[0])
             data[key] = float(val)
 
-        self._log(f'Parsed data: {data}')
-
-        fetch = {
-            'cpu': ('Package id 0', 'Tctl', 'CPU', 'coretemp'),
-            'gpu': ('GPU', 'GPU temp', 'edge'),
-        }
-
-        res = {}
-        for data_point, keys in fetch.items():
-            for key in keys:
-                if key in data:
-                    if data_point not in res:
-                        res[data_point] = {}
-
-                    res[data_point][key] = data[key]
-
-        return res
+        return data
 
     def _fetch_thermal_zones(self) -> dict:
         """Update self._last_cpu_data property with data from CPU thermal zones (cores)
 
-        Some hardware handle temperature in files that can be catted.
+        Some hardware handle temperature in files that can be read directly.
+        The zone files are kept open between probes, and catted only if they cannot be opened.
         """
         self._log('Start thermal zone fetch')
 
-        cmd = f'{CAT_CMD_PATH} /sys/class/thermal/thermal_zone*/temp'
+        try:
+            if not self._thermal_zones:
+                self._thermal_zones = ThermalZonesReader(THERMAL_ROOT)
+
+            data = self._thermal_zones.read()
+
+        except OSError as e:
+            self._log(f'Could not read thermal zones in-process: {e}. Fallback to {CAT_CMD_PATH}')
+            data = self._cat_thermal_zones()
+
+        self._log(f'Fetched data: {data}')
+
+        res = {'cpu': data} if data else {}
+        return res
+
+    def _cat_thermal_zones(self) -> list:
+        cmd = f'{CAT_CMD_PATH} {THERMAL_ROOT}/thermal_zone*/temp'
 
         try:
-            res = self._run_os_command(cmd)
+            res = self._run_os_command(cmd, timeout=self._probe_timeout('thermal_zones'))
             self._log(f'Command returned: {res}')  # expected: ['20000', '47050', '61050',]
 
             if not res['stdout']:
@@ -148,77 +376,103 @@ class Collector:
                 e = 'update variable CAT_CMD_PATH in the env.toml file and then check .env'
             raise OSError(f'Could not fetch thermal zones: hardware may not report thermal zones\n{e}')
 
-        data = [round(float(t) / 1000, 3) for t in res['stdout']]
-        self._log(f'Fetched data: {data}')
-
-        res = {'cpu': data} if data else {}
-        return res
+        return [round(float(t) / 1000, 3) for t in res['stdout']]
 
     def _probe_nvidia_gpu(self) -> dict:
-        """Probe GPU temperatures from the nvidia modules
+        """Probe temperature, utilization, memory and power of every GPU from the nvidia modules
+
+        In streaming mode the values come from a long-lived nvidia-smi child, otherwise from a single call.
 
         Returns:
-            (float): a single value returned from the nvidia-smi call
+            (dict): Values by GPU index, as in {'gpu': {'0': {'temperature': 49.0, 'utilization': 3.0, ...}}}
         """
         self._log('Start nvidia probe')
 
-        cmd = f'{NVIDIA_CMD_PATH} --query-gpu=temperature.gpu --format=csv'
-
         try:
-            res = self._run_os_command(cmd)
-            self._log(f'Command returned: {res}')  # expected: ['temperature.gpu', '49']
+            if self._nvidia:
+                data = self._nvidia.read(timeout=self._probe_timeout('nvidia') / 2)
 
-            if not res['stdout']:
+            else:
+                cmd = ' '.join(query_args(NVIDIA_CMD_PATH))
+                res = self._run_os_command(cmd, timeout=self._probe_timeout('nvidia'))
+                self._log(f'Command returned: {res}')  # expected: ['0, 49, 3, 1024, 8192, 35.50']
+
+                data = {}
+                for line in res['stdout']:
+                    data.update(parse_line(line))
+
+            if not data:
                 raise OSError('no nvidia data')
 
         except OSError as e:
-            if 'not found' in str(e):
+            if 'not found' in str(e) or isinstance(e, FileNotFoundError):
                 e = 'update variable NVIDIA_CMD_PATH (nvidia-smi) in the env.toml file and then check .env'
             raise OSError(f'Could not probe nvidia: install nvidia-smi, if compatible\n{e}')
 
-        data = None if len(res['stdout']) < 2 else float(res['stdout'][1])
         self._log(f'Fetched data: {data}')
 
-        res = {'gpu': data} if data else {}
+        res = {'gpu': data}
         return res
 
     def _fetch_networks(self) -> dict:
         """Fetch data from network devices
 
+        The /proc/net/dev file is kept open between probes, and catted only if it cannot be opened.
+
         Returns:
-            (dict): Having values as Megabits (Mb)
+            (dict): Having values as Megabits (Mb), or with NET_RAW_COUNTERS, as raw counters (bytes, packets,
+                errors and drops) along with the monotonic seconds they were sampled at, in 'net_sampled_at'.
+                The unit of 'in' and 'out' is set in 'net_units', as 'Mb' or 'bytes'
         """
         self._log('Start network devices fetch')
 
-        cmd = f'{CAT_CMD_PATH} /proc/net/dev'
-
         try:
-            res = self._run_os_command(cmd)
-            self._log(f'Command returned: {res}')  # expected: ['20000', '47050', '61050',]
+            if not self._net_dev:
+                self._net_dev = FileReader(NET_DEV_PATH)
 
-            if not res['stdout'] or len(res['stdout']) < 3:
-                raise OSError('no network device data')
+            lines = self._net_dev.read().splitlines()
 
         except OSError as e:
-            if 'not found' in str(e):
-                e = 'update variable CAT_CMD_PATH in the env.toml file and then check .env'
-            raise OSError(f'Could not fetch network devices: hardware may not report via /proc\n{e}')
+            self._log(f'Could not read {NET_DEV_PATH} in-process: {e}. Fallback to {CAT_CMD_PATH}')
+            lines = self._cat_networks()
 
-        data = {}
-        for line in res['stdout'][2:]:
-            device, info = line.split(':')
-            device = device.strip()
-            if device in ('lo', 'podman', 'podman0', 'docker', 'docker0', 'veth0'):
-                continue
+        return self._parse_networks(lines)
 
-            info = sub(r' +', ' ', info).split()
-            mbits_in, mbits_out = (int(info[0]) * 8) / 1000 ** 2, (int(info[8]) * 8) / 1000 ** 2
-            data[device] = {'in': round(mbits_in, 1), 'out': round(mbits_out, 1)}
+    def _parse_networks(self, lines: list) -> dict:
+        if len(lines) < 3:
+            raise OSError('Could not fetch network devices: hardware may not report via /proc\nno network device data')
+
+        sampled_at = round(monotonic(), 3)
+
+        data = {}
+        if NET_RAW_COUNTERS:
+            data = parse_net_dev(lines, skip=self.NET_SKIP, fields=tuple(NET_DEV_FIELDS))
+        else:
+            for device, counters in parse_net_dev(lines, skip=self.NET_SKIP).items():
+                mbits_in, mbits_out = (counters['in'] * 8) / 1000 ** 2, (counters['out'] * 8) / 1000 ** 2
+                data[device] = {'in': round(mbits_in, 1), 'out': round(mbits_out, 1)}
 
         self._log(f'Fetched data: {data}')
-        res = {'net': data} if data else {}
+        res = {'net': data, 'net_units': 'bytes' if NET_RAW_COUNTERS else 'Mb'} if data else {}
+        if data and NET_RAW_COUNTERS:
+            res['net_sampled_at'] = sampled_at
+
         return res
 
+    def _cat_networks(self) -> list:
+        cmd = f'{CAT_CMD_PATH} {NET_DEV_PATH}'
+
+        try:
+            res = self._run_os_command(cmd, timeout=self._probe_timeout('net'))
+            self._log(f'Command returned: {res}')  # expected: ['Inter-|   Receive ...', ' face |bytes ...', ...]
+
+        except OSError as e:
+            if 'not found' in str(e):
+                e = 'update variable CAT_CMD_PATH in the env.toml file and then check .env'
+            raise OSError(f'Could not fetch network devices: hardware may not report via /proc\n{e}')
+
+        return res['stdout']
+
     def _shutil_storage_use(self) -> dict:
         """Fetch data from mounted partitions
 
@@ -227,15 +481,11 @@ class Collector:
         """
         data = {}
 
-        for partition in disk_partitions():
-            if partition.mountpoint.startswith('/snap'):
-                self._log(f'Skip shutil data for {partition.mountpoint}')
-                continue
-
-            data[partition.mountpoint] = {}
+        for mountpoint in self._mountpoints():
+            data[mountpoint] = {}
 
-            usage = disk_usage(partition.mountpoint)
-            self._log(f'shutil returned for {partition.mountpoint}: {usage}')
+            usage = disk_usage(mountpoint)
+            self._log(f'shutil returned for {mountpoint}: {usage}')
 
             for k in dir(usage):
                 if k.startswith('_') or callable(usage.__getattribute__(k)):
@@ -243,24 +493,81 @@ class Collector:
 
                 val_bytes = usage.__getattribute__(k)
                 mibytes = val_bytes / 1024 ** 2
-                data[partition.mountpoint].update({k: round(mibytes, 1)})
+                data[mountpoint].update({k: round(mibytes, 1)})
 
         self._log(f'Fetched data: {data}')
         res = {'storage': data} if data else {}
         return res
 
+    def _sample_aggregates(self) -> dict:
+        """Aggregates of the metrics sampled since the previous collection, nested as their data points
+
+        Returns:
+            (dict): As in {'samples': {'cpu': {'usage': {'min': 1.0, 'max': 9.0, 'mean': 4.2, 'p95': 8.5,
+                'last': 3.0}, 'thermal_zones': [...], 'sensors': {...}}, 'gpu': {'sensors': {...}}, 'net': {...}}}
+        """
+        aggregates = self._sampler.aggregate()
+
+        data = {}
+        for data_point, sensors in self._group_sensors(aggregates.get('hwmon', {})).items():
+            data[data_point] = {'sensors': sensors}
+
+        if 'cpu_usage' in aggregates:
+            data.setdefault('cpu', {})['usage'] = aggregates['cpu_usage']
+
+        if 'thermal_zones' in aggregates:
+            data.setdefault('cpu', {})['thermal_zones'] = aggregates['thermal_zones']
+
+        if 'net' in aggregates:
+            data['net'] = aggregates['net']
+
+        res = {'samples': data} if data else {}
+        return res
+
+    def _mountpoints(self) -> list:
+        """List mounted partitions, discovered again only every PARTITIONS_REFRESH_SEC"""
+        discovered_at = self._partitions['at']
+        if discovered_at is not None and (monotonic() - discovered_at) < PARTITIONS_REFRESH_SEC:
+            return self._partitions['mountpoints']
+
+        mountpoints = []
+        for partition in disk_partitions():
+            if partition.mountpoint.startswith('/snap'):
+                self._log(f'Skip shutil data for {partition.mountpoint}')
+                continue
+
+            mountpoints.append(partition.mountpoint)
+
+        self._partitions = {'at': monotonic(), 'mountpoints': mountpoints}
+        return mountpoints
+
     def _psutil_cpu_general_usage(self) -> dict:
         """Fetch data from CPU
 
+        Usage is measured since the previous probe, without blocking for a measuring window.
+
         Returns:
             (dict): Having one value in load/usage percentage
         """
-        usage = cpu_percent(interval=1)
+        usage = self._cpu_sampler.sample()['usage']
         self._log(f'psutil returned for CPU usage: {usage}')
 
         res = {'cpu': usage}
         return res
 
+    def _psutil_cpu_usage_detail(self) -> dict:
+        """Fetch detailed data from CPU, from the same sample as the general usage
+
+        Returns:
+            (dict): Having user, system, iowait and steal percentages, and optionally a list of usage per core
+        """
+        detail = self._cpu_sampler.sample()
+        detail = {k: v for k, v in detail.items() if k != 'usage' and (CPU_USAGE_DETAIL or k == 'cores')}
+        self._log(f'psutil returned for CPU usage detail: {detail}')
+
+        res = {'cpu': detail}
+        return res
+
     def _psutil_memory_usage(self) -> dict:
         """Fetch data from RAM
 
@@ -275,10 +582,16 @@ class Collector:
 
     def _identify(self):
         self._log('Start device identification')
+
+        self.device = hostname()
+        if self.device:
+            return
+
         cmd = f'{HOSTNAME_CMD_PATH} -s'
+        self._log(f'No host name from the socket module. Fallback to {cmd!r}')
 
         try:
-            res = self._run_os_command(cmd)
+            res = self._run_os_command(cmd, timeout=PROBE_TIMEOUT_SEC)
             self._log(f"Command returned: {res}")
 
             if not res['stdout']:
@@ -292,16 +605,24 @@ class Collector:
         self.device = res['stdout'][0]
 
     @staticmethod
-    def _run_os_command(cmd: str) -> dict:
+    def _run_os_command(cmd: str, timeout: float = None) -> dict:
         data = {'cmd': cmd, 'stdout': []}
 
-        res = run(cmd, shell=True, capture_output=True, text=True)
-        stdout = res.stdout.strip()
+        # A new session lets a timeout kill the whole pipeline, not only the shell
+        with Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE, text=True, start_new_session=True) as proc:
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except TimeoutExpired:
+                killpg(proc.pid, SIGKILL)
+                proc.communicate()
+                raise OSError(f'{cmd!r} timed out after {timeout} seconds')
+
+        stdout = stdout.strip()
 
-        if res.returncode:
+        if proc.returncode:
             err = 'uncaught error'
 
-            stderr = res.stderr.strip()
+            stderr = stderr.strip()
             if stderr:
                 err = [line for line in stderr.split("\n") if "sh:" in line]
 
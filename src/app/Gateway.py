@@ -0,0 +1,163 @@
+"""Gateway collecting the snapshots of many hosts, over a pool of persistent agent channels
+
+Each host runs an agent (see app.Agent), started by the gateway from a command template (i.e.: over ssh) and kept
+running between collections. Collections run concurrently over an asyncio event loop, bounded by a number of
+workers, each host within its own deadline. A host past its deadline has its channel closed, as its answer
+would come out of order, and started again on the next collection.
+"""
+from asyncio import Semaphore, TimeoutError as AsyncTimeoutError, create_subprocess_exec, gather, wait_for
+from json import loads
+from shlex import split
+from subprocess import DEVNULL, PIPE
+from sys import executable
+from time import monotonic
+
+from .Agent import REQUEST
+from .config import (
+    GATEWAY_AGENT_COMMAND,
+    GATEWAY_TIMEOUT_SEC,
+    GATEWAY_WORKERS,
+)
+from .Probes import ProbeStats
+
+
+class AgentChannel:
+    LINE_LIMIT = 2 ** 20  # max bytes of an answer
+
+    def __init__(self, host: str, command: str = GATEWAY_AGENT_COMMAND):
+        """Keep the agent of a host running
+
+        Args:
+            host (str): Host, as given to the command template
+            command (str, optional): Command template starting the agent, with {host} and {python} placeholders,
+                as in 'ssh {host} cd telemetry-publisher && bash setup/run.bash --agent'
+        """
+        self.host = host
+        self.args = split(command.format(host=host, python=executable))
+        self.device = host  # replaced by the device name the agent answers with
+        self.stats = ProbeStats()  # round trips, as runs, errors and timeouts
+        self._proc = None
+
+    @property
+    def alive(self) -> bool:
+        """Whether the agent process is running"""
+        return self._proc is not None and self._proc.returncode is None
+
+    async def collect(self) -> dict:
+        """Request a collection from the agent, started if not running
+
+        Returns:
+            (dict): Data points of the host, as returned by Collector.data
+
+        Raises:
+            OSError: If the agent cannot be started, exits or answers with an error
+            ValueError: If the answer is not JSON
+        """
+        if not self.alive:
+            self._proc = await create_subprocess_exec(
+                *self.args, stdin=PIPE, stdout=PIPE, stderr=DEVNULL, limit=self.LINE_LIMIT,
+            )
+
+        self._proc.stdin.write(f'{REQUEST}\n'.encode())
+        await self._proc.stdin.drain()
+
+        line = await self._proc.stdout.readline()
+        if not line:
+            code = await self._proc.wait()
+            raise OSError(f'agent exited with code {code}: run {" ".join(self.args)!r} to see its errors')
+
+        data = loads(line)
+        if 'error' in data:
+            raise OSError(f'agent error: {data["error"]}')
+
+        self.device = data.pop('device', None) or self.device
+        return data
+
+    async def close(self, timeout: float = 3):
+        """Stop the agent, as it stops once its stdin is closed, killed if it did not within timeout"""
+        if self._proc is None:
+            return
+
+        proc, self._proc = self._proc, None
+        if proc.returncode is not None:
+            return
+
+        try:
+            proc.stdin.close()
+            await wait_for(proc.wait(), timeout=timeout)
+        except (AsyncTimeoutError, OSError):
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+
+
+class Gateway:
+    def __init__(
+            self, hosts: list, command: str = GATEWAY_AGENT_COMMAND, workers: int = GATEWAY_WORKERS,
+            timeout_sec: float = GATEWAY_TIMEOUT_SEC, logger=None,
+    ):
+        """Collect from many hosts through their agents
+
+        Args:
+            hosts (list): Hosts, as given to the command template
+            command (str, optional): Command template starting an agent (see AgentChannel)
+            workers (int, optional): Max hosts collected concurrently
+            timeout_sec (float, optional): Seconds a host may take to answer, including its agent start
+            logger (logging.Logger, optional): Logger to send debug and warning messages to
+        """
+        self.channels = [AgentChannel(host, command) for host in hosts]
+        self.workers = workers
+        self.timeout_sec = timeout_sec
+        self.logger = logger
+
+    async def collect(self) -> list:
+        """Collect from every host concurrently, up to workers at a time
+
+        The round trip stats of each host (latency, errors and timeouts, see ProbeStats.as_dict) are added to its
+        data points, in the '_meta' section, as 'gateway'.
+
+        Returns:
+            (list): (channel, data points) of the hosts that answered within timeout_sec, in the order of hosts
+        """
+        semaphore = Semaphore(self.workers)  # bound to the running loop
+        res = await gather(*(self._collect(channel, semaphore) for channel in self.channels))
+        return [(channel, data) for channel, data in zip(self.channels, res) if data is not None]
+
+    async def close(self):
+        """Stop every agent"""
+        await gather(*(channel.close() for channel in self.channels))
+
+    async def _collect(self, channel: AgentChannel, semaphore: Semaphore) -> dict:
+        async with semaphore:
+            checkpoint = monotonic()
+            try:
+                data = await wait_for(channel.collect(), timeout=self.timeout_sec)
+
+            except AsyncTimeoutError:
+                channel.stats.timeouts += 1
+                self._log(f'Host {channel.host!r} exceeded its {self.timeout_sec} seconds deadline', 30)
+                await channel.close(timeout=0)
+                return None
+
+            except (OSError, ValueError) as e:
+                channel.stats.errors += 1
+                self._log(f'Could not collect from host {channel.host!r}: {e}', 30)
+                await channel.close(timeout=0)
+                return None
+
+            finally:
+                channel.stats.observe(monotonic() - checkpoint)
+
+        channel.stats.succeeded_at = monotonic()
+        self._log(f'Collected from {channel.host!r} ({channel.device}) in {channel.stats.last_sec:.3f} seconds')
+
+        data.setdefault('_meta', {})['gateway'] = channel.stats.as_dict()
+        return data
+
+    def _log(self, msg: str, level: int = 10):
+        if not self.logger:
+            return
+
+        self.logger.log(level, msg)
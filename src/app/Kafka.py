@@ -1,57 +1,249 @@
 """This module enables publishing messages to Kafka Brokers"""
-from json import dumps
 from logging import log
+from pathlib import Path
+from threading import Event, Lock, Thread
 
 from confluent_kafka import Producer as ConfluentKafkaProducer
 
+from .Codec import DeltaEncoder, Snapshot, encode
+from .config import (
+    KAFKA_BATCH_MESSAGES,
+    KAFKA_COMPRESSION,
+    KAFKA_ENCODING,
+    KAFKA_LINGER_MS,
+    KAFKA_MESSAGE_TIMEOUT_MS,
+)
+from .Spool import Spool
+
 
 class Producer:
-    def __init__(self, brokers: iter, logger: log = None):
+    QUEUE_FULL_RETRIES = 3  # produce retries while the local queue is full, each after serving delivery reports
+    QUEUE_FULL_WAIT_SEC = 1  # max seconds serving delivery reports before each retry
+
+    def __init__(
+            self, brokers: iter, logger: log = None, batch: bool = False, spool: Spool = None,
+            encoding: str = KAFKA_ENCODING, keyframe_every: int = 0, poll_thread: bool = True,
+    ):
         """Instantiate Kafka producer.
 
         Args:
             brokers (iter): iterable with at least one "broker:port" str,
                 as in: "localhost:9092"
             logger (logging.log): Python's logging logger method
+            batch (bool, optional): Queue messages to be sent in batches, with delivery reports served
+                by a background thread, instead of waiting for the delivery of each stream call
+            spool (Spool, optional): Store undelivered messages, and replay them once a delivery succeeds
+            encoding (str, optional): Message wire format, 'json' or 'binary' (see app.Codec)
+            keyframe_every (int, optional): Publish a full keyframe every keyframe_every messages of each key,
+                and only the fields changed since the keyframe in between, or 0 to always publish full messages
+            poll_thread (bool, optional): In batch mode, serve delivery reports from a background thread,
+                or leave them to poll() calls (i.e.: from an event loop)
         """
         self._counter = 0
+        self.batch = batch
+        self.spool = spool
+        self.encoding = encoding
+        self.keyframe_every = keyframe_every
+        self._delta_encoders = {}
+        self._reachable = None  # whether the last delivery report was a success
+        self._replaying = {}  # spool segment: replayed records not yet reported, +1 while the segment is read
+        self._replaying_lock = Lock()
+
+        settings = {
+            'bootstrap.servers': ','.join(brokers),
+            'compression.type': KAFKA_COMPRESSION,
+            'message.timeout.ms': KAFKA_MESSAGE_TIMEOUT_MS,  # so undelivered messages are reported and spooled
+        }
+
+        if batch:
+            settings.update({
+                'linger.ms': KAFKA_LINGER_MS,
+                'batch.num.messages': KAFKA_BATCH_MESSAGES,
+            })
 
-        settings = {'bootstrap.servers': ','.join(brokers)}
         self.__kafka = ConfluentKafkaProducer(settings)
 
         self._logger = logger
         self.log_debug(f'Connected to: {settings["bootstrap.servers"]!r}')
 
+        self._stop = Event()
+        self._poller = None
+        if batch and poll_thread:
+            self._poller = Thread(target=self.__serve, name='kafka-poll', daemon=True)
+            self._poller.start()
+
+    @property
+    def pending(self) -> int:
+        """Messages queued and not yet delivered, along with librdkafka events not yet served (i.e.: errors)"""
+        return len(self.__kafka)
+
     def stream(self, messages: iter, topic: str, key: str = None):
         """Stream (produce, publish) messages
 
+        In batch mode, messages are only queued: librdkafka sends them in batches bounded by
+        KAFKA_LINGER_MS and KAFKA_BATCH_MESSAGES.
+
+        Messages are left untouched: their epoch is sent as the message timestamp, not in its value.
+
         Args:
-            messages (iter with dicts): Dict messages to be streamed, as in: [{'key': 'value'}]
+            messages (iter): Snapshots (see app.Codec) or dict messages to be streamed,
+                as in: [{'epoch': 1730455200.0, 'key': 'value'}]
             topic (str): Topic to send the messages to
             key (str, optional): Tag the message envelope at topic level
         """
         for message in messages:
+            if not isinstance(message, Snapshot):
+                message = Snapshot.from_message(message, message['epoch'])
+            timestamp = message.timestamp
+
+            if self.keyframe_every:
+                encoder = self._delta_encoders.setdefault(key, DeltaEncoder(self.keyframe_every))
+                message = encoder.frame(message, timestamp)
+
             params = {
-                'timestamp': int(message.pop('epoch') * 10 ** 3),
+                'timestamp': timestamp,
                 'topic': topic,
                 'key': key.encode() if key else None,
-                'value': dumps(message, separators=(',', ':'), default=str).encode(),
-                'callback': self.__report,
+                'value': encode(message, self.encoding),
             }
 
-            self.__kafka.produce(**{k: v for k, v in params.items() if v})
+            self.__produce({k: v for k, v in params.items() if v})
             self._counter += 1
 
+        if self.batch:
+            self.log_debug(f'Queued: {self._counter} messages ({self.pending} pending)')
+            self.replay()
+            return
+
         self.__kafka.poll(timeout=9)
         self.__kafka.flush(timeout=3)
         self.log_debug(f'Streamed: {self._counter} messages')
 
-    def __report(self, error: str = None, msg: object = None):
+        if self.replay():
+            self.__kafka.flush(timeout=9)
+
+    def poll(self, timeout: float = 0) -> int:
+        """Serve delivery reports, spooling the messages not delivered
+
+        Args:
+            timeout (float, optional): Max seconds to wait for a report
+
+        Returns:
+            (int): Number of reports served
+        """
+        return self.__kafka.poll(timeout=timeout)
+
+    def replay(self) -> int:
+        """Produce the spooled messages again, with their original timestamps
+
+        Messages are replayed only after a successful delivery report, as a sign that brokers are reachable.
+        A replayed segment is removed once all its messages are reported: replayed messages that are not
+        delivered go back to the spool first, and a segment whose reports are lost (i.e.: on a crash) is
+        replayed again by the next run, so messages may be published twice but are not lost.
+        If the local queue stays full, the rest of the segment goes back to the spool, to be replayed later.
+
+        Returns:
+            (int): Number of replayed messages
+        """
+        if not self.spool or not self._reachable or self.spool.empty:
+            return 0
+
+        counter = 0
+        for segment in self.spool.seal():
+            with self._replaying_lock:
+                if segment in self._replaying:  # replayed already, waiting for its reports
+                    continue
+                self._replaying[segment] = 1
+
+            queued = True
+            for timestamp, topic, key, value in self.spool.records(segment):
+                if not queued:
+                    self.spool.append(timestamp, topic, key, value)
+                    continue
+
+                params = {'timestamp': timestamp, 'topic': topic, 'key': key, 'value': value}
+                queued = self.__produce({k: v for k, v in params.items() if v}, segment=segment)
+                counter += queued
+
+            self.__settle(segment)
+
+        self.log_debug(f'Replayed: {counter} spooled messages')
+        return counter
+
+    def close(self, timeout: float = 10):
+        """Deliver pending messages before the producer is discarded
+
+        Args:
+            timeout (float, optional): Max seconds to wait for pending deliveries
+        """
+        self._stop.set()
+        if self._poller:
+            self._poller.join()
+
+        pending = self.__kafka.flush(timeout=timeout)
+        if not pending:
+            return
+
+        if self.spool:
+            self.__kafka.purge()  # report pending messages as not delivered, so they are spooled
+            self.__kafka.poll(timeout=0)
+
+        self.log_debug(f'Closed with {pending} messages not delivered{" (spooled)" if self.spool else ""}')
+
+    def __produce(self, params: dict, segment: Path = None) -> bool:
+        timestamp = params.get('timestamp')  # purged messages are reported without their timestamps
+        params['callback'] = lambda error, msg: self.__report(error, msg, timestamp, segment)
+
+        if segment:
+            with self._replaying_lock:
+                self._replaying[segment] += 1  # before producing, as its report may come from another thread
+
+        for retry in range(self.QUEUE_FULL_RETRIES + 1):
+            try:
+                self.__kafka.produce(**params)
+                return True
+            except BufferError:  # local queue is full: serve delivery reports to release room, then retry
+                if retry < self.QUEUE_FULL_RETRIES:
+                    self.log_debug(f'Local queue full with {self.pending} messages: wait for deliveries')
+                    self.__kafka.poll(timeout=self.QUEUE_FULL_WAIT_SEC)
+
+        self.log_debug(f'Local queue still full: message {"spooled" if self.spool else "dropped"}')
+        if self.spool:
+            self.spool.append(timestamp or 0, params['topic'], params.get('key'), params['value'])
+
+        if segment:
+            self.__settle(segment)
+
+        return False
+
+    def __settle(self, segment: Path):
+        with self._replaying_lock:
+            self._replaying[segment] -= 1
+            if self._replaying[segment]:
+                return
+            del self._replaying[segment]
+
+        self.spool.remove(segment)
+
+    def __serve(self):
+        while not self._stop.is_set():
+            self.__kafka.poll(timeout=0.5)
+
+    def __report(self, error: str = None, msg: object = None, timestamp: int = None, segment: Path = None):
         if error is not None:
+            self._reachable = False
             self.log_debug(f'Message not delivered: {error}')
+
+            if self.spool and msg:
+                self.spool.append(timestamp or msg.timestamp()[1], msg.topic(), msg.key(), msg.value())
+
         elif msg:
+            self._reachable = True
             self.log_debug(f"Delivered to {msg.topic()!r} at part. #{msg.partition()}, offset {msg.offset()}")
 
+        if segment:  # replayed from the spool: its segment is removed once all its messages are reported
+            self.__settle(segment)
+
     def log_debug(self, msg: str):
         """Log a debug message
 
@@ -0,0 +1,187 @@
+"""NVIDIA GPU backend based on nvidia-smi
+
+nvidia-smi may take hundreds of milliseconds to start, as it initializes the driver. NvidiaSmiStream keeps
+one nvidia-smi child running in loop mode (--loop-ms) and parses its output as it comes, so a probe reads memory only.
+A report is complete once every GPU listed by nvidia-smi -L, run alongside at start, was reported.
+"""
+from subprocess import Popen, PIPE, DEVNULL, TimeoutExpired
+from threading import Event, Lock, Thread
+from time import monotonic
+
+QUERY_FIELDS = {  # nvidia-smi query field: published key
+    'index': 'index',
+    'temperature.gpu': 'temperature',
+    'utilization.gpu': 'utilization',
+    'memory.used': 'memory_used',
+    'memory.total': 'memory_total',
+    'power.draw': 'power',
+}
+
+
+def query_args(cmd_path: str, interval_ms: int = None) -> list:
+    """Build the nvidia-smi arguments querying all fields of every GPU
+
+    Args:
+        cmd_path (str): Path to nvidia-smi
+        interval_ms (int, optional): Repeat the query every interval_ms milliseconds, until killed
+
+    Returns:
+        (list): Command and arguments
+    """
+    args = [cmd_path, '--query-gpu={}'.format(','.join(QUERY_FIELDS)), '--format=csv,noheader,nounits']
+    if interval_ms:
+        args.append(f'--loop-ms={interval_ms}')
+    return args
+
+
+def parse_line(line: str) -> dict:
+    """Parse one CSV line, as queried with query_args
+
+    Args:
+        line (str): As in '0, 45, 12, 1024, 8192, 35.50'
+
+    Returns:
+        (dict): Values by GPU index, as in {'0': {'temperature': 45.0, ...}}, unavailable values set as None,
+            or an empty dict if the line cannot be parsed
+    """
+    values = [v.strip() for v in line.split(',')]
+    if len(values) != len(QUERY_FIELDS) or not values[0].isdigit():
+        return {}
+
+    data = {}
+    for key, val in zip(list(QUERY_FIELDS.values())[1:], values[1:]):
+        try:
+            data[key] = float(val)
+        except ValueError:  # as in '[N/A]' or '[Not Supported]'
+            data[key] = None
+
+    return {values[0]: data}
+
+
+class NvidiaSmiStream:
+    def __init__(self, cmd_path: str, interval_ms: int = 1000):
+        """Keep a looping nvidia-smi child and the latest values it reported for each GPU
+
+        Args:
+            cmd_path (str): Path to nvidia-smi
+            interval_ms (int, optional): Milliseconds between reports from nvidia-smi
+        """
+        self.args = query_args(cmd_path, interval_ms)
+        self.interval_ms = interval_ms
+
+        self._lock = Lock()
+        self._reported = Event()
+        self._latest = {}
+        self._proc = None
+        self._listing = None
+        self._thread = None
+
+    @property
+    def alive(self) -> bool:
+        """Whether the nvidia-smi child is running"""
+        return self._proc is not None and self._proc.poll() is None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the running nvidia-smi child completed a report, so read() returns without waiting"""
+        return self.alive and self._reported.is_set()
+
+    def read(self, timeout: float = None) -> dict:
+        """Latest values of every GPU, (re)starting nvidia-smi if it is not running
+
+        Values older than three report intervals are left out, as from a GPU no longer reported.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a first complete report after nvidia-smi starts
+
+        Returns:
+            (dict): Values by GPU index, as in {'0': {'temperature': 45.0, 'utilization': 12.0, ...}}
+
+        Raises:
+            OSError: If nvidia-smi cannot be started, or did not report within timeout
+        """
+        if not self.alive:
+            self._start()
+
+        if not self._reported.wait(timeout):
+            raise OSError(f'no report from {self.args[0]} within {timeout} seconds')
+
+        max_age = 3 * self.interval_ms / 1000
+        now = monotonic()
+
+        with self._lock:
+            return {index: values for index, (at, values) in self._latest.items() if (now - at) <= max_age}
+
+    def close(self, timeout: float = 3):
+        """Stop the nvidia-smi child
+
+        Args:
+            timeout (float, optional): Seconds to wait for the child to exit once terminated, before it is killed,
+                and then for its reader thread to return
+        """
+        if not self._proc:
+            return
+
+        if self._listing.poll() is None:  # still listing GPUs, as the reader thread waits for
+            self._listing.kill()
+
+        if self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=timeout)
+            except TimeoutExpired:
+                self._proc.kill()
+                self._proc.wait(timeout=timeout)
+
+        self._thread.join(timeout=timeout)
+        self._proc = None
+
+    def _start(self):
+        if self._proc:
+            self.close()
+
+        self._reported.clear()
+        self._latest = {}
+        self._listing = Popen([self.args[0], '-L'], stdout=PIPE, stderr=DEVNULL, stdin=DEVNULL, text=True)
+        self._proc = Popen(self.args, stdout=PIPE, stderr=DEVNULL, stdin=DEVNULL, text=True, bufsize=1)
+
+        self._thread = Thread(target=self._consume, args=(self._proc.stdout,), name='nvidia-smi', daemon=True)
+        self._thread.start()
+
+    def _consume(self, stdout):
+        count = self._gpu_count()  # GPUs per report, None if not listed
+        cycle = set()  # GPU indexes in the current report
+
+        for line in stdout:
+            parsed = parse_line(line)
+            if not parsed:
+                continue
+
+            if cycle & parsed.keys():  # an index repeats: the report was complete, with count unknown or wrong
+                self._reported.set()
+                count = len(cycle)
+                cycle.clear()
+
+            cycle.update(parsed)
+            with self._lock:
+                self._latest.update({index: (monotonic(), values) for index, values in parsed.items()})
+
+            if len(cycle) == count:
+                self._reported.set()
+                cycle.clear()
+
+        if cycle:  # the last report is complete once nvidia-smi exits
+            self._reported.set()
+
+        stdout.close()
+
+    def _gpu_count(self, timeout: float = 10) -> int:
+        try:
+            out, _ = self._listing.communicate(timeout=timeout)
+        except TimeoutExpired:
+            self._listing.kill()
+            self._listing.communicate()
+            return None
+
+        count = sum(1 for line in out.splitlines() if line.startswith('GPU '))  # MIG devices are indented
+        return count or None
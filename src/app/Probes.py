@@ -0,0 +1,192 @@
+"""Probe registry entries for the Collector
+
+A probe wraps one Collector method, with the cadence it must run at, the deadline for each of its runs
+and the rule to merge its result into the published snapshot. Each probe also keeps stats of its runs.
+"""
+from time import monotonic
+
+
+class ProbeStats:
+    BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # upper bounds of wall time buckets, in seconds
+
+    def __init__(self):
+        """Count runs, errors and timeouts of a probe, with a histogram of its wall times"""
+        self.runs = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.histogram = [0] * (len(self.BUCKETS) + 1)  # last bucket for runs longer than the last bound
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+        self.last_sec = None
+        self.succeeded_at = None
+
+    def observe(self, seconds: float):
+        """Record the wall time of a run, successful or not
+
+        Args:
+            seconds (float): Wall time of the run
+        """
+        bucket = next((i for i, bound in enumerate(self.BUCKETS) if seconds <= bound), len(self.BUCKETS))
+        self.histogram[bucket] += 1
+        self.runs += 1
+        self.total_sec += seconds
+        self.max_sec = max(self.max_sec, seconds)
+        self.last_sec = seconds
+
+    def as_dict(self, now: float = None) -> dict:
+        """Stats as published, times rounded to milliseconds
+
+        Args:
+            now (float, optional): Monotonic time, to compute the age of the last success
+
+        Returns:
+            (dict): As in {'runs': 10, 'errors': 0, 'timeouts': 1, 'last_sec': 0.012, 'mean_sec': 0.01,
+                'max_sec': 0.03, 'success_age_sec': 2.0, 'histogram': [counts per bucket in BUCKETS, then over]}
+        """
+        age = None
+        if self.succeeded_at is not None:
+            age = round((now or monotonic()) - self.succeeded_at, 3)
+
+        return {
+            'runs': self.runs,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'last_sec': round(self.last_sec, 3) if self.last_sec is not None else None,
+            'mean_sec': round(self.total_sec / self.runs, 3) if self.runs else None,
+            'max_sec': round(self.max_sec, 3),
+            'success_age_sec': age,
+            'histogram': list(self.histogram),
+        }
+
+
+class Probe:
+    MERGE_RULES = ('label', 'replace')
+
+    def __init__(
+            self, name: str, method: callable, label: str, merge: str = 'label',
+            interval_sec: float = 0, timeout_sec: float = 10,
+    ):
+        """Declare a probe
+
+        Args:
+            name (str): Unique name in the registry, as in 'storage'
+            method (callable): Called with no arguments, returns a dict of data points, as in {'cpu': 42.0}.
+                May be a coroutine function for probes run by the AsyncCollector
+            label (str): Key used to nest values within each data point, as in 'sensors' for cpu.sensors
+            merge (str, optional): 'label' to store values at data_point.label,
+                or 'replace' to store values as the data point itself (single source data points)
+            interval_sec (float, optional): Minimum seconds between runs, 0 to run on every collection
+            timeout_sec (float, optional): Seconds a run may take before being skipped
+
+        Raises:
+            ValueError: If the merge rule is unknown
+        """
+        if merge not in self.MERGE_RULES:
+            raise ValueError(f'Unknown merge rule {merge!r} for probe {name!r}: use one of {self.MERGE_RULES}')
+
+        self.name = name
+        self.method = method
+        self.label = label
+        self.merge = merge
+        self.interval_sec = interval_sec
+        self.timeout_sec = timeout_sec
+
+        self.future = None
+        self.thread = None  # future of a blocking run, in a thread of the loop (see run_async)
+        self.started_at = None
+        self.value = None
+        self.updated_at = None
+        self.stats = ProbeStats()
+
+    @property
+    def running(self) -> bool:
+        """Whether a previous run, or its thread, has not returned yet (hung runs are never submitted twice)"""
+        if self.thread is not None and not self.thread.done():
+            return True
+        return self.future is not None and not self.future.done()
+
+    def run(self) -> dict:
+        """Call the probe method, recording its wall time in the stats
+
+        Returns:
+            (dict): Data points returned by the probe method
+        """
+        checkpoint = monotonic()
+        try:
+            return self.method()
+        finally:
+            self.stats.observe(monotonic() - checkpoint)
+
+    async def run_async(self) -> dict:
+        """Run the probe in the running event loop, recording its wall time in the stats
+
+        Coroutine methods are awaited, and other methods run in a thread of the loop, as they may block.
+        A run past its deadline cannot interrupt its thread: the probe keeps running until the thread returns.
+
+        Returns:
+            (dict): Data points returned by the probe method
+        """
+        from asyncio import get_running_loop, iscoroutinefunction, shield  # only loaded by the AsyncCollector
+
+        if not iscoroutinefunction(self.method):
+            self.thread = get_running_loop().run_in_executor(None, self.run)
+            return await shield(self.thread)  # cancelling the run leaves the thread future pending
+
+        checkpoint = monotonic()
+        try:
+            return await self.method()
+        finally:
+            self.stats.observe(monotonic() - checkpoint)
+
+    def due(self, now: float = None) -> bool:
+        """Whether the probe must run in the current collection
+
+        Args:
+            now (float, optional): Monotonic time of the collection
+        """
+        if self.running:
+            return False
+
+        if self.started_at is None:
+            return True
+
+        return ((now or monotonic()) - self.started_at) >= self.interval_sec
+
+    def fresh(self, now: float = None) -> bool:
+        """Whether the cached value may still be published
+
+        A value is kept until the next run is due and had its time to complete.
+
+        Args:
+            now (float, optional): Monotonic time of the collection
+        """
+        if self.updated_at is None:
+            return False
+
+        return ((now or monotonic()) - self.updated_at) <= (self.interval_sec + self.timeout_sec)
+
+    def update(self, value: dict):
+        """Cache the value returned by a successful run
+
+        Args:
+            value (dict): Data points returned by the probe method
+        """
+        self.value = value
+        self.updated_at = monotonic()
+        self.stats.succeeded_at = self.updated_at
+
+    def merge_into(self, snapshot: dict):
+        """Merge the cached value into a snapshot, following the merge rule
+
+        Args:
+            snapshot (dict): Snapshot to be updated in place
+        """
+        for data_point, values in (self.value or {}).items():
+            if self.merge == 'replace':
+                snapshot[data_point] = values
+                continue
+
+            if not isinstance(snapshot.get(data_point), dict):
+                snapshot[data_point] = {}
+
+            snapshot[data_point][self.label] = values
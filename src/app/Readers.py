@@ -0,0 +1,198 @@
+"""In-process readers for procfs and sysfs files
+
+Files are opened once and re-read with os.pread on every probe, so a probe costs a system call
+instead of forking a shell and a `cat` process.
+"""
+from glob import glob
+from os import O_RDONLY, close, open as os_open, pread
+from pathlib import Path
+from socket import gethostname
+
+THERMAL_ROOT = '/sys/class/thermal'
+HWMON_ROOT = '/sys/class/hwmon'
+NET_DEV_PATH = '/proc/net/dev'
+NET_DEV_FIELDS = {  # published key: column in /proc/net/dev, after the device name
+    'in': 0,
+    'packets_in': 1,
+    'errs_in': 2,
+    'drop_in': 3,
+    'out': 8,
+    'packets_out': 9,
+    'errs_out': 10,
+    'drop_out': 11,
+}
+
+
+class FileReader:
+    def __init__(self, path: str, chunk_size: int = 4096):
+        """Keep a read-only file descriptor open for repeated reads
+
+        Args:
+            path (str): File to read, as in '/proc/net/dev'
+            chunk_size (int, optional): Bytes requested on each pread call
+
+        Raises:
+            OSError: If the file cannot be opened
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self._fd = os_open(path, O_RDONLY)
+
+    def read(self) -> str:
+        """Read the whole file from its start, without moving any file offset"""
+        chunks = []
+        offset = 0
+
+        while True:
+            chunk = pread(self._fd, self.chunk_size, offset)
+            if not chunk:
+                break
+
+            chunks.append(chunk)
+            offset += len(chunk)
+
+        return b''.join(chunks).decode(errors='replace')
+
+    def close(self):
+        """Release the file descriptor"""
+        if self._fd is None:
+            return
+
+        close(self._fd)
+        self._fd = None
+
+    def __del__(self):
+        self.close()
+
+
+class ThermalZonesReader:
+    def __init__(self, root: str = THERMAL_ROOT):
+        """Read temperatures from every thermal zone found under root
+
+        Args:
+            root (str, optional): Thermal class directory, as in '/sys/class/thermal'
+
+        Raises:
+            OSError: If no thermal zone can be opened
+        """
+        self.readers = []
+
+        for path in sorted(glob(str(Path(root) / 'thermal_zone*' / 'temp'))):
+            try:
+                self.readers.append(FileReader(path))
+            except OSError:
+                continue
+
+        if not self.readers:
+            raise OSError(f'no thermal zone found in {root}')
+
+    def read(self) -> list:
+        """Read all zones
+
+        Returns:
+            (list): Temperatures in Celsius, from the zones that could be read
+        """
+        data = []
+
+        for reader in self.readers:
+            try:
+                raw = reader.read().strip()
+            except OSError:  # some zones answer ENODATA or EIO while their sensor is off
+                continue
+
+            if raw:
+                data.append(round(float(raw) / 1000, 3))
+
+        return data
+
+
+class HwmonReader:
+    def __init__(self, root: str = HWMON_ROOT, names: tuple = None):
+        """Read temperatures from the hwmon sensors found under root, the files lm-sensors reads
+
+        Sensors are named by their temp*_label file (i.e.: 'Package id 0', 'Tctl', 'edge'), as lm-sensors does.
+        Sensors with no label are named by their chip (i.e.: 'coretemp' or 'acpitz'), where lm-sensors would
+        report 'temp1' for each of them, so they keep distinct names across chips.
+        Only the first sensor found with each name is kept.
+
+        Args:
+            root (str, optional): Hwmon class directory, as in '/sys/class/hwmon'
+            names (tuple, optional): Keep only sensors with these names, instead of all
+
+        Raises:
+            OSError: If no temperature sensor can be opened
+        """
+        self.readers = {}
+
+        for path in sorted(glob(str(Path(root) / 'hwmon*' / 'temp*_input'))):
+            path = Path(path)
+            label = path.with_name(path.name.replace('_input', '_label'))
+
+            try:
+                name = (label if label.is_file() else path.with_name('name')).read_text().strip()
+                if name in self.readers or (names and name not in names):
+                    continue
+
+                self.readers[name] = FileReader(str(path))
+            except OSError:
+                continue
+
+        if not self.readers:
+            raise OSError(f'no hwmon temperature sensor found in {root}')
+
+    def read(self) -> dict:
+        """Read all sensors
+
+        Returns:
+            (dict): Temperatures in Celsius by sensor name, from the sensors that could be read
+        """
+        data = {}
+
+        for name, reader in self.readers.items():
+            try:
+                raw = reader.read().strip()
+            except OSError:
+                continue
+
+            if raw:
+                data[name] = round(float(raw) / 1000, 3)
+
+        return data
+
+    def close(self):
+        """Release the sensor files"""
+        for reader in self.readers.values():
+            reader.close()
+
+
+def parse_net_dev(lines: list, skip: tuple = (), fields: tuple = ('in', 'out')) -> dict:
+    """Parse counters from /proc/net/dev lines
+
+    Args:
+        lines (list): File lines, including its two header lines
+        skip (tuple, optional): Device names to ignore
+        fields (tuple, optional): Counters to parse, out of NET_DEV_FIELDS
+
+    Returns:
+        (dict): Counters per device, as in {'eth0': {'in': 1024, 'out': 512}} for received and transmitted bytes
+    """
+    data = {}
+
+    for line in lines[2:]:
+        if ':' not in line:
+            continue
+
+        device, info = line.split(':', 1)
+        device = device.strip()
+        if device in skip:
+            continue
+
+        info = info.split()
+        data[device] = {field: int(info[NET_DEV_FIELDS[field]]) for field in fields}
+
+    return data
+
+
+def hostname() -> str:
+    """Short host name, as returned by `hostname -s`"""
+    return gethostname().split('.')[0]
@@ -0,0 +1,330 @@
+"""Samplers computing rates from counters kept between probes
+
+Counters are snapshotted on every probe and compared to the previous snapshot, so a probe does not have
+to sleep through a measuring window of its own.
+
+HighFrequencySampler samples chosen metrics at a higher rate than collections, into fixed-size ring buffers,
+for each collection to publish their aggregates (min, max, mean, p95 and last) instead of every sample.
+"""
+from array import array
+from math import ceil
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from psutil import cpu_times
+
+from .Readers import FileReader, HwmonReader, ThermalZonesReader, HWMON_ROOT, NET_DEV_PATH, THERMAL_ROOT
+
+
+class CpuSampler:
+    IGNORED_FIELDS = ('guest', 'guest_nice')  # already accounted in user and nice times
+    DETAIL_FIELDS = ('user', 'system', 'iowait', 'steal')
+
+    def __init__(self, min_window_sec: float = 0.2, per_core: bool = False):
+        """Compute CPU usage over the time elapsed since the previous sample
+
+        The first snapshot is taken at instantiation. Samples requested less than min_window_sec after the
+        previous one return the previous result, so probes sharing the sampler in one collection agree.
+        A first sample requested within min_window_sec, as by a one-shot run, is the usage since boot.
+
+        Args:
+            min_window_sec (float, optional): Shortest window worth measuring, as the kernel counts in ticks
+            per_core (bool, optional): Also compute usage per logical core
+        """
+        self.min_window_sec = min_window_sec
+        self.per_core = per_core
+
+        self._lock = Lock()
+        self._previous = self._snapshot()
+        self._last_sample = None
+
+    def sample(self) -> dict:
+        """Sample CPU usage since the previous call, never waiting
+
+        Returns:
+            (dict): Percentages, as in {'usage': 12.5, 'user': 9.1, 'system': 3.0, 'iowait': 0.4, 'steal': 0.0},
+                with a 'cores' list of usage percentages if per_core is set
+        """
+        with self._lock:
+            previous = self._previous
+
+            if monotonic() - previous['at'] < self.min_window_sec:
+                if self._last_sample:
+                    return self._last_sample
+
+                previous = self._boot()  # a window too short to measure: the usage since boot, instead of sleeping
+
+            current = self._snapshot()
+            sample = self._percentages(previous['total'], current['total'])
+
+            if self.per_core:
+                cores = zip(previous['cores'], current['cores'])
+                sample['cores'] = [self._percentages(prev, curr)['usage'] for prev, curr in cores]
+
+            self._previous = current
+            self._last_sample = sample
+            return sample
+
+    def _boot(self) -> dict:  # times as zeros, for the usage since boot
+        return {
+            'total': self._previous['total']._make(0.0 for _ in self._previous['total']),
+            'cores': [core._make(0.0 for _ in core) for core in self._previous['cores']],
+        }
+
+    def _snapshot(self) -> dict:
+        return {
+            'at': monotonic(),
+            'total': cpu_times(),
+            'cores': cpu_times(percpu=True) if self.per_core else [],
+        }
+
+    def _percentages(self, previous, current) -> dict:
+        deltas = {
+            field: max(getattr(current, field) - getattr(previous, field), 0)
+            for field in current._fields if field not in self.IGNORED_FIELDS
+        }
+        elapsed = sum(deltas.values())
+        if not elapsed:
+            return {field: 0.0 for field in ('usage',) + self.DETAIL_FIELDS}
+
+        busy = elapsed - deltas['idle'] - deltas.get('iowait', 0)
+        res = {'usage': round(busy / elapsed * 100, 1)}
+        res.update({
+            field: round(deltas.get(field, 0) / elapsed * 100, 1)  # iowait and steal are Linux only
+            for field in self.DETAIL_FIELDS
+        })
+        return res
+
+
+class RingBuffer:
+    def __init__(self, size: int):
+        """Keep the last size values appended, in a fixed-size array of doubles
+
+        Args:
+            size (int): Max values kept, older values being overwritten
+        """
+        self.size = size
+        self._values = array('d', bytes(8 * size))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.size)
+
+    def append(self, value: float):
+        """Add a value, overwriting the oldest one if the buffer is full"""
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self._count += 1
+
+    def clear(self):
+        """Forget all values, keeping the array"""
+        self._next = 0
+        self._count = 0
+
+    def aggregate(self) -> dict:
+        """Aggregate the values kept, rounded to 3 decimals
+
+        Returns:
+            (dict): As in {'min': 1.0, 'max': 9.0, 'mean': 4.2, 'p95': 8.5, 'last': 3.0}, p95 as the nearest rank,
+                or an empty dict if the buffer is empty
+        """
+        count = len(self)
+        if not count:
+            return {}
+
+        values = sorted(self._values[:count])
+        return {
+            'min': round(values[0], 3),
+            'max': round(values[-1], 3),
+            'mean': round(sum(values) / count, 3),
+            'p95': round(values[ceil(0.95 * count) - 1], 3),
+            'last': round(self._values[self._next - 1], 3),
+        }
+
+
+class HighFrequencySampler:
+    METRICS = ('cpu_usage', 'thermal_zones', 'hwmon', 'net')
+
+    def __init__(
+            self, metrics: tuple, interval_sec: float = 1, size: int = 600, hwmon_names: tuple = None,
+            net_skip: tuple = (), thermal_root: str = THERMAL_ROOT, hwmon_root: str = HWMON_ROOT,
+            net_dev_path: str = NET_DEV_PATH,
+    ):
+        """Sample metrics in a background thread, into one ring buffer per value
+
+        Metrics whose sources cannot be opened are left out, and listed in the unavailable attribute.
+        Network counters are sampled as rates, in megabits per second, between consecutive samples.
+
+        Args:
+            metrics (tuple): Metrics to sample, out of METRICS
+            interval_sec (float, optional): Seconds between samples
+            size (int, optional): Samples kept per value, for collections slower than size * interval_sec
+            hwmon_names (tuple, optional): Sample only hwmon sensors with these names, instead of all
+            net_skip (tuple, optional): Network device names to ignore
+            thermal_root (str, optional): Thermal class directory
+            hwmon_root (str, optional): Hwmon class directory
+            net_dev_path (str, optional): Network devices file
+
+        Raises:
+            ValueError: If a metric is unknown
+        """
+        unknown = set(metrics) - set(self.METRICS)
+        if unknown:
+            raise ValueError(f'Unknown sampled metrics {sorted(unknown)}: use some of {self.METRICS}')
+
+        self.metrics = tuple(metrics)
+        self.interval_sec = interval_sec
+        self.size = size
+        self.net_skip = net_skip
+        self.unavailable = []
+
+        self._lock = Lock()
+        self._usage = RingBuffer(size)
+        self._zones = []  # one buffer per zone reader
+        self._sensors = {}  # sensor name: buffer
+        self._net = {}  # device: (buffer in, buffer out, slot in the previous counters)
+        self._net_previous = array('d')  # in, out counters of each device, in bytes, then their sampling time
+
+        openers = {
+            'cpu_usage': lambda: CpuSampler(min_window_sec=0),
+            'thermal_zones': lambda: ThermalZonesReader(thermal_root),
+            'hwmon': lambda: HwmonReader(hwmon_root, names=hwmon_names),
+            'net': lambda: FileReader(net_dev_path),
+        }
+
+        sources = {}
+        for metric in self.metrics:
+            try:
+                sources[metric] = openers[metric]()
+            except OSError:
+                self.unavailable.append(metric)
+
+        self._cpu = sources.get('cpu_usage')
+        self._thermal = sources.get('thermal_zones')
+        self._hwmon = sources.get('hwmon')
+        self._net_dev = sources.get('net')
+
+        if self._thermal:
+            self._zones = [RingBuffer(size) for _ in self._thermal.readers]
+
+        if self._hwmon:
+            self._sensors = {name: RingBuffer(size) for name in self._hwmon.readers}
+
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name='sampler', daemon=True)
+        self._thread.start()
+
+    def sample(self):
+        """Sample every available metric once, as the background thread does every interval_sec"""
+        with self._lock:
+            if self._cpu:
+                self._usage.append(self._cpu.sample()['usage'])
+
+            for reader, buffer in zip(self._thermal.readers if self._thermal else (), self._zones):
+                try:
+                    raw = reader.read().strip()
+                except OSError:
+                    continue
+                if raw:
+                    buffer.append(float(raw) / 1000)
+
+            for name, reader in (self._hwmon.readers.items() if self._hwmon else ()):
+                try:
+                    raw = reader.read().strip()
+                except OSError:
+                    continue
+                if raw:
+                    self._sensors[name].append(float(raw) / 1000)
+
+            if self._net_dev:
+                self._sample_net(self._net_dev.read().splitlines(), monotonic())
+
+    def aggregate(self) -> dict:
+        """Aggregate the samples taken since the previous call, and start over
+
+        Returns:
+            (dict): Aggregates by metric (see RingBuffer.aggregate), as in {'cpu_usage': {...},
+                'thermal_zones': [{...}, ...], 'hwmon': {'Package id 0': {...}}, 'net': {'eth0': {'in': {...}}}}
+        """
+        res = {}
+
+        with self._lock:
+            if self._cpu and len(self._usage):
+                res['cpu_usage'] = self._usage.aggregate()
+
+            zones = [buffer.aggregate() for buffer in self._zones if len(buffer)]
+            if zones:
+                res['thermal_zones'] = zones
+
+            sensors = {name: buffer.aggregate() for name, buffer in self._sensors.items() if len(buffer)}
+            if sensors:
+                res['hwmon'] = sensors
+
+            net = {
+                device: {'in': buffer_in.aggregate(), 'out': buffer_out.aggregate()}
+                for device, (buffer_in, buffer_out, _) in self._net.items() if len(buffer_in)
+            }
+            if net:
+                res['net'] = net
+
+            for buffer in (self._usage, *self._zones, *self._sensors.values()):
+                buffer.clear()
+            for buffer_in, buffer_out, _ in self._net.values():
+                buffer_in.clear()
+                buffer_out.clear()
+
+        return res
+
+    def close(self):
+        """Stop sampling and release the files kept open"""
+        self._stop.set()
+        self._thread.join()
+
+        for reader in (self._thermal.readers if self._thermal else ()):
+            reader.close()
+        if self._hwmon:
+            self._hwmon.close()
+        if self._net_dev:
+            self._net_dev.close()
+
+    def _run(self):
+        next_at = monotonic() + self.interval_sec
+        while not self._stop.wait(max(next_at - monotonic(), 0)):
+            try:
+                self.sample()
+            except (OSError, ValueError):  # a source gone or garbled: try again on the next sample
+                pass
+
+            next_at = max(next_at + self.interval_sec, monotonic())
+
+    def _sample_net(self, lines: list, now: float):
+        previous = self._net_previous
+
+        for line in lines[2:]:
+            if ':' not in line:
+                continue
+
+            device, info = line.split(':', 1)
+            device = device.strip()
+            if device in self.net_skip:
+                continue
+
+            info = info.split()
+            counter_in, counter_out = float(info[0]), float(info[8])
+
+            if device not in self._net:
+                self._net[device] = (RingBuffer(self.size), RingBuffer(self.size), len(previous))
+                previous.extend((counter_in, counter_out, now))
+                continue
+
+            buffer_in, buffer_out, slot = self._net[device]
+            elapsed = now - previous[slot + 2]
+            delta_in, delta_out = counter_in - previous[slot], counter_out - previous[slot + 1]
+            previous[slot], previous[slot + 1], previous[slot + 2] = counter_in, counter_out, now
+
+            if elapsed <= 0 or delta_in < 0 or delta_out < 0:  # counters reset (i.e.: device re-created)
+                continue
+
+            buffer_in.append(delta_in * 8 / 1000 ** 2 / elapsed)
+            buffer_out.append(delta_out * 8 / 1000 ** 2 / elapsed)
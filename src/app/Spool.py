@@ -0,0 +1,140 @@
+"""Local disk spool for messages not delivered to Kafka
+
+Messages are appended to segment files as length-prefixed records, keeping their topic, key, value and
+original timestamp. The spool is capped in size by evicting its oldest segments, and read back via mmap.
+"""
+from mmap import mmap, ACCESS_READ
+from pathlib import Path
+from struct import Struct
+from threading import Lock
+
+LENGTH = Struct('!I')
+HEADER = Struct('!qHH')  # timestamp in milliseconds, topic length, key length
+
+
+class Spool:
+    SUFFIX = '.seg'
+
+    def __init__(self, directory: Path, max_mb: float = 64, segments: int = 4):
+        """Instantiate a spool, keeping the records of previous runs
+
+        Args:
+            directory (Path): Directory to store segment files, created if missing
+            max_mb (float, optional): Size cap for all segments, oldest segments are removed beyond it
+            segments (int, optional): Segments to split the size cap in, so eviction removes a fraction of it
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.max_bytes = int(max_mb * 1024 ** 2)
+        self.segment_bytes = max(self.max_bytes // segments, 1)
+
+        self._lock = Lock()
+        self._current = None
+
+    @property
+    def empty(self) -> bool:
+        """Whether there is no record to replay"""
+        with self._lock:  # segments may be removed by the thread serving delivery reports
+            return not any(segment.stat().st_size for segment in self.segments())
+
+    @property
+    def size(self) -> int:
+        """Bytes in all segments"""
+        with self._lock:
+            return sum(segment.stat().st_size for segment in self.segments())
+
+    def segments(self) -> list:
+        """Segment files, oldest first"""
+        return sorted(self.directory.glob(f'*{self.SUFFIX}'))
+
+    def append(self, timestamp: int, topic: str, key: bytes, value: bytes):
+        """Append a record, evicting the oldest segments if the size cap is exceeded
+
+        Args:
+            timestamp (int): Original message timestamp, in milliseconds
+            topic (str): Topic the message was produced to
+            key (bytes): Message key, or None
+            value (bytes): Message value
+        """
+        topic = topic.encode()
+        key = key or b''
+        record = HEADER.pack(timestamp, len(topic), len(key)) + topic + key + value
+
+        with self._lock:
+            if self._current is None or self._current.stat().st_size >= self.segment_bytes:
+                self._current = self._new_segment()
+
+            with open(self._current, 'ab') as f:
+                f.write(LENGTH.pack(len(record)) + record)
+
+            self._evict()
+
+    def seal(self) -> list:
+        """Close the current segment, so the next records go to a new one
+
+        Returns:
+            (list): Sealed segments, oldest first, safe to be read and removed
+        """
+        with self._lock:
+            self._current = None
+            return self.segments()
+
+    def records(self, segment: Path) -> iter:
+        """Read records from a segment
+
+        A record truncated by an interrupted write ends the segment.
+
+        Args:
+            segment (Path): Segment file, as listed by segments()
+
+        Yields:
+            (tuple): Timestamp in milliseconds, topic, key (or None) and value
+        """
+        with open(segment, 'rb') as f:
+            if not segment.stat().st_size:
+                return
+
+            with mmap(f.fileno(), 0, access=ACCESS_READ) as buffer:
+                offset = 0
+                end = len(buffer)
+
+                while offset + LENGTH.size <= end:
+                    (length,) = LENGTH.unpack_from(buffer, offset)
+                    offset += LENGTH.size
+                    if offset + length > end:
+                        break
+
+                    timestamp, topic_length, key_length = HEADER.unpack_from(buffer, offset)
+                    start = offset + HEADER.size
+                    topic = buffer[start:start + topic_length].decode()
+                    start += topic_length
+                    key = buffer[start:start + key_length] or None
+                    start += key_length
+                    value = buffer[start:offset + length]
+
+                    offset += length
+                    yield timestamp, topic, key, value
+
+    def remove(self, segment: Path):
+        """Remove a segment, as once all its replayed records were reported by the producer
+
+        Args:
+            segment (Path): Segment file, as listed by segments()
+        """
+        with self._lock:
+            segment.unlink(missing_ok=True)
+
+    def _new_segment(self) -> Path:
+        segments = self.segments()
+        sequence = int(segments[-1].stem) + 1 if segments else 0
+        return self.directory / f'{sequence:012d}{self.SUFFIX}'
+
+    def _evict(self):
+        segments = self.segments()
+        total = sum(segment.stat().st_size for segment in segments)
+
+        while total > self.max_bytes and len(segments) > 1:
+            oldest = segments.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink()
@@ -11,11 +11,103 @@ This module manages environment variables and fallback values:
 
 Regarding decouple, the dependency responsible for fetching environment variables, the precedence order is:
 - command-line variable > .env file > fallback value (if set)
+
+Resolved values are kept in a snapshot next to `.env` (`.env.snapshot`), so later runs neither import decouple
+nor parse `.env`. The snapshot is rebuilt once `.env` or this module change, or once any variable read here is
+set differently in the environment. Set CONFIG_SNAPSHOT=0 to bypass it.
 """
-from decouple import config
+import pickle
+from os import environ, stat
 from pathlib import Path
 from tempfile import gettempdir
 
+
+class Snapshot:
+    def __init__(self, search_dir: Path, module: Path = Path(__file__)):
+        """Resolve config values with decouple, or from the snapshot of a previous run
+
+        Args:
+            search_dir (Path): Directory to look for `.env` from, then its parents, as decouple does
+            module (Path, optional): Module declaring the values, whose changes invalidate the snapshot
+        """
+        self.search_dir = Path(search_dir)
+        self.env_file = _find_env_file(self.search_dir)
+        self.path = self.env_file.with_name(f'{self.env_file.name}.snapshot') if self.env_file else None
+        self.stamp = tuple(_stamp(path) for path in (module, self.env_file))
+
+        self.values = {}
+        self.environ = {}  # key: value in the environment when resolved, None if unset
+        self.changed = False
+        self._decouple = None
+
+        if environ.get('CONFIG_SNAPSHOT', '1') == '0':
+            self.path = None
+
+        if self.path:
+            self._load()
+
+    def __call__(self, key: str, **kwargs):
+        """Value of a config key, as in `decouple.config(key, default=..., cast=...)`"""
+        if key in self.values:
+            return self.values[key]
+
+        if self._decouple is None:
+            from decouple import AutoConfig
+            self._decouple = AutoConfig(search_path=str(self.search_dir))
+
+        value = self._decouple(key, **kwargs)
+        self.values[key] = value
+        self.environ[key] = environ.get(key)
+        self.changed = True
+        return value
+
+    def save(self):
+        """Store the resolved values, if any was not in the snapshot. Failures are ignored (i.e.: read-only dir)"""
+        if not self.path or not self.changed:
+            return
+
+        tmp = self.path.with_name(f'{self.path.name}.tmp')
+        try:
+            tmp.write_bytes(pickle.dumps((self.stamp, self.environ, self.values), protocol=pickle.HIGHEST_PROTOCOL))
+            tmp.replace(self.path)
+            self.changed = False
+        except (OSError, pickle.PicklingError):
+            pass
+
+    def _load(self):
+        try:
+            stamp, env, values = pickle.loads(self.path.read_bytes())
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return
+
+        if stamp != self.stamp or any(environ.get(key) != value for key, value in env.items()):
+            return
+
+        self.values, self.environ = values, env
+
+
+def _find_env_file(path: Path) -> Path:
+    for directory in (path, *path.parents):
+        for name in ('settings.ini', '.env'):  # in decouple's order
+            if (directory / name).is_file():
+                return directory / name
+    return None
+
+
+def _stamp(path: Path) -> tuple:
+    if path is None:
+        return None
+    st = stat(path)
+    return str(path), st.st_mtime_ns, st.st_size
+
+
+def _csv(value: str) -> list:
+    from decouple import Csv
+    return Csv()(value)
+
+
+config = Snapshot(Path(__file__).resolve().parent)
+
 LOG_LEVEL: str = config('LOG_LEVEL', default='INFO')
 
 APP_NAME: str = config('APP_NAME', default='App Name')
@@ -36,6 +128,51 @@ GREP_CMD_PATH: str = config('GREP_CMD_PATH', default='/usr/bin/grep')
 CAT_CMD_PATH: str = config('CAT_CMD_PATH', default='/usr/bin/cat')
 SENSORS_CMD_PATH: str = config('SENSORS_CMD_PATH', default='/usr/bin/sensors')
 NVIDIA_CMD_PATH: str = config('NVIDIA_CMD_PATH', default='/usr/bin/nvidia-smi')
+NVIDIA_STREAM_MS: int = config('NVIDIA_STREAM_MS', cast=int, default='1000')
+
+COLLECTOR_WORKERS: int = config('COLLECTOR_WORKERS', cast=int, default='8')
+PARTITIONS_REFRESH_SEC: float = config('PARTITIONS_REFRESH_SEC', cast=float, default='600')
+
+PROBE_TIMEOUT_SEC: float = config('PROBE_TIMEOUT_SEC', cast=float, default='10')
+PROBE_INTERVALS: dict = {  # as in 'storage:300,nvidia:5', seconds between runs of each probe (default: every run)
+    k: float(v) for k, v in (i.split(':') for i in config('PROBE_INTERVALS', cast=_csv, default='storage:300'))
+}
+PROBE_TIMEOUTS: dict = {  # as in 'nvidia:3,sensors:2', seconds a probe may take (default: PROBE_TIMEOUT_SEC)
+    k: float(v) for k, v in (i.split(':') for i in config('PROBE_TIMEOUTS', cast=_csv, default=''))
+}
+
+PROBE_META: bool = config('PROBE_META', cast=bool, default=False)
+PROBE_STATS_PATH: Path = config('PROBE_STATS_PATH', cast=lambda v: Path(v).resolve() if v else None, default='')
+
+CPU_SAMPLE_MIN_WINDOW_SEC: float = config('CPU_SAMPLE_MIN_WINDOW_SEC', cast=float, default='0.2')
+CPU_USAGE_DETAIL: bool = config('CPU_USAGE_DETAIL', cast=bool, default=False)
+CPU_USAGE_PER_CORE: bool = config('CPU_USAGE_PER_CORE', cast=bool, default=False)
+NET_RAW_COUNTERS: bool = config('NET_RAW_COUNTERS', cast=bool, default=False)
+
+SAMPLE_METRICS: list = config('SAMPLE_METRICS', cast=_csv, default='')  # cpu_usage, thermal_zones, hwmon, net
+SAMPLE_INTERVAL_SEC: float = config('SAMPLE_INTERVAL_SEC', cast=float, default='1')
+SAMPLE_BUFFER_SIZE: int = config('SAMPLE_BUFFER_SIZE', cast=int, default='600')
 
 KAFKA_BROKERS: list = sorted(d for d in config('KAFKA_BROKERS', default='').split(','))
 KAFKA_TOPIC: str = config('KAFKA_TOPIC', default=PROJECT_NAME)
+KAFKA_ENCODING: str = config('KAFKA_ENCODING', default='json')  # json or binary (see app.Codec)
+KAFKA_KEYFRAME_EVERY: int = config('KAFKA_KEYFRAME_EVERY', cast=int, default='0')
+KAFKA_COMPRESSION: str = config('KAFKA_COMPRESSION', default='zstd')  # none, gzip, snappy, lz4 or zstd
+KAFKA_LINGER_MS: int = config('KAFKA_LINGER_MS', cast=int, default='1000')
+KAFKA_BATCH_MESSAGES: int = config('KAFKA_BATCH_MESSAGES', cast=int, default='1000')
+KAFKA_MESSAGE_TIMEOUT_MS: int = config('KAFKA_MESSAGE_TIMEOUT_MS', cast=int, default='10000')
+
+SPOOL_DIR: Path = Path(config('SPOOL_DIR', default=f'{gettempdir()}/{PROJECT_NAME}/spool')).resolve()
+SPOOL_MAX_MB: float = config('SPOOL_MAX_MB', cast=float, default='64')
+
+DAEMON_INTERVAL_SEC: float = config('DAEMON_INTERVAL_SEC', cast=float, default='60')
+
+GATEWAY_HOSTS: list = config('GATEWAY_HOSTS', cast=_csv, default='')
+GATEWAY_AGENT_COMMAND: str = config(  # {host} and {python} (the gateway interpreter) are replaced per host
+    'GATEWAY_AGENT_COMMAND',
+    default='ssh -o BatchMode=yes {host} cd telemetry-publisher && bash setup/run.bash --agent',
+)
+GATEWAY_WORKERS: int = config('GATEWAY_WORKERS', cast=int, default='16')
+GATEWAY_TIMEOUT_SEC: float = config('GATEWAY_TIMEOUT_SEC', cast=float, default='15')
+
+config.save()
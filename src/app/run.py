@@ -1,32 +1,305 @@
 """Application main module"""
+from argparse import ArgumentParser
 from datetime import datetime as _dt
+from importlib import import_module
 from random import randint
+from signal import signal, SIGINT, SIGTERM
 from sys import exit, version
+from threading import Event, Thread
+from time import monotonic
 
+from .Codec import Snapshot
 from .config import (
     APP_NAME,
     APP_VERSION,
+    DAEMON_INTERVAL_SEC,
+    GATEWAY_HOSTS,
     KAFKA_BROKERS,
+    KAFKA_KEYFRAME_EVERY,
     KAFKA_TOPIC,
+    SPOOL_DIR,
+    SPOOL_MAX_MB,
 )
 from .Logger import Logger
 
-from .Collector import Collector
-from .Kafka import Producer
-
 cid = str(randint(1000, 9999))
 obj = Logger(cid=cid)
 log = obj.logger
 
 
-def start():
-    """Application runner"""
+def start(argv: list = None):
+    """Application runner
+
+    Args:
+        argv (list, optional): Command line arguments, defaults to sys.argv
+    """
+    args = parse_args(argv)
+
     log.info('{s}- Start {a} v{v} {s}-'.format(s='-*' * 5, a=APP_NAME, v=APP_VERSION))
     log.info('Running over Python v{}'.format(version.replace('\n', '')))
     # todo: log OS info
 
+    if args.agent:
+        agent(device=args.device)
+        return
+
+    if args.gateway:
+        gateway(interval=args.interval, once=not args.daemon)
+        return
+
+    if args.daemon:
+        (daemon_async if args.asyncio else daemon)(interval=args.interval)
+        return
+
+    # The publishing modules (confluent_kafka and its dependencies) are imported while collecting
+    importer = Thread(target=import_module, args=('.Kafka', __package__), name='import-kafka', daemon=True)
+    importer.start()
+
+    collector = _start_collector()
+    data = _snapshot(collector)
+    collector.close()
+
+    from .Kafka import Producer
+    from .Spool import Spool
+
+    producer = Producer(brokers=KAFKA_BROKERS, logger=log, spool=Spool(SPOOL_DIR, SPOOL_MAX_MB))
+    producer.stream(messages=[data], topic=KAFKA_TOPIC, key=collector.device)
+    producer.close(timeout=0)
+    log.info("Published data points for cid #{}: [{}]".format(cid, ', '.join(data.keys())))
+
+
+def daemon(interval: float = DAEMON_INTERVAL_SEC):
+    """Keep one Collector and one Producer alive and publish every interval seconds
+
+    Ticks are scheduled over the monotonic clock from the first collection, so the time spent collecting
+    and publishing does not push the next ones. Ticks missed by a slow collection are skipped, not queued.
+    SIGTERM and SIGINT stop the loop and pending messages are flushed before returning.
+
+    Args:
+        interval (float, optional): Seconds between collections
+    """
+    if interval <= 0:
+        log.critical(f'Invalid daemon interval: {interval}. ABORT!')
+        exit(1)
+
+    stop = Event()
+
+    def _stop(signum, _frame):
+        log.info(f'Received signal {signum}: stop after the current collection')
+        stop.set()
+
+    signal(SIGTERM, _stop)
+    signal(SIGINT, _stop)
+
+    from .Kafka import Producer
+    from .Spool import Spool
+
+    collector = _start_collector(cache_sec=interval / 2, streaming=True)
+    producer = Producer(
+        brokers=KAFKA_BROKERS, logger=log, batch=True, spool=Spool(SPOOL_DIR, SPOOL_MAX_MB),
+        keyframe_every=KAFKA_KEYFRAME_EVERY,
+    )
+    log.info(f'Daemon started for {collector.device!r}: collect every {interval} seconds')
+
+    next_tick = monotonic()
+    while not stop.is_set():
+        data = _snapshot(collector)
+        producer.stream(messages=[data], topic=KAFKA_TOPIC, key=collector.device)
+        log.debug("Queued data points for cid #{}: [{}]".format(cid, ', '.join(data.keys())))
+
+        next_tick = _next_tick(next_tick, interval)
+        stop.wait(timeout=next_tick - monotonic())
+
+    collector.close()
+    producer.close()
+    log.info(f'Daemon stopped for cid #{cid}')
+
+
+def daemon_async(interval: float = DAEMON_INTERVAL_SEC):
+    """Run the daemon over one asyncio event loop, as daemon() does with threads
+
+    Probes run as tasks of the loop, with the AsyncCollector, and Kafka delivery reports are served by a task
+    of the same loop instead of a polling thread.
+
+    Args:
+        interval (float, optional): Seconds between collections
+    """
+    if interval <= 0:
+        log.critical(f'Invalid daemon interval: {interval}. ABORT!')
+        exit(1)
+
+    import asyncio
+
+    collector = _start_collector(asynchronous=True, cache_sec=interval / 2, streaming=True)
+    log.info(f'Async daemon started for {collector.device!r}: collect every {interval} seconds')
+
+    async def _collect():
+        return [(collector, await collector.collect())]
+
+    async def _close():
+        collector.close()
+
+    asyncio.run(_publish_loop(interval, collect=_collect, close=_close))
+
+
+def agent(device: str = None):
+    """Serve collections of this host to a gateway, one JSON line on stdout per line on stdin (see app.Agent)
+
+    Args:
+        device (str, optional): Device name to answer with, instead of this host's
+    """
+    from .Agent import serve
+
+    collector = _start_collector(cache_sec=0, streaming=True)
+    log.info(f'Agent started for {device or collector.device!r}: serve collections until stdin is closed')
+
+    answered = serve(collector, device=device)
+    collector.close()
+    log.info(f'Agent stopped for cid #{cid}, after {answered} collection(s)')
+
+
+def gateway(interval: float = DAEMON_INTERVAL_SEC, once: bool = False):
+    """Collect from the GATEWAY_HOSTS through their agents and publish each snapshot keyed by its device
+
+    Agents are kept running between collections, over one asyncio event loop (see app.Gateway).
+
+    Args:
+        interval (float, optional): Seconds between collections
+        once (bool, optional): Collect and publish once, then stop the agents and exit
+    """
+    if not GATEWAY_HOSTS:
+        log.critical('No GATEWAY_HOSTS declared: update the env.toml file and then check .env. ABORT!')
+        exit(1)
+
+    if interval <= 0:
+        log.critical(f'Invalid daemon interval: {interval}. ABORT!')
+        exit(1)
+
+    import asyncio
+    from .Gateway import Gateway
+
+    hosts = Gateway(GATEWAY_HOSTS, logger=log)
+    log.info(f'Gateway started for {len(GATEWAY_HOSTS)} host(s)' + ('' if once else f', every {interval} seconds'))
+
+    asyncio.run(_publish_loop(interval, collect=hosts.collect, close=hosts.close, once=once))
+
+
+async def _publish_loop(interval: float, collect: callable, close: callable, once: bool = False):
+    """Publish what collect() returns every interval seconds, serving Kafka delivery reports in the same loop
+
+    Args:
+        interval (float): Seconds between collections
+        collect (callable): Coroutine function returning (source, data points) pairs, sources having a device
+        close (callable): Coroutine function closing the sources, once stopped
+        once (bool, optional): Publish once, then stop
+    """
+    import asyncio
+    from .Kafka import Producer
+    from .Spool import Spool
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def _stop(signum):
+        log.info(f'Received signal {signum}: stop after the current collection')
+        stop.set()
+
+    for signum in (SIGTERM, SIGINT):
+        loop.add_signal_handler(signum, _stop, signum)
+
+    producer = Producer(
+        brokers=KAFKA_BROKERS, logger=log, batch=True, spool=Spool(SPOOL_DIR, SPOOL_MAX_MB),
+        keyframe_every=KAFKA_KEYFRAME_EVERY, poll_thread=False,
+    )
+
+    async def _serve_deliveries():
+        while not stop.is_set():
+            producer.poll(timeout=0)
+            await asyncio.sleep(0.5)
+
+    server = asyncio.create_task(_serve_deliveries(), name='kafka-poll')
+
+    next_tick = monotonic()
+    while not stop.is_set():
+        for source, probed in await collect():
+            data = _snapshot(source, probed=probed)
+            producer.stream(messages=[data], topic=KAFKA_TOPIC, key=source.device)
+            log.debug("Queued data points of {} for cid #{}: [{}]".format(source.device, cid, ', '.join(data.keys())))
+
+        if once:
+            break
+
+        next_tick = _next_tick(next_tick, interval)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=next_tick - monotonic())
+        except asyncio.TimeoutError:
+            pass
+
+    stop.set()
+    await server
+    await close()
+    producer.close()
+    log.info(f'Daemon stopped for cid #{cid}')
+
+
+def _next_tick(next_tick: float, interval: float) -> float:
+    """Next tick over the monotonic clock, skipping the ticks missed by a slow collection instead of queueing them"""
+    now = monotonic()
+    next_tick += interval
+    if next_tick <= now:
+        skipped = int((now - next_tick) // interval) + 1
+        log.warning(f'Collection and publishing took longer than {interval} seconds: skip {skipped} tick(s)')
+        next_tick += skipped * interval
+
+    return next_tick
+
+
+def parse_args(argv: list = None):
+    """Parse command line arguments
+
+    Args:
+        argv (list, optional): Command line arguments, defaults to sys.argv
+
+    Returns:
+        (argparse.Namespace): Parsed arguments
+    """
+    parser = ArgumentParser(prog='app', description=f'{APP_NAME} v{APP_VERSION}')
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help='keep running and publish every --interval seconds, instead of publishing once and exit',
+    )
+    parser.add_argument(
+        '--interval', type=float, default=DAEMON_INTERVAL_SEC,
+        help=f'seconds between collections in daemon mode (default: {DAEMON_INTERVAL_SEC})',
+    )
+    parser.add_argument(
+        '--async', dest='asyncio', action='store_true',
+        help='in daemon mode, run probes and Kafka delivery reports over one asyncio event loop, instead of threads',
+    )
+    parser.add_argument(
+        '--gateway', action='store_true',
+        help='collect from the GATEWAY_HOSTS through their agents and publish a snapshot per host (with --daemon, '
+             'keep the agents running and publish every --interval seconds)',
+    )
+    parser.add_argument(
+        '--agent', action='store_true',
+        help='serve collections of this host to a gateway, over stdin and stdout, until stdin is closed',
+    )
+    parser.add_argument(
+        '--device', default=None,
+        help='in agent mode, device name to answer with, instead of this host name (i.e.: for stand-in hosts)',
+    )
+    return parser.parse_args(argv)
+
+
+def _start_collector(asynchronous: bool = False, **kwargs) -> 'Collector':  # noqa: F821, imported on demand
+    if asynchronous:
+        from .AsyncCollector import AsyncCollector as Collector
+    else:
+        from .Collector import Collector
+
     try:
-        collector = Collector(logger=log)
+        collector = Collector(logger=log, **kwargs)
         log.debug(f'Device: {collector.device}')
 
     except OSError as e:
@@ -35,30 +308,27 @@ def start():
         log.warning('Note: increase the log level to get more details on this error')
         exit(1)
 
-    data = {}
+    return collector
+
+
+def _snapshot(collector: 'Collector', probed: dict = None) -> Snapshot:  # noqa: F821
+    now = _dt.utcnow()
+    snapshot = Snapshot(now.timestamp(), collector.device, now.strftime("%F %T +00:00"))
 
     try:
-        now = _dt.utcnow()
-        data = {
-            'epoch': now.timestamp(),
-            'device': collector.device,
-            'collected_at': now.strftime("%F %T +00:00"),
-        }
-        data.update({k: v for k, v in collector.data.items() if k != 'epoch'})
+        snapshot.points = collector.data if probed is None else probed  # collected already by an AsyncCollector
 
     except OSError as e:
         for err in str(e).split('\n'):
             log.debug(err)
 
     finally:
-        log.debug(f"Send to stream: {data}")
+        log.debug(f"Send to stream: {snapshot}")
 
-        if len(data) == 2:  # {'device': _, 'collected_at': _}
+        if len(snapshot) == 2:  # {'device': _, 'collected_at': _}
             log.warning('No data from Collector - Increase log level and see what can be done.')
 
-    producer = Producer(brokers=KAFKA_BROKERS, logger=log)
-    producer.stream(messages=[data], topic=KAFKA_TOPIC, key=collector.device)
-    log.info("Published data points for cid #{}: [{}]".format(cid, ', '.join(data.keys())))
+    return snapshot
 
 
 if __name__ == "__main__":
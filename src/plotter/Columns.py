@@ -0,0 +1,107 @@
+"""Columnar buffers for telemetry messages
+
+Decoded messages are appended as values to typed arrays, one per field, instead of being kept as dicts.
+NumPy arrays are built from the buffers once, so data frames and rates (see Rates) are computed without per-row objects.
+"""
+from array import array
+from math import nan
+
+import numpy as np
+
+from Rates import NET_UNITS
+
+
+class TelemetryColumns:
+    def __init__(self):
+        """Buffer epoch, CPU and RAM usage, and network counters per device, of one host"""
+        self.epoch = array('d')
+        self.clock = array('d')  # monotonic seconds network counters were sampled at, if published raw
+        self.cpu = array('d')
+        self.ram = array('d')
+        self.net = {}  # device: (rows, in, out), as devices are not reported in every message, rows as int64
+
+    def __len__(self) -> int:
+        return len(self.epoch)
+
+    def append(self, snapshot: 'Snapshot'):  # noqa: F821, see app.Codec
+        """Append one decoded message
+
+        Non numeric usage values are buffered as 0.0, and non numeric network counters, or in unknown units,
+        are left out. Counters are buffered in megabits, by the unit they were published in ('net_units').
+
+        Args:
+            snapshot (Snapshot): Decoded message, with its timestamp as epoch, as in
+                Snapshot.from_message({'cpu': {'usage': 1.0}, 'net': {'eth0': {'in': 1.0, ...}}}, epoch)
+        """
+        row = len(self.epoch)
+        points = snapshot.points
+        clock = _number(points.get('net_sampled_at'))
+        scale = NET_UNITS.get(points.get('net_units', 'Mb'))
+
+        self.epoch.append(snapshot.epoch)
+        self.clock.append(clock if clock is not None else nan)
+        self.cpu.append(_number(points.get('cpu', {}).get('usage'), 0.0))
+        self.ram.append(_number(points.get('ram', {}).get('usage'), 0.0))
+
+        for dev, data in (points.get('net', {}) if scale is not None else {}).items():
+            counters_in, counters_out = _number(data.get('in')), _number(data.get('out'))
+            if counters_in is None or counters_out is None:
+                continue
+
+            if dev not in self.net:
+                self.net[dev] = (array('q'), array('d'), array('d'))
+
+            rows, values_in, values_out = self.net[dev]
+            rows.append(row)
+            values_in.append(counters_in * scale)
+            values_out.append(counters_out * scale)
+
+    def extend(self, other: 'TelemetryColumns'):
+        """Append the buffered messages of another instance, as buffered by another process
+
+        Args:
+            other (TelemetryColumns): Buffered messages of the same host
+        """
+        offset = len(self)
+        self.epoch.extend(other.epoch)
+        self.clock.extend(other.clock)
+        self.cpu.extend(other.cpu)
+        self.ram.extend(other.ram)
+
+        for dev, (rows, values_in, values_out) in other.net.items():
+            if dev not in self.net:
+                self.net[dev] = (array('q'), array('d'), array('d'))
+
+            self.net[dev][0].frombytes((np.frombuffer(rows, dtype=np.int64) + offset).tobytes())
+            self.net[dev][1].extend(values_in)
+            self.net[dev][2].extend(values_out)
+
+    def arrays(self) -> dict:
+        """Build NumPy arrays from the buffers, sorted by epoch
+
+        Messages of a host are consumed in order from a partition, but not across partitions.
+
+        Returns:
+            (dict): Arrays of a same length, as in {'epoch': ..., 'clock': ..., 'cpu': ..., 'eth0_in': ...},
+                clock and network counters set as NaN in the rows they were not reported
+        """
+        columns = {
+            'epoch': np.frombuffer(self.epoch, dtype=np.float64).copy(),
+            'clock': np.frombuffer(self.clock, dtype=np.float64).copy(),
+            'cpu': np.frombuffer(self.cpu, dtype=np.float64).copy(),
+            'ram': np.frombuffer(self.ram, dtype=np.float64).copy(),
+        }
+
+        for dev, (rows, values_in, values_out) in self.net.items():
+            index = np.frombuffer(rows, dtype=np.int64)
+            for direction, values in (('in', values_in), ('out', values_out)):
+                column = np.full(len(self), np.nan)
+                column[index] = np.frombuffer(values, dtype=np.float64)
+                columns[f'{dev}_{direction}'] = column
+
+        order = np.argsort(columns['epoch'], kind='stable')
+        return {name: column[order] for name, column in columns.items()}
+
+
+def _number(value, default: float = None) -> float:
+    return float(value) if isinstance(value, (float, int)) else default
@@ -1,125 +1,386 @@
 """Kafka module to consume messages for Telemetry"""
-from copy import deepcopy
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime as _dt, timedelta
-from json import loads
+from multiprocessing import get_context
+from pathlib import Path
 
-from confluent_kafka import Consumer, TopicPartition
+from confluent_kafka import Consumer, KafkaError, TopicPartition, OFFSET_BEGINNING, OFFSET_END
 from confluent_kafka.cimpl import Message
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # share the wire formats with the app, in src/
+from app.Codec import DeltaDecoder, Snapshot, decode  # noqa: E402
+from Columns import TelemetryColumns  # noqa: E402
+from Rates import RateEngine  # noqa: E402
+from Rollup import hourly_sums, merge_hourly  # noqa: E402
+
+WORKERS_CONTEXT = get_context('spawn')  # not forked, as librdkafka is not fork-safe: workers build their consumer
+
 
 class KafkaConsumer:
-    def __init__(self, server: str, kafka_topics: list, consumer_id: str = None):
+    def __init__(self, server: str, kafka_topics: list, consumer_id: str = None, partitions: list = None):
         """Kafka consumer abstract class
 
         Args:
             server (str): Broker's host and port, as in '127.0.0.1:9092'
             kafka_topics (list): Topics in Broker to consume from
             consumer_id (str, optional): ID to avoid skipping messages consumed by others
+            partitions (list, optional): Partition numbers to read, or None for all partitions
         """
         config = {
             'bootstrap.servers': server,
             'group.id': consumer_id or 'consumer',
             'auto.offset.reset': 'earliest',
             'enable.auto.commit': 'false',
+            'enable.partition.eof': 'true',  # report the end of each partition, to stop without waiting idle
         }
 
+        self.server = server
+        self.consumer_id = config['group.id']
+        self.partitions = partitions
+
         self.consumer = Consumer(config)
         self.topics = kafka_topics
         self.consumer.subscribe(self.topics)
         self.available_hosts = set()
+        self._ends = {}  # (topic, partition): end offset, of partitions not yet read to the end
+        self.positions = {}  # (topic, partition): offset of the next message to read
 
-    def _assign(self, include_debug: bool = False):
-        partitions = []
-        params = {'offset': 0}
-        params = {}
+    def _assign(self, include_debug: bool = False, since: float = None, offsets: dict = None):
+        """Assign partitions, from the first message at or after since, up to their current end offsets
+
+        Partitions with no message to read are not assigned.
 
+        Args:
+            include_debug (bool, optional): Include the 'log-debug' topic
+            since (float, optional): Epoch, in seconds, to seek to, or None to read from the beginning
+            offsets (dict, optional): Offsets to resume from by (topic, partition), as in self.positions
+                of a previous run, instead of seeking to since
+        """
+        partitions = []
         for topic in (t for t in self.topics if include_debug | (t != 'log-debug')):
             metadata = self.consumer.list_topics(topic, timeout=5)
-            for partition in metadata.topics[topic].partitions:
-                params.update({'topic': topic, 'partition': partition})
-                tp = TopicPartition(**params)
-                partitions.append(tp)
+            partitions += [
+                TopicPartition(topic, partition) for partition in metadata.topics[topic].partitions
+                if self.partitions is None or partition in self.partitions
+            ]
+
+        if since is None:
+            partitions = [TopicPartition(tp.topic, tp.partition, OFFSET_BEGINNING) for tp in partitions]
+        else:
+            timestamp = int(since * 10 ** 3)
+            partitions = self.consumer.offsets_for_times(
+                [TopicPartition(tp.topic, tp.partition, timestamp) for tp in partitions], timeout=10,
+            )
+
+        assigned = []
+        self._ends = {}
+        for tp in partitions:
+            low, high = self.consumer.get_watermark_offsets(tp, timeout=5)
+            start = low if tp.offset == OFFSET_BEGINNING else tp.offset
+            if offsets and (tp.topic, tp.partition) in offsets:
+                start = max(offsets[(tp.topic, tp.partition)], low)  # older messages may be gone with retention
+            elif tp.offset == OFFSET_END:  # no message at or after since
+                continue
+
+            if start >= high:
+                continue
+
+            assigned.append(TopicPartition(tp.topic, tp.partition, start))
+            self._ends[(tp.topic, tp.partition)] = high
+
+        self.consumer.assign(assigned)
+
+    def _track_end(self, msg: Message) -> bool:
+        """Drop partitions from the ones to be read, as they reach their end offset
+
+        Args:
+            msg (Message): Consumed message or event
+
+        Returns:
+            (bool): Whether msg is an event or error, not a message to be handled
+        """
+        tp = (msg.topic(), msg.partition())
+        error = msg.error()
 
-        self.consumer.assign(partitions)
+        if error:
+            if error.code() == KafkaError._PARTITION_EOF:
+                self._ends.pop(tp, None)
+            return True
+
+        self.positions[tp] = msg.offset() + 1
+        if msg.offset() + 1 >= self._ends.get(tp, 0):
+            self._ends.pop(tp, None)
+
+        return False
 
     def _handler(self, msg: Message, threshold_hours: int = None, filter_keys: list = None):
         raise NotImplementedError('Method may be optionally implemented in a child, and can only called from it')
 
 
 class KafkaTelemetryConsumer(KafkaConsumer):
-    def __init__(self, server: str, topic: str = 'telemetry', consumer_id: str = 'telemetry'):
-        super().__init__(server, [topic], consumer_id)
+    KEYFRAME_MARGIN_SEC = 3600  # default margin, for publishers of unknown keyframe intervals
+
+    def __init__(
+            self, server: str, topic: str = 'telemetry', consumer_id: str = 'telemetry', keyframes: dict = None,
+            partitions: list = None, keyframe_margin_sec: float = None,
+    ):
+        """Kafka consumer of telemetry messages, framed or not
+
+        Args:
+            server (str): Broker's host and port, as in '127.0.0.1:9092'
+            topic (str, optional): Topic in Broker to consume from
+            consumer_id (str, optional): ID to avoid skipping messages consumed by others
+            keyframes (dict, optional): Keyframes kept by a previous run, as in self.deltas.keyframes
+            partitions (list, optional): Partition numbers to read, or None for all partitions
+            keyframe_margin_sec (float, optional): Seconds read before the time window, for the keyframes of its
+                first deltas: the publisher's KAFKA_KEYFRAME_EVERY times its interval, or KEYFRAME_MARGIN_SEC if None
+        """
+        super().__init__(server, [topic], consumer_id, partitions)
+        self.deltas = DeltaDecoder(keyframes=keyframes)
+        self.keyframe_margin_sec = self.KEYFRAME_MARGIN_SEC if keyframe_margin_sec is None else keyframe_margin_sec
+        self.consumed = 0
 
     def fetch(self, threshold_days: int, filter_host: str) -> iter:
         """Fetch messages"""
         since = (_dt.utcnow() - timedelta(days=threshold_days)).timestamp()
-        self._assign()
+        self._assign(since=since - self.keyframe_margin_sec)
 
-        previous = {}
-        tpl = {
-            'cpu': 0.0,
-            'ram': 0.0,
-            'net': {},
-        }
+        engine = RateEngine()
 
-        while True:
-            msg = self.consumer.poll(timeout=5)  # Takes around 3.03s to fetch
+        while self._ends:
+            msg = self.consumer.poll(timeout=5)
 
             if msg is None:
                 break
 
-            if not msg.key():
+            if self._track_end(msg) or not msg.key():
                 continue
 
             epoch = msg.timestamp()[1] / 10 ** 3
-
-            if since and (epoch < since):
-                continue
+            expired = since and (epoch < since)
 
             host = msg.key().decode()
 
             if host != filter_host:
-                if isinstance(self.available_hosts, set):
+                if not expired and isinstance(self.available_hosts, set):
                     self.available_hosts.add(host)
                 continue
 
-            if isinstance(self.available_hosts, set):
+            row_id = float(f'{msg.offset()}.{msg.partition()}')
+            loaded = self.deltas.rebuild(host, decode(msg.value()), tag=(row_id, epoch))
+
+            # expired messages are decoded only to keep keyframes, for the next deltas and the ones replayed before
+            rows = [] if expired or loaded is None else [(row_id, epoch, loaded)]
+            if self.deltas.released:  # deltas replayed before their keyframe, rebuilt as it arrived
+                rows += [(late_id, late_epoch, late) for (late_id, late_epoch), late in self.deltas.released
+                         if not since or late_epoch >= since]
+                self.deltas.released.clear()
+
+            if rows and isinstance(self.available_hosts, set):
                 self.available_hosts = None
 
-            decoded = msg.value().decode(errors='replace')
-            loaded = loads(decoded)
-            res = deepcopy(tpl)  # Prevent yielding same dicts
+            for row_id, epoch, loaded in rows:
+                cpu = loaded.get('cpu', {}).get('usage')
+                ram = loaded.get('ram', {}).get('usage')
+
+                yield {
+                    'id': row_id,
+                    'epoch': epoch,
+                    'cpu': cpu if isinstance(cpu, (float, int)) else 0.0,  # non-accumulative values are not calculated
+                    'ram': ram if isinstance(ram, (float, int)) else 0.0,
+                    'net': engine.update(
+                        host, epoch, loaded.get('net', {}), clock=loaded.get('net_sampled_at'),
+                        units=loaded.get('net_units', 'Mb'),
+                    ),
+                }
+
+    def fetch_columns(self, threshold_days: int, filter_host: str, batch_size: int = 1000) -> TelemetryColumns:
+        """Fetch messages of one host in batches, straight into columnar buffers
+
+        Args:
+            threshold_days (int): Skip messages older than threshold_days
+            filter_host (str): Host (message key) to buffer messages from
+            batch_size (int, optional): Messages consumed per call to the broker
+
+        Returns:
+            (TelemetryColumns): Buffered messages, in consumption order
+        """
+        columns = self.fetch_hosts(threshold_days, hosts=[filter_host], batch_size=batch_size).get(filter_host)
+        if columns:
+            self.available_hosts = None
+        else:
+            self.available_hosts.discard(filter_host)
 
-            cpu = loaded.get('cpu', {}).get('usage')
-            if isinstance(cpu, (float, int)):
-                res['cpu'] = cpu  # non-accumulative values are not calculated
+        return columns or TelemetryColumns()
 
-            ram = loaded.get('ram', {}).get('usage')
-            if isinstance(ram, (float, int)):
-                res['ram'] = ram  # non-accumulative values are not calculated
+    def fetch_hosts(
+            self, threshold_days: int, hosts: list = None, batch_size: int = 1000, offsets: dict = None,
+    ) -> dict:
+        """Fetch messages of many hosts in a single pass, straight into columnar buffers per host
 
-            net = loaded.get('net', {})
-            if net and previous.get('net'):
-                delta = (epoch - previous['epoch']) / 60  # per minute
+        Hosts with messages in the time window are added to available_hosts.
+
+        Args:
+            threshold_days (int): Skip messages older than threshold_days
+            hosts (list, optional): Hosts (message keys) to buffer messages from, or None for all hosts
+            batch_size (int, optional): Messages consumed per call to the broker
+            offsets (dict, optional): Offsets to resume from by (topic, partition), as in self.positions
+
+        Returns:
+            (dict): Buffered messages by host, in consumption order, of hosts with messages in the time window
+        """
+        since = (_dt.utcnow() - timedelta(days=threshold_days)).timestamp()
+        self._assign(since=since - self.keyframe_margin_sec, offsets=offsets)
+
+        keys = {host.encode() for host in hosts} if hosts is not None else None
+        buffers = {}  # key: TelemetryColumns
+        self.available_hosts = set()
+
+        while self._ends:
+            messages = self.consumer.consume(num_messages=batch_size, timeout=5)
+            if not messages:
+                break
+
+            self.consumed += len(messages)
+
+            for msg in messages:
+                if self._track_end(msg) or not msg.key():
+                    continue
+
+                key = msg.key()
+                epoch = msg.timestamp()[1] / 10 ** 3
+                expired = epoch < since
+
+                if not expired and key not in buffers:
+                    self.available_hosts.add(key.decode())
+
+                if keys is not None and key not in keys:
+                    continue
+
+                host = key.decode()
+                loaded = self.deltas.rebuild(host, decode(msg.value()), tag=epoch)
+
+                if not expired and loaded is not None:  # expired messages are decoded only to keep keyframes
+                    if key not in buffers:
+                        buffers[key] = TelemetryColumns()
+                    buffers[key].append(Snapshot.from_message(loaded, epoch))
+
+                if self.deltas.released:  # deltas replayed before their keyframe, rebuilt as it arrived
+                    for late_epoch, late in self.deltas.released:
+                        if late_epoch < since:
+                            continue
+                        if key not in buffers:
+                            self.available_hosts.add(host)
+                            buffers[key] = TelemetryColumns()
+                        buffers[key].append(Snapshot.from_message(late, late_epoch))
+                    self.deltas.released.clear()
+
+        return {key.decode(): columns for key, columns in buffers.items()}
+
+    def fetch_hosts_parallel(self, threshold_days: int, hosts: list = None, workers: int = 2, **kwargs) -> dict:
+        """Fetch messages as fetch_hosts, with the topic partitions split across worker processes
+
+        Each worker consumes, decodes and buffers the messages of its partitions, and the parent merges
+        the buffers by host. Consumer state (positions, keyframes, available hosts) is merged as well.
+
+        Args:
+            threshold_days (int): Skip messages older than threshold_days
+            hosts (list, optional): Hosts (message keys) to buffer messages from, or None for all hosts
+            workers (int, optional): Worker processes, each with its own consumer
+            kwargs: Other fetch_hosts args, as in batch_size and offsets
+
+        Returns:
+            (dict): Buffered messages by host, of hosts with messages in the time window
+        """
+        merged = {}
+        for data in self._fetch_parallel(workers, None, dict(threshold_days=threshold_days, hosts=hosts, **kwargs)):
+            for host, columns in data.items():
+                if host not in merged:
+                    merged[host] = TelemetryColumns()
+                merged[host].extend(columns)
+
+        return merged
+
+    def fetch_hourly_parallel(
+            self, threshold_days: int, samples: dict = None, hosts: list = None, workers: int = 2, **kwargs,
+    ) -> dict:
+        """Fetch messages as fetch_hosts_parallel, aggregated by each worker into hourly sums per host
+
+        Messages of a host are published to a single partition, so each worker computes the rates and hourly sums
+        of its hosts (see Rollup.hourly_sums), and sends back a few rows per host and hour instead of its messages.
+
+        Args:
+            threshold_days (int): Skip messages older than threshold_days
+            samples (dict, optional): Last samples of the network counters by host, as in RollupStore.samples,
+                for the first rates to be computed against
+            hosts (list, optional): Hosts (message keys) to aggregate messages from, or None for all hosts
+            workers (int, optional): Worker processes, each with its own consumer
+            kwargs: Other fetch_hosts args, as in batch_size and offsets
+
+        Returns:
+            (dict): Hourly sums and last samples by host, as returned by Rollup.hourly_sums, of hosts with messages
+                in the time window
+        """
+        merged = {}
+        args = dict(threshold_days=threshold_days, hosts=hosts, **kwargs)
+        for data in self._fetch_parallel(workers, samples or {}, args):
+            for host, (sums, last) in data.items():
+                if host in merged:  # split across partitions, as if partitions were added to the topic
+                    previous_sums, previous_last = merged[host]
+                    sums = merge_hourly(previous_sums, sums)
+                    last = {**previous_last, **{
+                        name: sample for name, sample in last.items()
+                        if name not in previous_last or sample[0] > previous_last[name][0]
+                    }}
+                merged[host] = sums, last
+
+        return merged
+
+    def _fetch_parallel(self, workers: int, samples: dict, args: dict) -> iter:
+        """Run _fetch_partitions in worker processes, and merge their consumer state
+
+        Yields:
+            (dict): Data of each worker, as returned by its fetch_hosts, or aggregated if samples is not None
+        """
+        topic = self.topics[0]
+        metadata = self.consumer.list_topics(topic, timeout=5)
+        partitions = sorted(
+            p for p in metadata.topics[topic].partitions if self.partitions is None or p in self.partitions
+        )
+        groups = [group for group in (partitions[i::workers] for i in range(workers)) if group]
+
+        with ProcessPoolExecutor(max_workers=len(groups) or 1, mp_context=WORKERS_CONTEXT) as executor:
+            futures = [
+                executor.submit(
+                    _fetch_partitions, self.server, topic, f'{self.consumer_id}-{i}', group, self.deltas.keyframes,
+                    self.keyframe_margin_sec, args, samples,
+                )
+                for i, group in enumerate(groups)
+            ]
+            results = [future.result() for future in futures]
+
+        self.available_hosts = set()
+        for data, available_hosts, positions, keyframes, consumed in results:
+            self.available_hosts |= available_hosts
+            self.positions.update(positions)
+            self.deltas.keyframes.update(keyframes)
+            self.consumed += consumed
 
-                for dev, data in net.items():
-                    prev_data = previous.get('net', {}).get(dev)
+            yield data
 
-                    resume = False
-                    if all([isinstance(v, (float, int)) for v in (data.get('in'), prev_data.get('in'))]):
-                        if 'net' not in res:
-                            res['net'] = {}
-                        if dev not in res['net']:
-                            res['net'][dev] = {}
-                        resume = True
 
-                    if resume and all([isinstance(v, (float, int)) for v in (data.get('out'), prev_data.get('out'))]):
-                        res['net'][dev] = {
-                            'in': (data['in'] - prev_data['in']) / delta,
-                            'out': (data['out'] - prev_data['out']) / delta,
-                        }
+def _fetch_partitions(
+        server: str, topic: str, consumer_id: str, partitions: list, keyframes: dict, margin: float, args: dict,
+        samples: dict = None,
+):
+    consumer = KafkaTelemetryConsumer(
+        server, topic, consumer_id, keyframes=keyframes, partitions=partitions, keyframe_margin_sec=margin,
+    )
+    data = consumer.fetch_hosts(**args)
+    consumer.consumer.close()
 
-            if res:
-                yield {'id': float(f'{msg.offset()}.{msg.partition()}'), 'epoch': epoch} | res
+    if samples is not None:  # aggregated in the worker, as the parent keeps hourly rollups
+        data = {host: hourly_sums(columns.arrays(), previous=samples.get(host)) for host, columns in data.items()}
 
-            previous.update({'epoch': epoch, 'net': net})
+    return data, consumer.available_hosts, consumer.positions, consumer.deltas.keyframes, consumer.consumed
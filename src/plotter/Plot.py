@@ -41,17 +41,19 @@ def plot_usage_data(df: DataFrame, store_as: Path):
 
 
 def plot_net_data(df: DataFrame, network_device: str, store_as: Path):
-    """Frame and plot networking data"""
+    """Frame and plot networking data, from rates in a 'net' column of dicts or in '<device>_in|out' columns"""
     # Transform
-    net = json_normalize(df['net'], sep='_').fillna(0)
-    net.reset_index(drop=True, inplace=True)
-    net.rename(
+    if 'net' in df.columns:
+        net = json_normalize(df['net'], sep='_').fillna(0)
+        net.reset_index(drop=True, inplace=True)
+        df = concat([df.drop(columns=['net']), net], axis=1)
+
+    df = df.rename(
         columns={
             f'{network_device}_in': 'rate_in',
             f'{network_device}_out': 'rate_out',
-        }, inplace=True,
+        },
     )
-    df = concat([df.drop(columns=['net']), net], axis=1)
 
     # Frame
     group_cols = ['hour']
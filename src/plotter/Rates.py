@@ -0,0 +1,158 @@
+"""Rates per minute of network counters
+
+Rates are computed per host and per interface, between consecutive samples of a same interface. A counter
+lower than its previous sample is taken as reset (as on reboots or wraps), so its rate is computed from zero.
+Intervals are taken from the monotonic clock counters were sampled at when published (see NET_RAW_COUNTERS
+in the app), and from message timestamps otherwise. A clock going back, or ahead of the message timestamps
+by more than CLOCK_SLACK_SEC, is taken as a reboot: counters are then taken as reset too. Counters are turned
+into megabits by the unit they were published in ('net_units'), and rates are in megabits per minute.
+"""
+from array import array
+from math import isnan, nan
+
+import numpy as np
+
+SAMPLE_COLUMNS = ('epoch', 'clock', 'cpu', 'ram')
+NET_UNITS = {'Mb': 1, 'bytes': 8 / 1000 ** 2}  # megabits per unit of network counters, by 'net_units'
+CLOCK_SLACK_SEC = 5  # clock intervals trusted up to the message interval plus this, as sampled before publishing
+
+
+class RateEngine:
+    def __init__(self):
+        """Compute rates from messages as they are consumed, keeping the previous counters in arrays"""
+        self._slots = {}  # (host, device): index in the arrays
+        self._epoch = array('d')
+        self._clock = array('d')
+        self._in = array('d')
+        self._out = array('d')
+
+    def update(self, host: str, epoch: float, net: dict, clock: float = None, units: str = 'Mb') -> dict:
+        """Compute the rates of a message, and keep its counters for the next message of the host
+
+        Messages older than the previous sample of an interface are left out, as are counters in unknown units.
+
+        Args:
+            host (str): Host (message key)
+            epoch (float): Message timestamp, in seconds
+            net (dict): Network counters by device, as in {'eth0': {'in': 1.0, 'out': 1.0}}
+            clock (float, optional): Monotonic seconds the counters were sampled at, as in 'net_sampled_at'
+            units (str, optional): Unit of the counters, one of NET_UNITS, as in 'net_units'
+
+        Returns:
+            (dict): Rates by device with a previous sample, as in {'eth0': {'in': 0.5, 'out': 0.1}}
+        """
+        res = {}
+        scale = NET_UNITS.get(units)
+        if scale is None:
+            return res
+
+        clock = clock if clock is not None else nan
+
+        for dev, data in net.items():
+            value_in, value_out = data.get('in'), data.get('out')
+            if not isinstance(value_in, (float, int)) or not isinstance(value_out, (float, int)):
+                continue
+
+            value_in, value_out = value_in * scale, value_out * scale
+
+            slot = self._slots.get((host, dev))
+            if slot is None:
+                self._slots[(host, dev)] = len(self._epoch)
+                self._epoch.append(epoch)
+                self._clock.append(clock)
+                self._in.append(value_in)
+                self._out.append(value_out)
+                continue
+
+            interval = epoch - self._epoch[slot]
+            elapsed = clock - self._clock[slot]  # NaN if not published
+            trusted = 0 < elapsed <= interval + CLOCK_SLACK_SEC
+            rebooted = not trusted and not isnan(elapsed)
+
+            minutes = (elapsed if trusted else interval) / 60
+            if minutes <= 0:
+                continue
+
+            res[dev] = {
+                'in': (value_in if rebooted else _delta(value_in, self._in[slot])) / minutes,
+                'out': (value_out if rebooted else _delta(value_out, self._out[slot])) / minutes,
+            }
+            self._epoch[slot], self._clock[slot] = epoch, clock
+            self._in[slot], self._out[slot] = value_in, value_out
+
+        return res
+
+
+def rates(columns: dict, previous: dict = None) -> dict:
+    """Turn network counters into rates per minute, between consecutive samples of each interface
+
+    Rates are set as 0.0 in the rows an interface was not reported, and in its first sample.
+
+    Args:
+        columns (dict): Arrays of a host sorted by epoch, as built by TelemetryColumns.arrays
+        previous (dict, optional): Last samples as (epoch, counter) by column, as returned by last_samples,
+            for the first rates to be computed against the messages of a previous run
+
+    Returns:
+        (dict): Same arrays, network counters replaced by their rates
+    """
+    epoch = columns['epoch']
+    clock = columns.get('clock', np.full(len(epoch), np.nan))
+    previous = previous or {}
+
+    res = {}
+    for name, column in columns.items():
+        if name in SAMPLE_COLUMNS:
+            res[name] = column
+            continue
+
+        rows = np.flatnonzero(~np.isnan(column))
+        values, epochs, clocks = column[rows], epoch[rows], clock[rows]
+
+        if name in previous:
+            values = np.concatenate(([previous[name][1]], values))
+            epochs = np.concatenate(([previous[name][0]], epochs))
+            clocks = np.concatenate(([np.nan], clocks))
+        else:
+            rows = rows[1:]
+
+        intervals = np.diff(epochs)
+        elapsed = np.diff(clocks)  # NaN if not published
+        trusted = (elapsed > 0) & (elapsed <= intervals + CLOCK_SLACK_SEC)
+        minutes = np.where(trusted, elapsed, intervals) / 60
+
+        delta = np.diff(values)
+        reset = (delta < 0) | (~trusted & ~np.isnan(elapsed))  # lower counters, or rebooted as told by the clock
+        delta[reset] = values[1:][reset]
+
+        rate = np.zeros(len(column))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate[rows] = np.where(minutes > 0, delta / minutes, 0.0)
+        res[name] = rate
+
+    return res
+
+
+def last_samples(columns: dict) -> dict:
+    """Last sample of each network counter
+
+    Args:
+        columns (dict): Arrays of a host sorted by epoch, as built by TelemetryColumns.arrays
+
+    Returns:
+        (dict): (epoch, counter) by column, as in {'eth0_in': (1700000000.0, 1024.0)}
+    """
+    res = {}
+    for name, column in columns.items():
+        if name in SAMPLE_COLUMNS:
+            continue
+
+        rows = np.flatnonzero(~np.isnan(column))
+        if len(rows):
+            res[name] = (float(columns['epoch'][rows[-1]]), float(column[rows[-1]]))
+
+    return res
+
+
+def _delta(current: float, previous: float) -> float:
+    return current - previous if current >= previous else current
@@ -0,0 +1,218 @@
+"""Hourly rollups of telemetry, persisted between plotter runs
+
+Each host's hourly sums and message counts are kept in a NumPy .npz file, and the consumer state (offsets
+to resume from, last samples of network counters per host and delta keyframes) in a JSON file. A run then consumes only
+the messages published since the previous run, and adds them to the hours they belong to.
+
+The state file names the rollup files it was saved with, and is replaced atomically once these are written: a run
+interrupted before that leaves the previous state and rollups in place, to be consumed again from the same offsets.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+from Rates import last_samples, rates
+
+HOUR = 3600
+
+
+class RollupStore:
+    STATE = 'state.json'
+
+    def __init__(self, directory: Path, window_days: int = 7):
+        """Load the rollup store, created if missing
+
+        Args:
+            directory (Path): Directory to keep the state and the hourly rollups in
+            window_days (int, optional): Hours older than window_days are dropped
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.window_sec = window_days * 24 * HOUR
+
+        path = self.directory / self.STATE
+        state = json.loads(path.read_text()) if path.is_file() else {}
+
+        self.generation = state.get('generation', 0)
+        self.rollups = state.get('rollups')  # host: rollup file name, as saved with the state
+        if self.rollups is None:  # stores saved before rollup files were named in the state
+            self.rollups = {path.stem: path.name for path in self.directory.glob('*.npz')}
+        self._updated = {}  # host: rollup, not yet saved
+
+        for path in self.directory.glob('*.npz'):  # written by a run interrupted before saving its state
+            if path.name not in self.rollups.values():
+                path.unlink()
+
+        self.offsets = {_partition(tp): offset for tp, offset in state.get('offsets', {}).items()}
+        self.samples = state.get('samples', {})  # host: {'eth0_in': (epoch, counter), ...}
+        self.keyframes = {  # JSON keys are str, keyframe timestamps are int
+            host: {int(ts): keyframe for ts, keyframe in keyframes.items()}
+            for host, keyframes in state.get('keyframes', {}).items()
+        }
+
+    def hosts(self) -> list:
+        """Hosts with rollups in the store"""
+        return sorted(self.rollups.keys() | self._updated.keys())
+
+    def update(self, host: str, columns: dict, now: float):
+        """Add the messages of a host to its hourly rollups, kept in memory until saved
+
+        Network rates of the first messages are computed against the last samples of the previous run.
+
+        Args:
+            host (str): Host (message key)
+            columns (dict): Arrays of the new messages, as built by TelemetryColumns.arrays
+            now (float): Current epoch, in seconds, for hours out of the window to be dropped
+        """
+        if not len(columns['epoch']):
+            return
+
+        self.add(host, *hourly_sums(columns, previous=self.samples.get(host)), now)
+
+    def add(self, host: str, sums: dict, samples: dict, now: float):
+        """Add the hourly sums of a host to its rollups, as computed from its new messages by hourly_sums
+
+        Args:
+            host (str): Host (message key)
+            sums (dict): Hourly sums and counts, as returned by hourly_sums
+            samples (dict): Last samples of the network counters, as returned by hourly_sums
+            now (float): Current epoch, in seconds, for hours out of the window to be dropped
+        """
+        self.samples[host] = samples  # so the next run continues the rates
+
+        rollup = merge_hourly(self._load(host), sums)
+        keep = rollup['hour'] >= now - self.window_sec
+        self._updated[host] = {name: column[keep] for name, column in rollup.items()}
+
+    def hourly(self, host: str) -> dict:
+        """Hourly means of a host
+
+        Args:
+            host (str): Host (message key)
+
+        Returns:
+            (dict): Arrays, as in {'hour': epochs, 'cpu': ..., 'ram': ..., 'eth0_in': rates per minute, ...}
+        """
+        rollup = self._load(host)
+        count = rollup.pop('count', np.empty(0))
+
+        return {
+            name: column if name == 'hour' else column / count
+            for name, column in rollup.items()
+        }
+
+    def save(self, positions: dict, keyframes: dict):
+        """Persist the updated rollups and the consumer state
+
+        Rollups are written to new files, and the state naming them replaces the previous one at once,
+        so the rollups and the offsets they were consumed up to are saved together, or not at all.
+
+        Args:
+            positions (dict): Offsets of the next messages to read by (topic, partition), as consumed in this run
+            keyframes (dict): Delta keyframes by timestamp, by host, as kept by the consumer decoder
+        """
+        generation = self.generation + 1
+        rollups = dict(self.rollups)
+        for host, rollup in self._updated.items():
+            rollups[host] = f'{host}.{generation}.npz'
+            np.savez(self.directory / rollups[host], **rollup)
+
+        offsets = {**self.offsets, **positions}
+        state = {
+            'generation': generation,
+            'rollups': rollups,
+            'offsets': {f'{topic}:{partition}': offset for (topic, partition), offset in offsets.items()},
+            'samples': self.samples,
+            'keyframes': keyframes,
+        }
+        self._write_state(state)
+
+        superseded = set(self.rollups.values()) - set(rollups.values())
+        self.generation, self.rollups, self.offsets, self.keyframes = generation, rollups, offsets, keyframes
+        self._updated = {}
+
+        for name in superseded:
+            (self.directory / name).unlink(missing_ok=True)
+
+    def _write_state(self, state: dict):
+        path = self.directory / self.STATE
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(state, separators=(',', ':')))
+        tmp.replace(path)
+
+    def _load(self, host: str) -> dict:
+        if host in self._updated:
+            return dict(self._updated[host])
+
+        if host not in self.rollups:
+            return {}
+
+        with np.load(self.directory / self.rollups[host]) as npz:
+            return {name: npz[name] for name in npz.files}
+
+
+def hourly_sums(columns: dict, previous: dict = None) -> tuple:
+    """Hourly sums and message counts of a host, as kept by RollupStore
+
+    Messages of a same epoch, as replayed from spools, are counted once.
+
+    Args:
+        columns (dict): Arrays of the messages, as built by TelemetryColumns.arrays
+        previous (dict, optional): Last samples of a previous run, for the first rates to be computed against
+
+    Returns:
+        (tuple): Sums by hour, as in {'hour': epochs, 'count': ..., 'cpu': ..., 'eth0_in': rates per minute, ...},
+            and the last samples of the network counters, previous ones included, for the next run to continue
+    """
+    previous = previous or {}
+    samples = {**previous, **last_samples(columns)}
+    columns = rates(columns, previous=previous)
+
+    _, first = np.unique(columns['epoch'], return_index=True)  # drop duplicates, as replayed from spools
+    columns = {name: column[first] for name, column in columns.items()}
+
+    hours, inverse = np.unique((columns['epoch'] // HOUR * HOUR).astype(np.int64), return_inverse=True)
+    sums = {
+        'hour': hours,
+        'count': np.bincount(inverse, minlength=len(hours)).astype(np.float64),
+        **{
+            name: np.bincount(inverse, weights=column, minlength=len(hours))
+            for name, column in columns.items() if name not in ('epoch', 'clock')
+        },
+    }
+
+    return sums, samples
+
+
+def merge_hourly(rollup: dict, sums: dict) -> dict:
+    """Add hourly sums to a rollup, by hour
+
+    Args:
+        rollup (dict): Hourly sums, as returned by hourly_sums, or an empty dict
+        sums (dict): Hourly sums to add
+
+    Returns:
+        (dict): Sums of both, by hour
+    """
+    if not rollup:
+        return sums
+
+    hours = np.union1d(rollup['hour'], sums['hour'])
+    merged = {'hour': hours}
+
+    for part in (rollup, sums):
+        index = np.searchsorted(hours, part['hour'])
+        for name, column in part.items():
+            if name == 'hour':
+                continue
+            if name not in merged:
+                merged[name] = np.zeros(len(hours))
+            np.add.at(merged[name], index, column)
+
+    return merged
+
+
+def _partition(tp: str) -> tuple:
+    topic, partition = tp.rsplit(':', 1)
+    return topic, int(partition)
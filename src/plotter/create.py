@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """Create plots from telemetry data"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from os import environ
 from pandas import DataFrame, to_datetime
 from pathlib import Path
 from sys import exit
+from time import perf_counter, time
 
 try:
     from tomllib import load  # noqa
@@ -14,6 +17,8 @@ except ModuleNotFoundError:
 
 from Kafka import KafkaTelemetryConsumer
 from Plot import plot_usage_data, plot_net_data
+from Rates import rates
+from Rollup import RollupStore
 
 REQUIRED = {
     'KAFKA_BROKER': '<IP-or-host>:<port>',
@@ -22,6 +27,53 @@ REQUIRED = {
     'TARGET_NETWORK_DEVICE_NAME': '<device-name (eth0|eth1|wlp0s20f3|etc)>',
 }
 
+OPTIONAL = {
+    'TARGET_HOSTS': '<comma-separated short-hostnames, or * for all hosts in topic>',
+    'PLOT_WORKERS': '<processes to render plots with, defaults to the number of CPUs>',
+    'FETCH_WORKERS': '<processes to consume the topic partitions with, defaults to 1>',
+    'ROLLUP_DIR': '<directory to keep hourly rollups in, to consume only new messages in each run>',
+    'KAFKA_KEYFRAME_EVERY': '<messages per keyframe, as set for the publishers (0 if not publishing deltas)>',
+    'DAEMON_INTERVAL_SEC': '<seconds between messages, as set for the publishers, defaults to 60>',
+}
+
+WINDOW_DAYS = 7
+
+
+def frame(columns: dict) -> DataFrame:
+    """Frame the columns of a host, with network rates, sorted by moment and with an hour aggregator"""
+    df = DataFrame(rates(columns))
+
+    df.drop_duplicates(subset=['epoch'], inplace=True)
+    df['epoch'] = to_datetime(df['epoch'], unit='s')
+    df.rename(columns={'epoch': 'moment'}, inplace=True)
+    df.sort_values(by='moment', inplace=True)
+
+    # Add general hour aggregator
+    df['hour'] = df['moment'].dt.floor('h')
+    df.reset_index(drop=True, inplace=True)
+
+    return df
+
+
+def frame_hourly(hourly: dict) -> DataFrame:
+    """Frame the hourly means of a host, as kept in a RollupStore"""
+    df = DataFrame(hourly)
+    df['hour'] = to_datetime(df['hour'], unit='s')
+    return df
+
+
+def render(host: str, columns: dict, network_device: str, dst_dir: Path, hourly: bool = False):
+    """Render the usage and networking plots of a host, from its messages or from its hourly means"""
+    df = frame_hourly(columns) if hourly else frame(columns)
+
+    plot_usage_data(df, dst_dir / f'usage.{host}.png')
+
+    if f'{network_device}_in' not in df.columns:
+        print(f'No {network_device!r} data from {host}: networking plot skipped')
+        return
+
+    plot_net_data(df, network_device, dst_dir / f'networking.{host}.png')
+
 
 if __name__ == '__main__':
     # Fetch config from env.toml
@@ -31,37 +83,78 @@ if __name__ == '__main__':
 
     env = toml['prod']
 
-    # Update config with required vars in env vars
-    for key in REQUIRED:
+    # Update config with required and optional vars in env vars
+    for key in {**REQUIRED, **OPTIONAL}:
         val = environ.get(key)
         if val:
             env[key] = val
 
-    # Connect broker, fetch data, set data frame
-    consumer = KafkaTelemetryConsumer(env['KAFKA_BROKER'])
-    data_generator = consumer.fetch(threshold_days=7, filter_host=env['TARGET_HOST'])
-    df = DataFrame(data_generator)
+    # Select hosts: TARGET_HOSTS renders many hosts from a single pass over the topic
+    targets = env.get('TARGET_HOSTS') or [env['TARGET_HOST']]
+    if isinstance(targets, str):
+        targets = [host.strip() for host in targets.split(',') if host.strip()]
+    hosts = None if '*' in targets else targets
 
-    if df.empty:
-        print(f"No message fetched. Hosts available in topic {env['BROKER_TOPIC']}: {consumer.available_hosts}")
-        exit(1)
+    # Connect broker, fetch data per host: with a rollup store, only messages published since the last run
+    store = RollupStore(Path(env['ROLLUP_DIR']), window_days=WINDOW_DAYS) if env.get('ROLLUP_DIR') else None
+    every = env.get('KAFKA_KEYFRAME_EVERY')  # read before the window, as far as the keyframes of its first deltas
+    margin = int(every) * float(env.get('DAEMON_INTERVAL_SEC') or 60) if every is not None else None
+    consumer = KafkaTelemetryConsumer(
+        env['KAFKA_BROKER'], keyframes=store.keyframes if store else None, keyframe_margin_sec=margin,
+    )
 
-    # Transform data
-    df.drop_duplicates(subset=['epoch'], inplace=True)
-    df['epoch'] = to_datetime(df['epoch'], unit='s')
-    df.rename(columns={'epoch': 'moment'}, inplace=True)
-    df.sort_values(by='moment', inplace=True)
+    fetch_workers = int(env.get('FETCH_WORKERS') or 1)
+    fetch = consumer.fetch_hosts
+    if fetch_workers > 1:  # partitions split across processes, to decode messages in parallel
+        fetch = partial(consumer.fetch_hosts_parallel, workers=fetch_workers)
 
-    # Add general hour aggregator
-    df['hour'] = df['moment'].dt.floor('h')
-    df.reset_index(drop=True, inplace=True)
+    started = perf_counter()
+    if store and fetch_workers > 1:  # aggregated into hourly sums by the workers
+        data = consumer.fetch_hourly_parallel(
+            threshold_days=WINDOW_DAYS, samples=store.samples, workers=fetch_workers, offsets=store.offsets,
+        )
+    elif store:
+        data = fetch(threshold_days=WINDOW_DAYS, offsets=store.offsets)  # all hosts, for later runs
+    else:
+        data = fetch(threshold_days=WINDOW_DAYS, hosts=hosts)
+    elapsed = perf_counter() - started
+    print(f'Fetched {consumer.consumed} messages in {elapsed:.2f}s ({consumer.consumed / elapsed:.0f} messages/sec)')
+    consumer.consumer.close()  # before forking the render workers, as librdkafka is not fork-safe
+
+    if store:
+        now = time()
+        for host, fetched in data.items():
+            if fetch_workers > 1:
+                store.add(host, *fetched, now)
+            else:
+                store.update(host, fetched.arrays(), now)
+        store.save(consumer.positions, consumer.deltas.keyframes)
+
+        available = store.hosts()
+        data = {host: store.hourly(host) for host in available if hosts is None or host in hosts}
+    else:
+        available = consumer.available_hosts
+        data = {host: columns.arrays() for host, columns in data.items()}
+
+    if not data:
+        print(f"No message fetched. Hosts available in topic {env['BROKER_TOPIC']}: {available}")
+        exit(1)
+
+    missing = set(hosts or []) - data.keys()
+    if missing:
+        print(f"No message fetched from {sorted(missing)}. Hosts available: {available}")
 
     # Set destination dir
     dst_dir = Path(env['DATA_STORAGE_DIR'])
     dst_dir.mkdir(exist_ok=True)
 
-    dst = dst_dir / f"usage.{env['TARGET_HOST']}.png"
-    plot_usage_data(df, dst)
+    # Render in processes, as matplotlib is single-threaded
+    workers = int(env.get('PLOT_WORKERS') or 0) or None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(render, host, columns, env['TARGET_NETWORK_DEVICE_NAME'], dst_dir, hourly=bool(store))
+            for host, columns in data.items()
+        ]
 
-    dst = dst_dir / f"networking.{env['TARGET_HOST']}.png"
-    plot_net_data(df, env['TARGET_NETWORK_DEVICE_NAME'], dst)
+        for future in futures:
+            future.result()
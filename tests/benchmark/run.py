@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""Benchmark the start-up, the Collector probes, the publish path and the plotter consumer
+
+Each benchmark runs against a fake host (sysfs and procfs trees, stub binaries) and fake Kafka clients,
+so results depend on the code and the machine, not on its sensors, GPUs or brokers. Results are written as JSON,
+named after the current commit, to be compared between commits:
+
+    PYTHONPATH=src python tests/benchmark/run.py [--filter probe] [--repeat 5] [--out results.json]
+    python tests/benchmark/run.py --compare base.json head.json [--threshold 0.1]
+
+Start-up benchmarks time fresh interpreters importing the app, and the time spent per imported module, as reported
+by `python -X importtime`, is stored along with results and listed by `--imports`.
+"""
+import json
+import sys
+from os import environ
+from argparse import ArgumentParser
+from datetime import datetime as _dt
+from pathlib import Path
+from platform import machine, python_version
+from statistics import median
+from subprocess import run, DEVNULL
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCHMARK_DIR.parent.parent
+sys.path[:0] = [str(PROJECT_DIR / 'src'), str(PROJECT_DIR / 'src' / 'plotter'), str(PROJECT_DIR / 'tests' / 'unit')]
+
+from fakes import FakeConsumer, FakeHost, FakeMessage, FakeProducer  # noqa: E402
+
+BENCHMARKS = {}  # name: setup, returning the callable to be timed and its teardown
+
+
+def benchmark(name: str):
+    def register(setup: callable):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def sample_message(devices: int = 4) -> dict:
+    return {
+        'epoch': time(),
+        'device': 'bench',
+        'collected_at': _dt.utcnow().isoformat(),
+        'cpu': {'sensors': {'Package id 0': 58.0}, 'thermal_zones': [40.0, 41.05, 42.1, 43.15], 'usage': 12.3},
+        'gpu': {'sensors': {'edge': 41.0}, 'nvidia': {'0': {'temperature': 45.0, 'utilization': 12.0}}},
+        'ram': {'usage': 45.6},
+        'net': {f'eth{i}': {'in': 16.0 * (i + 1), 'out': 8.0 * (i + 1)} for i in range(devices)},
+        'storage': {'/': {'total': 512.0, 'used': 128.4, 'free': 383.6}},
+    }
+
+
+# Start-up
+
+STARTUP_STATEMENTS = {
+    'startup.import': 'import app.run',  # up to parsing arguments
+    'startup.import_publish': 'import app.run, app.Collector, app.Kafka',  # up to the first collection and produce
+}
+
+
+def python(*args: str) -> list:
+    """Run a fresh interpreter with the app in its path, returning its stderr lines"""
+    env = {**environ, 'PYTHONPATH': str(PROJECT_DIR / 'src')}
+    res = run([sys.executable, *args], cwd=PROJECT_DIR, env=env, capture_output=True, text=True, stdin=DEVNULL)
+    if res.returncode:
+        raise OSError(f'python {" ".join(args)}: {res.stderr.strip()}')
+    return res.stderr.splitlines()
+
+
+def import_times(statement: str) -> dict:
+    """Seconds spent importing each module by a statement, as reported by `python -X importtime`
+
+    Returns:
+        (dict): (self, cumulative) seconds by module, as in {'app.run': (0.002, 0.041)}, in import order
+    """
+    res = {}
+    for line in python('-X', 'importtime', '-c', statement):
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        res[module.strip()] = (int(self_us) / 10 ** 6, int(cumulative_us) / 10 ** 6)
+    return res
+
+
+def _startup(statement: str):
+    def setup(tmp: Path):
+        python('-c', statement)  # warm up: bytecode compiled and config snapshot stored
+        return lambda: python('-c', statement), lambda: None
+    return setup
+
+
+for _name, _statement in STARTUP_STATEMENTS.items():
+    benchmark(_name)(_startup(_statement))
+
+
+# Collector probes
+
+def _collector_probe(method: str, streaming: bool = False, cpu_window_sec: float = None, **host):
+    def setup(tmp: Path):
+        from app.Collector import Collector
+        from app.Samplers import CpuSampler
+
+        fake = FakeHost(tmp, **host).__enter__()
+        collector = Collector(cache_sec=0, workers=2, streaming=streaming)
+        if cpu_window_sec is not None:  # measure a cpu_times delta on every call, not the sample cached in a window
+            collector._cpu_sampler = CpuSampler(min_window_sec=cpu_window_sec, per_core=collector._cpu_sampler.per_core)
+        probe = getattr(collector, method)
+        probe()  # warm up: open files, start streams, prime samplers
+
+        def teardown():
+            collector.close()
+            fake.__exit__()
+
+        return probe, teardown
+    return setup
+
+
+for _name, _method, _kwargs in (
+        ('sensors', '_probe_lm_sensors', {}),
+        ('sensors.command', '_run_lm_sensors', {}),
+        ('thermal_zones', '_fetch_thermal_zones', {}),
+        ('thermal_zones.command', '_cat_thermal_zones', {}),
+        ('nvidia.command', '_probe_nvidia_gpu', {}),
+        ('nvidia.stream', '_probe_nvidia_gpu', {'streaming': True}),
+        ('net', '_fetch_networks', {}),
+        ('net.command', '_cat_networks', {}),
+        ('net.256_devices', '_fetch_networks', {'devices': 256}),
+        ('storage', '_shutil_storage_use', {}),
+        ('cpu_usage', '_psutil_cpu_general_usage', {'cpu_window_sec': 0}),
+        ('cpu_usage_detail', '_psutil_cpu_usage_detail', {'cpu_window_sec': 0}),
+        ('ram_usage', '_psutil_memory_usage', {}),
+        ('identify', '_identify', {}),
+):
+    benchmark(f'collector.probe.{_name}')(_collector_probe(_method, **_kwargs))
+
+
+@benchmark('collector.data')
+def collector_data(tmp: Path):
+    from app.Collector import Collector
+
+    fake = FakeHost(tmp).__enter__()
+    collector = Collector(cache_sec=0, streaming=True)
+    collector.data  # noqa: warm up
+
+    def teardown():
+        collector.close()
+        fake.__exit__()
+
+    return lambda: collector.data, teardown
+
+
+@benchmark('collector.sampler.sample')
+def sampler_sample(tmp: Path):
+    from app.Samplers import HighFrequencySampler
+
+    fake = FakeHost(tmp)
+    sampler = HighFrequencySampler(
+        HighFrequencySampler.METRICS, interval_sec=3600, thermal_root=fake.paths['THERMAL_ROOT'],
+        hwmon_root=fake.paths['HWMON_ROOT'], net_dev_path=fake.paths['NET_DEV_PATH'],
+    )
+    sampler.sample()  # warm up: network counters seen
+
+    return sampler.sample, sampler.close
+
+
+@benchmark('collector.collect_async')
+def collector_collect_async(tmp: Path):
+    from asyncio import new_event_loop
+    from app.AsyncCollector import AsyncCollector
+
+    fake = FakeHost(tmp).__enter__()
+    loop = new_event_loop()
+    collector = AsyncCollector(cache_sec=0, streaming=True)
+    loop.run_until_complete(collector.collect())  # warm up
+
+    def teardown():
+        collector.close()
+        loop.close()
+        fake.__exit__()
+
+    return lambda: loop.run_until_complete(collector.collect()), teardown
+
+
+# Publish path
+
+def _producer_stream(**kwargs):
+    def setup(tmp: Path):
+        import app.Kafka as kafka_module
+
+        original, kafka_module.ConfluentKafkaProducer = kafka_module.ConfluentKafkaProducer, FakeProducer
+        producer = kafka_module.Producer(brokers=['127.0.0.1:9092'], **kwargs)
+        message = sample_message()
+        snapshot = kafka_module.Snapshot.from_message(message, message['epoch'])
+
+        def stream():
+            producer.stream([snapshot], topic='bench', key='bench')
+
+        def teardown():
+            producer.close(timeout=0)
+            kafka_module.ConfluentKafkaProducer = original
+
+        return stream, teardown
+    return setup
+
+
+benchmark('producer.stream.json')(_producer_stream(encoding='json'))
+benchmark('producer.stream.binary')(_producer_stream(encoding='binary'))
+benchmark('producer.stream.binary_deltas')(_producer_stream(encoding='binary', keyframe_every=10))
+
+
+# Plotter consumer
+
+def _messages(count: int, encoding: str, hosts: int = 1, keyframe_every: int = 0) -> list:
+    from app.Codec import DeltaEncoder, encode
+
+    encoders = {}
+    messages = []
+    start = int((time() - count * 60) * 10 ** 3)
+
+    for i in range(count):
+        host = f'host{i % hosts}'
+        message = sample_message()
+        message.pop('epoch')
+        message['cpu']['usage'] = float(i % 100)
+        message['net'] = {dev: {'in': data['in'] + i, 'out': data['out'] + i} for dev, data in message['net'].items()}
+
+        timestamp = start + i * 60 * 10 ** 3 // hosts
+        if keyframe_every:
+            message = encoders.setdefault(host, DeltaEncoder(keyframe_every)).frame(message, timestamp)
+
+        value = encode(message, encoding)
+        messages.append(FakeMessage('telemetry', value, host.encode(), timestamp, offset=i))
+
+    return messages
+
+
+def _consumer_fetch(method: str, encoding: str, count: int = 10000, hosts: int = 1, deltas: int = 0, **kwargs):
+    def setup(tmp: Path):
+        import Kafka as plotter_kafka
+
+        messages = _messages(count, encoding, hosts=hosts, keyframe_every=deltas)
+        original = plotter_kafka.Consumer
+        plotter_kafka.Consumer = lambda config: FakeConsumer(config, messages)
+
+        def fetch():
+            consumer = plotter_kafka.KafkaTelemetryConsumer('127.0.0.1:9092')
+            res = getattr(consumer, method)(threshold_days=30, **kwargs)
+            return list(res) if method == 'fetch' else res
+
+        def teardown():
+            plotter_kafka.Consumer = original
+
+        return fetch, teardown
+    return setup
+
+
+benchmark('plotter.fetch.json')(_consumer_fetch('fetch', 'json', filter_host='host0'))
+benchmark('plotter.fetch_columns.json')(_consumer_fetch('fetch_columns', 'json', filter_host='host0'))
+benchmark('plotter.fetch_columns.binary')(_consumer_fetch('fetch_columns', 'binary', filter_host='host0'))
+benchmark('plotter.fetch_columns.binary_deltas')(
+    _consumer_fetch('fetch_columns', 'binary', filter_host='host0', deltas=10),
+)
+benchmark('plotter.fetch_hosts.json_50_hosts')(_consumer_fetch('fetch_hosts', 'json', hosts=50))
+
+
+# Runner
+
+def measure(func: callable, repeat: int, min_sec: float) -> dict:
+    """Time a callable as timeit does: loops per repeat are raised until a repeat takes min_sec
+
+    Returns:
+        (dict): Seconds per call, as the min and median of repeats, and loops per repeat
+    """
+    loops = 1
+    while True:
+        checkpoint = perf_counter()
+        for _ in range(loops):
+            func()
+        if perf_counter() - checkpoint >= min_sec:
+            break
+        loops *= 2
+
+    timings = []
+    for _ in range(repeat):
+        checkpoint = perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((perf_counter() - checkpoint) / loops)
+
+    return {'min': min(timings), 'median': median(timings), 'loops': loops}
+
+
+def commit() -> str:
+    res = run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, capture_output=True, text=True, stdin=DEVNULL)
+    return res.stdout.strip() or 'unknown'
+
+
+def compare(base: Path, head: Path, threshold: float) -> int:
+    """Print the median ratios of two results, returning 1 if any benchmark slowed down beyond threshold"""
+    base, head = (json.loads(Path(p).read_text()) for p in (base, head))
+    print(f"{'benchmark':<45} {base['meta']['commit']:>12} {head['meta']['commit']:>12} {'ratio':>7}")
+
+    regressions = 0
+    for name in sorted(base['results'].keys() & head['results'].keys()):
+        before, after = base['results'][name]['median'], head['results'][name]['median']
+        ratio = after / before if before else float('inf')
+        flag = ' <' if ratio > 1 + threshold else ''
+        regressions += bool(flag)
+        print(f'{name:<45} {before * 10 ** 6:>10.1f}us {after * 10 ** 6:>10.1f}us {ratio:>7.2f}{flag}')
+
+    for name in sorted(base.get('imports', {}).keys() & head.get('imports', {}).keys()):
+        before, after = base['imports'][name], head['imports'][name]
+        for module in sorted(m for m in before.keys() | after.keys() if m.startswith('app.')):
+            before_sec, after_sec = (imports.get(module, (0, 0))[1] * 10 ** 3 for imports in (before, after))
+            print(f'{name} {module:<{44 - len(name)}} {before_sec:>10.1f}ms {after_sec:>10.1f}ms')
+
+    return 1 if regressions else 0
+
+
+def main(argv: list = None) -> int:
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--filter', default='', help='run only the benchmarks whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=5, help='repeats of each benchmark')
+    parser.add_argument('--min-sec', type=float, default=0.2, help='min seconds per repeat')
+    parser.add_argument('--out', type=Path, help='results file (default: results/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, type=Path, metavar=('BASE', 'HEAD'), help='compare two results files')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown ratio flagged as regression')
+    parser.add_argument('--imports', type=float, metavar='MS', help='list imports of start-up taking over MS')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+
+    if args.imports is not None:
+        for module, (self_sec, cumulative_sec) in import_times(STARTUP_STATEMENTS['startup.import_publish']).items():
+            if cumulative_sec * 10 ** 3 >= args.imports:
+                print(f'{module:<45} {cumulative_sec * 10 ** 3:>9.1f}ms (self {self_sec * 10 ** 3:.1f})')
+        return 0
+
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+
+        with TemporaryDirectory(prefix='benchmark-') as tmp:
+            try:
+                func, teardown = setup(Path(tmp))
+            except (OSError, ImportError) as e:
+                print(f'{name:<45} skipped: {e}')
+                continue
+
+            try:
+                results[name] = measure(func, args.repeat, args.min_sec)
+            finally:
+                teardown()
+
+        res = results[name]
+        print(f"{name:<45} {res['median'] * 10 ** 6:>12.1f}us/call (min {res['min'] * 10 ** 6:.1f})")
+
+    imports = {  # (self, cumulative) seconds by module imported, by start-up benchmark
+        name: import_times(STARTUP_STATEMENTS[name]) for name in STARTUP_STATEMENTS if name in results
+    }
+
+    meta = {'commit': commit(), 'python': python_version(), 'machine': machine(), 'at': _dt.utcnow().isoformat()}
+    out = args.out or BENCHMARK_DIR / 'results' / f"{meta['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({'meta': meta, 'results': results, 'imports': imports}, indent=2))
+    print(f'Results stored at {out}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,10 @@
 import pytest
+import sys
 from pathlib import Path
 from os import getpid
 
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src' / 'plotter'))  # plotter modules import by name
+
 
 @pytest.fixture(scope='session')
 def work_dir_var() -> Path:
@@ -0,0 +1,22 @@
+from io import StringIO
+from json import loads
+
+from app.Agent import serve
+from app.Collector import Collector
+from app.Probes import Probe
+
+
+def serve_test():
+    collector = Collector(cache_sec=0)
+    collector.probes = {}
+    collector.register(Probe('ram_usage', lambda: {'ram': {'usage': 1.5}}, 'ram', 'replace'))
+
+    stdout = StringIO()
+    assert serve(collector, stdin=StringIO('collect\nhello\ncollect\n'), stdout=stdout, device='standin') == 3
+    collector.close()
+
+    answers = [loads(line) for line in stdout.getvalue().splitlines()]
+    assert answers[0]['device'] == 'standin'
+    assert answers[0]['ram'] == {'usage': 1.5}
+    assert 'unknown request' in answers[1]['error']
+    assert answers[2]['epoch'] >= answers[0]['epoch']
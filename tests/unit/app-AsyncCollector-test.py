@@ -0,0 +1,79 @@
+import pytest
+from asyncio import run
+from threading import Event
+from time import monotonic
+
+from app.AsyncCollector import AsyncCollector
+from app.Probes import Probe
+
+
+@pytest.fixture(scope='function')
+def uncached_object():
+    collector = AsyncCollector(cache_sec=0)
+    yield collector
+    collector.close()
+
+
+def collect_test(uncached_object):
+    data = run(uncached_object.collect())
+
+    assert isinstance(data['epoch'], int)
+    assert isinstance(data['ram']['usage'], float)
+    assert isinstance(data['cpu']['usage'], float)
+    assert data['net']
+
+
+def collect_deadline_test(uncached_object):
+    async def slow():
+        await uncached_object._exec(['sleep', '5'])
+        return {'cpu': 1}
+
+    async def fast():
+        return {'cpu': 2}
+
+    uncached_object.probes = {}
+    uncached_object.register(Probe('slow', slow, 'slow', timeout_sec=0.2))
+    uncached_object.register(Probe('fast', fast, 'fast'))
+    uncached_object.register(Probe('blocking', lambda: {'cpu': 3}, 'blocking'))
+
+    checkpoint = monotonic()
+    data = run(uncached_object.collect())
+
+    assert monotonic() - checkpoint < 1
+    assert data['cpu'] == {'fast': 2, 'blocking': 3}
+    assert uncached_object.probes['slow'].stats.timeouts == 1
+
+
+def collect_hung_blocking_probe_test(uncached_object):
+    released, calls = Event(), []
+
+    def hung():
+        calls.append(monotonic())
+        released.wait(5)
+        return {'cpu': 1}
+
+    async def collect_twice():
+        first = await uncached_object.collect()
+        running = uncached_object.probes['hung'].running
+        second = await uncached_object.collect()
+        released.set()
+        return first, running, second
+
+    uncached_object.probes = {}
+    uncached_object.register(Probe('hung', hung, 'hung', timeout_sec=0.2))
+
+    first, running, second = run(collect_twice())
+
+    assert 'cpu' not in first and 'cpu' not in second
+    assert running and len(calls) == 1  # not submitted again while its thread is blocked
+    assert uncached_object.probes['hung'].stats.timeouts == 1
+
+
+def exec_test():
+    assert run(AsyncCollector._exec(['echo', 'one\n\ntwo'])) == ['one', 'two']
+
+    with pytest.raises(OSError, match='not found'):
+        run(AsyncCollector._exec(['/nonexistent/sensors']))
+
+    with pytest.raises(OSError):
+        run(AsyncCollector._exec(['ls', '/nonexistent']))
@@ -0,0 +1,113 @@
+import pytest
+
+from copy import deepcopy
+
+from app.Codec import DeltaDecoder, DeltaEncoder, Snapshot, encode, decode, HEADER, MAGIC, MSGPACK
+
+
+@pytest.fixture(scope='module')
+def message_var() -> dict:
+    return {
+        'device': 'host',
+        'collected_at': '2024-11-01 10:00:00 +00:00',
+        'cpu': {'sensors': {'Tctl': 43.125}, 'thermal_zones': [47.05, 61.05], 'usage': 10.0},
+        'gpu': {'nvidia': {'0': {'temperature': 49.0, 'power': None}}},
+        'ram': {'usage': 7.6},
+        'net': {'eth0': {'in': 379.0, 'out': 0.6}, 'veth9a': {'in': 2 ** 40, 'out': -1}},
+        'storage': {'/': {'free': 81716.9, 'total': 258019.6, 'used': 18181.6}},
+        'other': [True, False, 1e300, float('inf'), -0.123456, 'ünïcode'],
+    }
+
+
+@pytest.mark.parametrize('encoding', ('json', 'binary'))
+def round_trip_test(message_var, encoding):
+    assert decode(encode(message_var, encoding)) == message_var
+
+
+@pytest.mark.parametrize('encoding', ('json', 'binary'))
+def snapshot_encode_test(message_var, encoding):
+    points = {'epoch': 1730455200, **{k: v for k, v in message_var.items() if k not in ('device', 'collected_at')}}
+    snapshot = Snapshot(1730455200.123, message_var['device'], message_var['collected_at'], points)
+
+    assert encode(snapshot, encoding) == encode(message_var, encoding)
+    assert snapshot == message_var and len(snapshot) == len(message_var)
+    assert snapshot.timestamp == 1730455200123
+    assert 'epoch' not in snapshot and snapshot.points is points
+    assert snapshot.items() == message_var.items() and ('device', 'host') in snapshot.items()
+
+    decoded = Snapshot.from_message(decode(encode(snapshot, encoding)), snapshot.epoch)
+    assert decoded.device == 'host' and decoded == snapshot
+
+
+def binary_header_test(message_var):
+    value = encode(message_var, 'binary')
+    assert value[:HEADER.size] == HEADER.pack(MAGIC, MSGPACK)  # told apart from JSON by its first byte
+
+
+def unknown_encoding_test(message_var):
+    with pytest.raises(ValueError):
+        encode(message_var, 'xml')
+
+
+def unknown_codec_test(message_var):
+    value = HEADER.pack(MAGIC, 255) + encode(message_var, 'binary')[HEADER.size:]
+    with pytest.raises(ValueError):
+        decode(value)
+
+
+def truncated_message_test(message_var):
+    with pytest.raises(ValueError):
+        decode(encode(message_var, 'binary')[:-5])
+
+
+def delta_frames_test(message_var):
+    encoder, decoder = DeltaEncoder(keyframe_every=3), DeltaDecoder()
+
+    second = deepcopy(message_var)
+    second['cpu']['usage'] = 12.5
+    del second['net']['veth9a']
+
+    keyframe = encoder.frame(message_var, 1000)
+    delta = encoder.frame(second, 2000)
+
+    assert keyframe['_frame'] == {'id': 1000}
+    assert delta == {'_frame': {'base': 1000, 'unset': [['net', 'veth9a']]}, 'cpu': {'usage': 12.5}}
+    assert encoder.frame(second, 3000)['_frame'] == {'base': 1000, 'unset': [['net', 'veth9a']]}
+    assert encoder.frame(second, 4000)['_frame'] == {'id': 4000}  # every 3 messages
+
+    assert decoder.rebuild('host', decode(encode(keyframe, 'binary'))) == message_var
+    assert decoder.rebuild('host', decode(encode(delta, 'binary'))) == second
+    assert decoder.rebuild('host', decode(encode(delta, 'binary'))) == second  # keyframe not changed by rebuilds
+    assert 'veth9a' in message_var['net']
+
+
+def delta_without_keyframe_test():
+    assert DeltaDecoder().rebuild('host', {'_frame': {'base': 1000}, 'cpu': {'usage': 1.0}}) is None
+
+
+def delta_resumed_keyframes_test(message_var):
+    encoder, decoder = DeltaEncoder(keyframe_every=3), DeltaDecoder()
+    decoder.rebuild('host', encoder.frame(message_var, 1000))
+
+    resumed = DeltaDecoder(keyframes=decoder.keyframes)  # as persisted between runs
+    assert resumed.rebuild('host', encoder.frame(message_var, 2000)) == message_var
+
+
+def delta_late_keyframe_test(message_var):
+    encoder, decoder = DeltaEncoder(keyframe_every=3), DeltaDecoder(keep=2)
+
+    second = deepcopy(message_var)
+    second['cpu']['usage'] = 12.5
+    keyframe, delta = encoder.frame(message_var, 1000), encoder.frame(second, 2000)
+
+    assert decoder.rebuild('host', decode(encode(delta, 'binary')), tag=2.0) is None  # replayed before its keyframe
+    assert decoder.rebuild('other', {'_frame': {'base': 1000}, 'cpu': {'usage': 1.0}}) is None
+    assert not decoder.released
+
+    assert decoder.rebuild('host', decode(encode(keyframe, 'binary')), tag=1.0) == message_var
+    assert decoder.released == [(2.0, second)]
+    assert decoder.pending == {'host': {}, 'other': {1000: [(None, {'base': 1000}, {'cpu': {'usage': 1.0}})]}}
+
+    for base in (3000, 4000, 5000):  # keyframes waited for are capped per key
+        decoder.rebuild('host', {'_frame': {'base': base}})
+    assert sorted(decoder.pending['host']) == [4000, 5000]
@@ -2,8 +2,11 @@ import pytest
 from pathlib import Path
 from logging import getLevelName
 from glob import glob
+from threading import get_ident
+from time import monotonic, sleep
 
 from app.Collector import Collector
+from app.Probes import Probe
 
 
 # @pytest.fixture(scope='module')
@@ -24,7 +27,9 @@ from app.Collector import Collector
 
 @pytest.fixture(scope='function')
 def class_object():
-    return Collector()
+    collector = Collector()
+    yield collector
+    collector.close()
 
 
 def class_object_test(class_object):
@@ -34,3 +39,116 @@ def class_object_test(class_object):
 def method_log_test(class_object, caplog):
     class_object._log("pytest log entry")
     assert not caplog.text
+
+
+@pytest.fixture(scope='function')
+def uncached_object():
+    collector = Collector(cache_sec=0, workers=2)
+    collector.probes = {}
+    yield collector
+    collector.close()
+
+
+def probe_deadline_test(uncached_object):
+    uncached_object.register(Probe('slow', lambda: sleep(1) or {'cpu': 1}, 'slow', timeout_sec=0.1))
+    uncached_object.register(Probe('fast', lambda: {'cpu': 2}, 'fast'))
+
+    checkpoint = monotonic()
+    data = uncached_object.data
+
+    assert monotonic() - checkpoint < 0.5
+    assert data['cpu'] == {'fast': 2}
+    assert uncached_object.probes['slow'].running
+
+
+def probe_interval_test(uncached_object):
+    calls = []
+    uncached_object.register(Probe('storage', lambda: calls.append(1) or {'storage': {'/': {}}}, 'x', 'replace', 300))
+
+    uncached_object.data
+    data = uncached_object.data
+
+    assert len(calls) == 1
+    assert data['storage'] == {'/': {}}
+
+
+def persistent_workers_test(uncached_object):
+    threads = set()
+    uncached_object.register(Probe('thread', lambda: threads.add(get_ident()) or {'cpu': 1}, 'thread'))
+
+    for _ in range(3):
+        uncached_object.data
+
+    assert len(threads) == 1
+
+
+def probe_hwmon_sensors_test(uncached_object, tmp_path, monkeypatch):
+    chip = tmp_path / 'hwmon0'
+    chip.mkdir()
+    (chip / 'name').write_text('k10temp\n')
+    (chip / 'temp1_label').write_text('Tctl\n')
+    (chip / 'temp1_input').write_text('43125\n')
+    monkeypatch.setattr('app.Collector.HWMON_ROOT', str(tmp_path))
+
+    assert uncached_object._probe_lm_sensors() == {'cpu': {'Tctl': 43.125}}
+
+
+def probe_stats_test(uncached_object, tmp_path):
+    def fail():
+        raise OSError('pytest')
+
+    uncached_object.register(Probe('fail', fail, 'fail'))
+    uncached_object.register(Probe('fast', lambda: {'cpu': 2}, 'fast'))
+    uncached_object.meta = True
+    uncached_object.stats_path = tmp_path / 'probes.json'
+
+    uncached_object.data
+    stats = uncached_object.data['_meta']['probes']
+
+    assert stats['fail']['runs'] == 2 and stats['fail']['errors'] == 2 and stats['fail']['success_age_sec'] is None
+    assert stats['fast']['runs'] == 2 and stats['fast']['errors'] == 0 and sum(stats['fast']['histogram']) == 2
+    assert stats['fast']['success_age_sec'] < 1
+    assert '"fail"' in uncached_object.stats_path.read_text()
+
+
+def probe_net_raw_counters_test(uncached_object, tmp_path, monkeypatch):
+    net_dev = tmp_path / 'dev'
+    net_dev.write_text(
+        'Inter-|   Receive |  Transmit\n face |bytes packets errs drop fifo frame compressed multicast|bytes ...\n'
+        '  eth0: 2000000 2000 1 2 0 0 0 0 1000000 1000 3 4 0 0 0 0\n'
+    )
+    monkeypatch.setattr('app.Collector.NET_DEV_PATH', str(net_dev))
+
+    assert uncached_object._fetch_networks() == {'net': {'eth0': {'in': 16.0, 'out': 8.0}}, 'net_units': 'Mb'}
+
+    monkeypatch.setattr('app.Collector.NET_RAW_COUNTERS', True)
+    uncached_object._net_dev.close()
+    uncached_object._net_dev = None
+
+    data = uncached_object._fetch_networks()
+    assert data['net'] == {'eth0': {
+        'in': 2000000, 'packets_in': 2000, 'errs_in': 1, 'drop_in': 2,
+        'out': 1000000, 'packets_out': 1000, 'errs_out': 3, 'drop_out': 4,
+    }}
+    assert data['net_units'] == 'bytes' and abs(data['net_sampled_at'] - monotonic()) < 1
+
+
+def probe_samples_test(tmp_path, monkeypatch):
+    zone = tmp_path / 'thermal_zone0'
+    zone.mkdir()
+    (zone / 'temp').write_text('40000\n')
+    monkeypatch.setattr('app.Collector.THERMAL_ROOT', str(tmp_path))
+
+    collector = Collector(cache_sec=0, streaming=True, sample_metrics=['cpu_usage', 'thermal_zones'])
+    collector.probes = {name: probe for name, probe in collector.probes.items() if name == 'samples'}
+    collector._sampler.sample()
+
+    try:
+        data = collector.data
+    finally:
+        collector.close()
+
+    assert set(data['samples']['cpu']) == {'usage', 'thermal_zones'}
+    assert data['samples']['cpu']['thermal_zones'] == [
+        {'min': 40.0, 'max': 40.0, 'mean': 40.0, 'p95': 40.0, 'last': 40.0},
+    ]
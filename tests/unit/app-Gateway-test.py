@@ -0,0 +1,51 @@
+from asyncio import run
+from pathlib import Path
+from time import monotonic
+
+from app.Gateway import Gateway
+
+SRC_DIR = Path(__file__).resolve().parents[2] / 'src'
+STANDIN_COMMAND = f'env PYTHONPATH={SRC_DIR} CONFIG_SNAPSHOT=0 {{python}} -m app --agent --device standin-{{host}}'
+
+
+def collect_test():
+    async def collect_twice():
+        gateway = Gateway(['1', '2', '3'], command=STANDIN_COMMAND, workers=2, timeout_sec=10)
+        try:
+            first = await gateway.collect()
+            pids = [channel._proc.pid for channel in gateway.channels]
+            second = await gateway.collect()
+            return first, second, pids == [channel._proc.pid for channel in gateway.channels]
+        finally:
+            await gateway.close()
+
+    first, second, kept_running = run(collect_twice())
+
+    assert [channel.device for channel, _ in first] == ['standin-1', 'standin-2', 'standin-3']
+    for _, data in first + second:
+        assert data['net']
+        assert 'device' not in data
+
+    assert [data['_meta']['gateway']['runs'] for _, data in second] == [2, 2, 2]
+    assert kept_running
+    assert not any(channel.alive for channel, _ in first)
+
+
+def collect_failing_hosts_test():
+    async def collect():
+        hung = Gateway(['5'], command='sleep {host}', timeout_sec=0.3)
+        missing = Gateway(['x'], command='/nonexistent/agent {host}', timeout_sec=0.3)
+        try:
+            return await hung.collect(), await missing.collect(), hung, missing
+        finally:
+            await hung.close()
+            await missing.close()
+
+    checkpoint = monotonic()
+    hung_res, missing_res, hung, missing = run(collect())
+
+    assert monotonic() - checkpoint < 2
+    assert not hung_res and not missing_res
+    assert hung.channels[0].stats.timeouts == 1
+    assert missing.channels[0].stats.errors == 1
+    assert not hung.channels[0].alive
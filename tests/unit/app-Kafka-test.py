@@ -0,0 +1,101 @@
+import pytest
+from time import monotonic
+
+from app.Codec import Snapshot
+from app.Kafka import Producer
+from app.Spool import Spool
+
+
+@pytest.fixture(scope='function')
+def batch_producer_object():
+    producer = Producer(brokers=['127.0.0.1:1'], batch=True)  # unreachable: messages stay queued
+    yield producer
+    producer.close(timeout=0)
+
+
+def batch_stream_does_not_block_test(batch_producer_object):
+    checkpoint = monotonic()
+    batch_producer_object.stream(messages=[{'epoch': 1.5, 'cpu': {'usage': 1.0}}], topic='pytest', key='host')
+
+    assert monotonic() - checkpoint < 0.5
+    assert batch_producer_object.pending >= 1  # also counts librdkafka events, as connection errors
+
+
+
+def close_spools_pending_test(tmp_path):
+    spool = Spool(tmp_path / 'spool')
+    producer = Producer(brokers=['127.0.0.1:1'], batch=True, spool=spool)
+
+    message = {'epoch': 1.5, 'cpu': {'usage': 1.0}}
+    producer.stream(messages=[message, Snapshot(2.5, 'host', points=message)], topic='pytest', key='host')
+    producer.close(timeout=0)
+
+    records = [record for segment in spool.segments() for record in spool.records(segment)]
+    assert records == [
+        (1500, 'pytest', b'host', b'{"cpu":{"usage":1.0}}'),
+        (2500, 'pytest', b'host', b'{"device":"host","cpu":{"usage":1.0}}'),
+    ]
+    assert message == {'epoch': 1.5, 'cpu': {'usage': 1.0}}  # left untouched
+
+
+def replay_test(tmp_path):
+    spool = Spool(tmp_path / 'spool')
+    spool.append(1500, 'pytest', b'host', b'{}')
+    producer = Producer(brokers=['127.0.0.1:1'], spool=spool)
+
+    assert not producer.replay()  # no delivery succeeded yet
+
+    producer._reachable = True
+    assert producer.replay() == 1
+    assert producer.pending >= 1
+    assert not Spool(tmp_path / 'spool').empty  # kept until reported, as for a crash before delivery
+    assert not producer.replay()  # waiting for its reports, not replayed twice
+
+    producer.close(timeout=0)  # reported as not delivered: back to the spool, and the replayed segment removed
+
+    records = [record for segment in spool.segments() for record in spool.records(segment)]
+    assert records == [(1500, 'pytest', b'host', b'{}')]
+
+
+def poll_without_thread_test():
+    producer = Producer(brokers=['127.0.0.1:1'], batch=True, poll_thread=False)  # reports served by poll()
+    producer.stream(messages=[{'epoch': 1.5, 'cpu': {'usage': 1.0}}], topic='pytest', key='host')
+
+    assert producer._poller is None
+    assert producer.poll(timeout=0) >= 0
+    producer.close(timeout=0)
+
+
+class FullQueue:
+    def __init__(self, kafka):
+        """Stand-in for a confluent_kafka Producer whose local queue is always full"""
+        self.kafka = kafka
+        self.polls = 0
+
+    def produce(self, **_params):
+        raise BufferError('Local: Queue full')
+
+    def poll(self, timeout: float = 0) -> int:
+        self.polls += 1
+        return self.kafka.poll(timeout=0)
+
+    def __len__(self) -> int:
+        return len(self.kafka)
+
+    def __getattr__(self, name: str):
+        return getattr(self.kafka, name)
+
+
+def stream_full_queue_test(tmp_path, monkeypatch):
+    monkeypatch.setattr(Producer, 'QUEUE_FULL_WAIT_SEC', 0)
+    spool = Spool(tmp_path / 'spool')
+    producer = Producer(brokers=['127.0.0.1:1'], batch=True, spool=spool, poll_thread=False)
+    producer._Producer__kafka = queue = FullQueue(producer._Producer__kafka)
+
+    producer.stream(messages=[{'epoch': 1.5, 'cpu': {'usage': 1.0}}], topic='pytest', key='host')
+
+    assert queue.polls == Producer.QUEUE_FULL_RETRIES
+    records = [record for segment in spool.segments() for record in spool.records(segment)]
+    assert records == [(1500, 'pytest', b'host', b'{"cpu":{"usage":1.0}}')]
+    producer._Producer__kafka = queue.kafka
+    producer.close(timeout=0)
@@ -0,0 +1,122 @@
+import pytest
+from pathlib import Path
+from time import monotonic
+
+from app.Nvidia import NvidiaSmiStream, parse_line, query_args
+
+
+FAKE_NVIDIA_SMI = '''#!/bin/sh
+# Fake nvidia-smi: list or report two GPUs, once or in loop if --loop-ms is set
+report() {
+  echo "0, 45, 12, 1024, 8192, 35.50"
+  echo "1, 50, [N/A], 2048, 8192, [N/A]"
+}
+
+case "$*" in
+  -L) echo "GPU 0: Fake GPU (UUID: GPU-0)"; echo "GPU 1: Fake GPU (UUID: GPU-1)" ;;
+  *--loop-ms=*) while true; do report; sleep 0.05; done ;;
+  *) report ;;
+esac
+'''
+
+
+@pytest.fixture(scope='function')
+def fake_nvidia_smi_var(tmp_path) -> str:
+    path = tmp_path / 'nvidia-smi'
+    path.write_text(FAKE_NVIDIA_SMI)
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture(scope='function')
+def stream_object(fake_nvidia_smi_var):
+    stream = NvidiaSmiStream(fake_nvidia_smi_var, interval_ms=50)
+    yield stream
+    stream.close()
+
+
+def query_args_test():
+    args = query_args('nvidia-smi', interval_ms=500)
+    assert args[0] == 'nvidia-smi' and args[-1] == '--loop-ms=500'
+    assert '--format=csv,noheader,nounits' in args
+
+
+@pytest.mark.parametrize(
+    'line, expected', (
+            ('0, 45, 12, 1024, 8192, 35.50', {
+                '0': {'temperature': 45.0, 'utilization': 12.0, 'memory_used': 1024.0, 'memory_total': 8192.0,
+                      'power': 35.5},
+            }),
+            ('1, 50, [N/A], 2048, 8192, [N/A]', {
+                '1': {'temperature': 50.0, 'utilization': None, 'memory_used': 2048.0, 'memory_total': 8192.0,
+                      'power': None},
+            }),
+            ('index, temperature.gpu', {}),
+            ('', {}),
+    ),
+)
+def parse_line_test(line, expected):
+    assert parse_line(line) == expected
+
+
+def stream_read_test(stream_object):
+    data = stream_object.read(timeout=5)
+
+    assert set(data) == {'0', '1'}
+    assert data['0']['temperature'] == 45.0
+    assert stream_object.alive
+
+
+@pytest.mark.parametrize('listing, listed', (('echo "GPU 0: Fake GPU (UUID: GPU-0)"', True), ('exit 1', False)))
+def stream_single_gpu_test(tmp_path, listing, listed):
+    path = tmp_path / 'nvidia-smi'
+    path.write_text(f'''#!/bin/sh
+case "$*" in
+  -L) {listing} ;;
+  *) while true; do echo "0, 45, 12, 1024, 8192, 35.50"; sleep 0.5; done ;;
+esac
+''')
+    path.chmod(0o755)
+
+    stream = NvidiaSmiStream(str(path), interval_ms=500)
+    checkpoint = monotonic()
+    try:
+        assert set(stream.read(timeout=5)) == {'0'}
+        took = monotonic() - checkpoint
+    finally:
+        stream.close()
+
+    if listed:
+        assert took < 0.4  # complete on its only GPU, not once its index repeats
+    else:
+        assert took >= 0.4  # not listed: complete once its index repeats
+
+
+def stream_restart_test(stream_object):
+    stream_object.read(timeout=5)
+    stream_object.close()
+    assert not stream_object.alive
+
+    assert stream_object.read(timeout=5)
+    assert stream_object.alive
+
+
+def stream_missing_command_test(tmp_path):
+    stream = NvidiaSmiStream(str(tmp_path / 'nvidia-smi'))
+    with pytest.raises(OSError):
+        stream.read(timeout=1)
+
+
+def stream_close_timeout_test(tmp_path):
+    path = tmp_path / 'nvidia-smi'
+    path.write_text(FAKE_NVIDIA_SMI.replace('report() {', "trap '' TERM\nreport() {"))  # ignores SIGTERM
+    path.chmod(0o755)
+
+    stream = NvidiaSmiStream(str(path), interval_ms=50)
+    stream.read(timeout=5)
+
+    checkpoint = monotonic()
+    stream.close(timeout=0.2)
+
+    assert monotonic() - checkpoint < 2
+    assert not stream.alive
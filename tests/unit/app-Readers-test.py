@@ -0,0 +1,93 @@
+import pytest
+from pathlib import Path
+
+from app.Readers import FileReader, HwmonReader, ThermalZonesReader, hostname, parse_net_dev
+
+
+NET_DEV = '''Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo:    1000      10    0    0    0     0          0         0     1000      10    0    0    0     0       0          0
+  eth0: 2000000    2000    1    2    0     0          0         0  1000000    1000    3    4    0     0       0          0
+'''
+
+
+@pytest.fixture(scope='function')
+def thermal_root_var(tmp_path) -> Path:
+    for zone, temp in enumerate(('20000', '47050', '61050')):
+        path = tmp_path / f'thermal_zone{zone}'
+        path.mkdir()
+        (path / 'temp').write_text(f'{temp}\n')
+    return tmp_path
+
+
+@pytest.fixture(scope='function')
+def hwmon_root_var(tmp_path) -> Path:
+    chips = {
+        'hwmon0': ('coretemp', {'temp1': ('Package id 0', '58000'), 'temp2': ('Core 0', '55000')}),
+        'hwmon1': ('amdgpu', {'temp1': ('edge', '41000')}),
+        'hwmon2': ('acpitz', {'temp1': (None, '27800')}),
+    }
+    for chip, (name, sensors) in chips.items():
+        path = tmp_path / chip
+        path.mkdir()
+        (path / 'name').write_text(f'{name}\n')
+        for sensor, (label, temp) in sensors.items():
+            (path / f'{sensor}_input').write_text(f'{temp}\n')
+            if label:
+                (path / f'{sensor}_label').write_text(f'{label}\n')
+    return tmp_path
+
+
+def file_reader_reread_test(tmp_path):
+    path = tmp_path / 'temp'
+    path.write_text('1000\n')
+    reader = FileReader(str(path), chunk_size=2)
+
+    assert reader.read() == '1000\n'
+
+    path.write_text('2000\n')
+    assert reader.read() == '2000\n'
+
+    reader.close()
+
+
+def thermal_zones_reader_test(thermal_root_var):
+    reader = ThermalZonesReader(str(thermal_root_var))
+    assert reader.read() == [20.0, 47.05, 61.05]
+
+
+def thermal_zones_missing_test(tmp_path):
+    with pytest.raises(OSError):
+        ThermalZonesReader(str(tmp_path))
+
+
+def hwmon_reader_test(hwmon_root_var):
+    reader = HwmonReader(str(hwmon_root_var))
+    assert reader.read() == {'Package id 0': 58.0, 'Core 0': 55.0, 'edge': 41.0, 'acpitz': 27.8}
+
+    (hwmon_root_var / 'hwmon1' / 'temp1_input').write_text('43000\n')
+    assert reader.read()['edge'] == 43.0
+
+
+def hwmon_reader_names_test(hwmon_root_var):
+    reader = HwmonReader(str(hwmon_root_var), names=('Package id 0', 'edge'))
+    assert reader.read() == {'Package id 0': 58.0, 'edge': 41.0}
+
+
+def hwmon_reader_missing_test(tmp_path):
+    with pytest.raises(OSError):
+        HwmonReader(str(tmp_path))
+
+
+def parse_net_dev_test():
+    data = parse_net_dev(NET_DEV.splitlines(), skip=('lo',))
+    assert data == {'eth0': {'in': 2000000, 'out': 1000000}}
+
+
+def parse_net_dev_fields_test():
+    data = parse_net_dev(NET_DEV.splitlines(), skip=('lo',), fields=('in', 'errs_in', 'drop_out'))
+    assert data == {'eth0': {'in': 2000000, 'errs_in': 1, 'drop_out': 4}}
+
+
+def hostname_test():
+    assert hostname() and '.' not in hostname()
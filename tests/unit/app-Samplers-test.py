@@ -0,0 +1,93 @@
+import pytest
+from os import cpu_count
+from time import monotonic, sleep
+
+from app.Samplers import CpuSampler, HighFrequencySampler, RingBuffer
+
+
+@pytest.fixture(scope='function')
+def cpu_sampler_object():
+    return CpuSampler(min_window_sec=0.05, per_core=True)
+
+
+def cpu_sample_test(cpu_sampler_object):
+    sample = cpu_sampler_object.sample()
+
+    assert set(sample) == {'usage', 'user', 'system', 'iowait', 'steal', 'cores'}
+    assert 0 <= sample['usage'] <= 100
+    assert len(sample['cores']) == cpu_count()
+
+
+def cpu_sample_reused_within_window_test(cpu_sampler_object):
+    first = cpu_sampler_object.sample()
+    assert cpu_sampler_object.sample() is first
+
+
+def cpu_sample_does_not_block_test(cpu_sampler_object):
+    cpu_sampler_object.sample()
+    sleep(0.06)
+
+    checkpoint = monotonic()
+    cpu_sampler_object.sample()
+    assert monotonic() - checkpoint < 0.05
+
+
+def cpu_first_sample_since_boot_test():
+    sampler = CpuSampler(min_window_sec=10)  # as a one-shot run, sampling right after instantiation
+
+    checkpoint = monotonic()
+    first = sampler.sample()
+    assert monotonic() - checkpoint < 0.05  # no wait for the window
+    assert 0 < first['usage'] <= 100 and sampler.sample() is first
+
+
+def ring_buffer_aggregate_test():
+    buffer = RingBuffer(4)
+    assert buffer.aggregate() == {}
+
+    for value in (5.0, 1.0, 3.0):
+        buffer.append(value)
+    assert buffer.aggregate() == {'min': 1.0, 'max': 5.0, 'mean': 3.0, 'p95': 5.0, 'last': 3.0}
+
+    for value in (7.0, 9.0, 2.0):  # overwrite the 3 oldest values
+        buffer.append(value)
+    assert len(buffer) == 4
+    assert buffer.aggregate() == {'min': 2.0, 'max': 9.0, 'mean': 5.25, 'p95': 9.0, 'last': 2.0}
+
+    buffer.clear()
+    assert not len(buffer)
+
+
+@pytest.fixture(scope='function')
+def sampler_object(tmp_path):
+    zone = tmp_path / 'thermal' / 'thermal_zone0'
+    zone.mkdir(parents=True)
+    (zone / 'temp').write_text('40000\n')
+
+    net_dev = tmp_path / 'net_dev'
+    net_dev.write_text('Inter-|\n face |\n' + ''.join(f'{dev:>6}: {"0 " * 16}\n' for dev in ('eth0', 'lo')))
+
+    sampler = HighFrequencySampler(
+        ('cpu_usage', 'thermal_zones', 'hwmon', 'net'), interval_sec=60, size=8, net_skip=('lo',),
+        thermal_root=str(tmp_path / 'thermal'), hwmon_root=str(tmp_path / 'hwmon'), net_dev_path=str(net_dev),
+    )
+    yield sampler
+    sampler.close()
+
+
+def high_frequency_sample_test(sampler_object, tmp_path):
+    assert sampler_object.unavailable == ['hwmon']
+    sampler_object.sample()  # first sample: network counters, without rates yet
+
+    (tmp_path / 'thermal' / 'thermal_zone0' / 'temp').write_text('50000\n')
+    sleep(0.01)
+    (tmp_path / 'net_dev').write_text('Inter-|\n face |\n  eth0: 1000000 0 0 0 0 0 0 0 500000 0 0 0 0 0 0 0\n')
+    sampler_object.sample()
+
+    res = sampler_object.aggregate()
+    assert set(res) == {'cpu_usage', 'thermal_zones', 'net'}
+    assert res['thermal_zones'][0]['min'] == 40.0 and res['thermal_zones'][0]['last'] == 50.0
+    assert list(res['net']) == ['eth0']
+    assert res['net']['eth0']['in']['last'] > res['net']['eth0']['out']['last'] > 0
+
+    assert sampler_object.aggregate() == {}  # buffers start over after each aggregate
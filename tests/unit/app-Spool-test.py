@@ -0,0 +1,56 @@
+import pytest
+
+from app.Spool import Spool
+
+
+@pytest.fixture(scope='function')
+def spool_object(tmp_path):
+    return Spool(tmp_path / 'spool', max_mb=0.01, segments=4)  # ~2.5KB segments
+
+
+def append_and_read_test(spool_object):
+    spool_object.append(1700000000123, 'telemetry', b'host', b'{"cpu":1}')
+    spool_object.append(1700000060123, 'telemetry', None, b'{"cpu":2}')
+
+    segments = spool_object.seal()
+    records = [record for segment in segments for record in spool_object.records(segment)]
+
+    assert records == [
+        (1700000000123, 'telemetry', b'host', b'{"cpu":1}'),
+        (1700000060123, 'telemetry', None, b'{"cpu":2}'),
+    ]
+
+
+def seal_starts_new_segment_test(spool_object):
+    spool_object.append(1, 'telemetry', b'host', b'1')
+    sealed = spool_object.seal()
+    spool_object.append(2, 'telemetry', b'host', b'2')
+
+    assert len(spool_object.segments()) == len(sealed) + 1
+
+
+def eviction_test(spool_object):
+    for i in range(200):
+        spool_object.append(i, 'telemetry', b'host', b'x' * 100)
+
+    assert spool_object.size <= spool_object.max_bytes
+    oldest = next(spool_object.records(spool_object.segments()[0]))
+    assert oldest[0] > 0  # first records were evicted
+
+
+def truncated_record_test(spool_object):
+    spool_object.append(1, 'telemetry', b'host', b'complete')
+    spool_object.append(2, 'telemetry', b'host', b'truncated')
+
+    segment = spool_object.seal()[-1]
+    segment.write_bytes(segment.read_bytes()[:-3])
+
+    assert [record[0] for record in spool_object.records(segment)] == [1]
+
+
+def remove_test(spool_object):
+    spool_object.append(1, 'telemetry', b'host', b'1')
+    for segment in spool_object.seal():
+        spool_object.remove(segment)
+
+    assert spool_object.empty
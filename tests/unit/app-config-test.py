@@ -0,0 +1,44 @@
+import pytest
+
+from app.config import Snapshot
+
+
+@pytest.fixture(scope='function')
+def env_dir_var(tmp_path, monkeypatch):
+    (tmp_path / '.env').write_text('SNAPSHOT_TEST_NAME=from-env\nSNAPSHOT_TEST_SEC=5\n')
+    (tmp_path / 'config.py').write_text('')
+    monkeypatch.delenv('SNAPSHOT_TEST_NAME', raising=False)
+    monkeypatch.delenv('CONFIG_SNAPSHOT', raising=False)
+    return tmp_path
+
+
+def snapshot_resolve_and_save_test(env_dir_var):
+    snapshot = Snapshot(env_dir_var, module=env_dir_var / 'config.py')
+    assert snapshot('SNAPSHOT_TEST_NAME') == 'from-env'
+    assert snapshot('SNAPSHOT_TEST_SEC', cast=float) == 5.0
+    assert snapshot('SNAPSHOT_TEST_MISSING', default='fallback') == 'fallback'
+
+    snapshot.save()
+    assert (env_dir_var / '.env.snapshot').is_file()
+
+    cached = Snapshot(env_dir_var, module=env_dir_var / 'config.py')
+    assert cached.values == {
+        'SNAPSHOT_TEST_NAME': 'from-env', 'SNAPSHOT_TEST_SEC': 5.0, 'SNAPSHOT_TEST_MISSING': 'fallback',
+    }
+    assert cached('SNAPSHOT_TEST_SEC', cast=float) == 5.0
+    assert not cached.changed
+
+
+def snapshot_invalidated_test(env_dir_var, monkeypatch):
+    snapshot = Snapshot(env_dir_var, module=env_dir_var / 'config.py')
+    snapshot('SNAPSHOT_TEST_NAME')
+    snapshot.save()
+
+    monkeypatch.setenv('SNAPSHOT_TEST_NAME', 'from-environ')
+    assert not Snapshot(env_dir_var, module=env_dir_var / 'config.py').values
+    assert Snapshot(env_dir_var, module=env_dir_var / 'config.py')('SNAPSHOT_TEST_NAME') == 'from-environ'
+
+    monkeypatch.delenv('SNAPSHOT_TEST_NAME')
+    (env_dir_var / '.env').write_text('SNAPSHOT_TEST_NAME=updated\n')
+    assert not Snapshot(env_dir_var, module=env_dir_var / 'config.py').values
+    assert Snapshot(env_dir_var, module=env_dir_var / 'config.py')('SNAPSHOT_TEST_NAME') == 'updated'
@@ -0,0 +1,208 @@
+"""Stand-ins for the host and the broker, so tests and benchmarks run the code and not the machine running them
+
+FakeHost builds sysfs and procfs trees and stub binaries in a directory, and points the collectors to them.
+FakeProducer and FakeConsumer replace confluent_kafka clients, serving delivery reports and messages from memory.
+"""
+from pathlib import Path
+
+import app.AsyncCollector as async_collector_module
+import app.Collector as collector_module
+
+FAKE_SENSORS = '''#!/bin/sh
+echo "Package id 0:  +58.0°C  (high = +100.0°C, crit = +100.0°C)"
+echo "Core 0:        +55.0°C  (high = +100.0°C, crit = +100.0°C)"
+echo "edge:          +41.0°C"
+'''
+
+FAKE_NVIDIA_SMI = '''#!/bin/sh
+report() {
+  echo "0, 45, 12, 1024, 8192, 35.50"
+}
+
+case "$*" in
+  -L) echo "GPU 0: Fake GPU (UUID: GPU-0)" ;;
+  *--loop-ms=*) while true; do report; sleep 0.05; done ;;
+  *) report ;;
+esac
+'''
+
+NET_DEV_HEADER = (
+    'Inter-|   Receive                                                |  Transmit\n'
+    ' face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier '
+    'compressed\n'
+)
+NET_DEV_LINE = '{:>6}: {} 2000 1 2 0 0 0 0 {} 1000 3 4 0 0 0 0\n'
+
+
+class FakeHost:
+    PATCHED = ('HWMON_ROOT', 'THERMAL_ROOT', 'NET_DEV_PATH', 'SENSORS_CMD_PATH', 'NVIDIA_CMD_PATH')
+    MODULES = (collector_module, async_collector_module)
+
+    def __init__(self, root: Path, cores: int = 8, zones: int = 4, devices: int = 4):
+        """Build a fake host in a directory
+
+        Args:
+            root (Path): Empty directory to build the trees and stub binaries in
+            cores (int, optional): Core sensors of the CPU hwmon chip
+            zones (int, optional): Thermal zones
+            devices (int, optional): Network devices, besides lo
+        """
+        self.root = Path(root)
+        self.paths = {
+            'HWMON_ROOT': str(self._hwmon(cores)),
+            'THERMAL_ROOT': str(self._thermal(zones)),
+            'NET_DEV_PATH': str(self._net_dev(devices)),
+            'SENSORS_CMD_PATH': str(self._binary('sensors', FAKE_SENSORS)),
+            'NVIDIA_CMD_PATH': str(self._binary('nvidia-smi', FAKE_NVIDIA_SMI)),
+        }
+        self._saved = {}
+
+    def __enter__(self):
+        for module in self.MODULES:
+            for name in self.PATCHED:
+                if hasattr(module, name):
+                    self._saved[(module, name)] = getattr(module, name)
+                    setattr(module, name, self.paths[name])
+        return self
+
+    def __exit__(self, *args):
+        for (module, name), value in self._saved.items():
+            setattr(module, name, value)
+
+    def _hwmon(self, cores: int) -> Path:
+        root = self.root / 'hwmon'
+        chips = {
+            'hwmon0': ('coretemp', [('Package id 0', 58000)] + [(f'Core {i}', 55000 + i) for i in range(cores)]),
+            'hwmon1': ('amdgpu', [('edge', 41000)]),
+        }
+
+        for chip, (name, sensors) in chips.items():
+            path = root / chip
+            path.mkdir(parents=True)
+            (path / 'name').write_text(f'{name}\n')
+            for i, (label, temp) in enumerate(sensors, start=1):
+                (path / f'temp{i}_label').write_text(f'{label}\n')
+                (path / f'temp{i}_input').write_text(f'{temp}\n')
+
+        return root
+
+    def _thermal(self, zones: int) -> Path:
+        root = self.root / 'thermal'
+        for zone in range(zones):
+            path = root / f'thermal_zone{zone}'
+            path.mkdir(parents=True)
+            (path / 'temp').write_text(f'{40000 + zone * 1050}\n')
+        return root
+
+    def _net_dev(self, devices: int) -> Path:
+        path = self.root / 'net_dev'
+        lines = [NET_DEV_LINE.format('lo', 1000, 1000)]
+        lines += [NET_DEV_LINE.format(f'eth{i}', 2000000 * (i + 1), 1000000 * (i + 1)) for i in range(devices)]
+        path.write_text(NET_DEV_HEADER + ''.join(lines))
+        return path
+
+    def _binary(self, name: str, script: str) -> Path:
+        path = self.root / 'bin' / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(script)
+        path.chmod(0o755)
+        return path
+
+
+class FakeMessage:
+    def __init__(
+            self, topic: str, value: bytes, key: bytes = None, timestamp: int = None,
+            partition: int = 0, offset: int = 0,
+    ):
+        self._topic, self._value, self._key = topic, value, key
+        self._timestamp, self._partition, self._offset = timestamp, partition, offset
+
+    def error(self):
+        return None
+
+    def topic(self) -> str:
+        return self._topic
+
+    def value(self) -> bytes:
+        return self._value
+
+    def key(self) -> bytes:
+        return self._key
+
+    def timestamp(self) -> tuple:
+        return 1, self._timestamp
+
+    def partition(self) -> int:
+        return self._partition
+
+    def offset(self) -> int:
+        return self._offset
+
+
+class FakeProducer:
+    def __init__(self, settings: dict):
+        """Accept messages as confluent_kafka.Producer does, and report them delivered when polled"""
+        self.settings = settings
+        self._queue = []
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def produce(self, topic: str, value: bytes, key: bytes = None, timestamp: int = None, callback: callable = None):
+        self._queue.append((FakeMessage(topic, value, key, timestamp), callback))
+
+    def poll(self, timeout: float = None) -> int:
+        served, self._queue = self._queue, []
+        for msg, callback in served:
+            if callback:
+                callback(None, msg)
+        return len(served)
+
+    def flush(self, timeout: float = None) -> int:
+        self.poll()
+        return 0
+
+    def purge(self):
+        self._queue = []
+
+
+class FakeConsumer:
+    def __init__(self, config: dict, messages: list = ()):
+        """Serve messages from memory as confluent_kafka.Consumer does, all in partition 0 of their topic
+
+        Args:
+            config (dict): Consumer settings, ignored
+            messages (list): FakeMessage instances, with increasing offsets
+        """
+        self.messages = list(messages)
+        self._position = 0
+
+    def subscribe(self, topics: list):
+        pass
+
+    def list_topics(self, topic: str, timeout: float = None):
+        partitions = type('Partitions', (), {'partitions': {0: None}})
+        return type('Metadata', (), {'topics': {topic: partitions}})
+
+    def offsets_for_times(self, partitions: list, timeout: float = None) -> list:
+        for tp in partitions:
+            tp.offset = next((m.offset() for m in self.messages if m.timestamp()[1] >= tp.offset), -1)
+        return partitions
+
+    def get_watermark_offsets(self, partition, timeout: float = None, cached: bool = False) -> tuple:
+        return 0, len(self.messages)
+
+    def assign(self, partitions: list):
+        self._position = max(partitions[0].offset, 0) if partitions else len(self.messages)
+
+    def poll(self, timeout: float = None):
+        batch = self.consume(1)
+        return batch[0] if batch else None
+
+    def consume(self, num_messages: int = 1, timeout: float = None) -> list:
+        batch = self.messages[self._position:self._position + num_messages]
+        self._position += len(batch)
+        return batch
+
+    def close(self):
+        pass
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from time import time
+
+import Kafka as plotter_kafka
+from app.Codec import Snapshot, encode
+from fakes import FakeConsumer, FakeMessage
+from Columns import TelemetryColumns
+
+
+@pytest.fixture(scope='function')
+def columns_object() -> TelemetryColumns:
+    columns = TelemetryColumns()
+    columns.append(Snapshot.from_message({'cpu': {'usage': 10.0}, 'net': {'eth0': {'in': 1.5, 'out': 0.5}}}, 120.0))
+    columns.append(Snapshot.from_message({'cpu': {'usage': 'n/a'}, 'ram': {'usage': 50.0}, 'net': {
+        'eth0': {'in': 2.5, 'out': 1.0}, 'eth1': {'in': 7.0, 'out': 'n/a'},  # non numeric counters left out
+    }}, 60.0))
+    columns.append(Snapshot.from_message({'cpu': {'usage': 30.0}, 'net': {'eth1': {'in': 9.0, 'out': 3.0}}}, 180.0))
+    return columns
+
+
+def append_test(columns_object):
+    assert len(columns_object) == 3
+    assert list(columns_object.cpu) == [10.0, 0.0, 30.0] and list(columns_object.ram) == [0.0, 50.0, 0.0]
+    assert list(columns_object.net) == ['eth0', 'eth1']
+    assert list(columns_object.net['eth1'][0]) == [2]  # rows the device was reported in
+    assert columns_object.net['eth1'][0].itemsize == np.dtype(np.int64).itemsize  # as read by arrays(), on any OS
+
+
+def arrays_test(columns_object):
+    arrays = columns_object.arrays()
+
+    assert list(arrays['epoch']) == [60.0, 120.0, 180.0]  # sorted by epoch
+    assert list(arrays['cpu']) == [0.0, 10.0, 30.0]
+    np.testing.assert_array_equal(arrays['eth0_in'], [2.5, 1.5, np.nan])
+    np.testing.assert_array_equal(arrays['eth1_out'], [np.nan, np.nan, 3.0])
+    assert np.isnan(arrays['clock']).all()
+
+
+def extend_test(columns_object):
+    merged = TelemetryColumns()
+    merged.append(Snapshot.from_message({'net': {'eth1': {'in': 1.0, 'out': 1.0}}}, 0.0))
+    merged.extend(columns_object)
+
+    assert len(merged) == 4
+    assert list(merged.net['eth1'][0]) == [0, 3]  # rows offset by the rows of merged
+    np.testing.assert_array_equal(merged.arrays()['eth1_in'], [1.0, np.nan, np.nan, 9.0])
+
+
+@pytest.mark.parametrize(
+    'units, counter, expected', (
+            ('bytes', 1000000, 8.0),  # raw counters, in megabits
+            ('Mb', 8.0, 8.0),
+            (None, 8.0, 8.0),  # published before net_units
+            ('packets', 1000, None),
+    ),
+)
+def append_units_test(units, counter, expected):
+    message = {'net': {'eth0': {'in': counter, 'out': counter}}, 'net_sampled_at': 1000.5}
+    if units:
+        message['net_units'] = units
+
+    columns = TelemetryColumns()
+    columns.append(Snapshot.from_message(message, 60.0))
+
+    assert list(columns.clock) == [1000.5]
+    assert (list(columns.net['eth0'][1]) if columns.net else [None]) == [expected]
+
+
+def fetch_raw_counters_test(monkeypatch):
+    start = int((time() - 600) * 10 ** 3)
+    messages = [
+        FakeMessage('telemetry', encode({
+            'cpu': {'usage': 1.0},
+            'net': {'eth0': {'in': 1000000 * i, 'out': 0, 'packets_in': 10 * i}},
+            'net_units': 'bytes', 'net_sampled_at': 5000.0 + 30 * i,
+        }, 'binary'), b'host', start + 60000 * i, offset=i)
+        for i in range(3)
+    ]
+    monkeypatch.setattr(plotter_kafka, 'Consumer', lambda config: FakeConsumer(config, messages))
+
+    consumer = plotter_kafka.KafkaTelemetryConsumer('127.0.0.1:9092')
+    arrays = consumer.fetch_columns(threshold_days=1, filter_host='host').arrays()
+
+    assert list(arrays['clock']) == [5000.0, 5030.0, 5060.0]
+    assert list(arrays['eth0_in']) == [0.0, 8.0, 16.0]
+
+    rows = list(plotter_kafka.KafkaTelemetryConsumer('127.0.0.1:9092').fetch(threshold_days=1, filter_host='host'))
+    assert [row['net'] for row in rows] == [{}, {'eth0': {'in': 16.0, 'out': 0.0}}, {'eth0': {'in': 16.0, 'out': 0.0}}]
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from multiprocessing import get_context
+from time import time
+
+import Kafka as plotter_kafka
+from Rollup import hourly_sums
+from app.Codec import DeltaEncoder, encode
+from fakes import FakeConsumer, FakeMessage
+
+
+@pytest.fixture(scope='function')
+def consumer_object(monkeypatch):
+    def build(messages: list, **kwargs) -> plotter_kafka.KafkaTelemetryConsumer:
+        monkeypatch.setattr(plotter_kafka, 'Consumer', lambda config: FakeConsumer(config, messages))
+        return plotter_kafka.KafkaTelemetryConsumer('127.0.0.1:9092', **kwargs)
+    return build
+
+
+def message(host: str, value: dict, timestamp: int, offset: int, encoding: str = 'binary') -> FakeMessage:
+    return FakeMessage('telemetry', encode(value, encoding), host.encode(), timestamp, offset=offset)
+
+
+def late_keyframe_test(consumer_object):
+    start = int((time() - 600) * 10 ** 3)
+    encoder = DeltaEncoder(keyframe_every=10)
+    keyframe = encoder.frame({'cpu': {'usage': 1.0}, 'ram': {'usage': 50.0}}, start)
+    delta = encoder.frame({'cpu': {'usage': 2.0}, 'ram': {'usage': 50.0}}, start + 60000)
+
+    messages = [  # keyframe replayed from the spool, after the delta
+        message('host', delta, start + 60000, 0),
+        message('host', keyframe, start, 1),
+    ]
+
+    columns = consumer_object(messages).fetch_hosts(threshold_days=1)['host'].arrays()
+    assert list(columns['epoch']) == [start / 10 ** 3, start / 10 ** 3 + 60]
+    assert list(columns['cpu']) == [1.0, 2.0]
+
+    rows = list(consumer_object(messages).fetch(threshold_days=1, filter_host='host'))
+    assert [(row['id'], row['cpu']) for row in rows] == [(1.0, 1.0), (0.0, 2.0)]
+
+
+@pytest.mark.parametrize('margin, expected', ((600, []), (1200, [2.0]), (None, [2.0])))
+def keyframe_margin_test(consumer_object, margin, expected):
+    since = int((time() - 86400) * 10 ** 3)
+    encoder = DeltaEncoder(keyframe_every=20)
+    keyframe = encoder.frame({'cpu': {'usage': 1.0}}, since - 900000)  # 15 minutes before the window
+    delta = encoder.frame({'cpu': {'usage': 2.0}}, since + 60000)
+
+    messages = [message('host', keyframe, since - 900000, 0), message('host', delta, since + 60000, 1)]
+    consumer = consumer_object(messages, keyframe_margin_sec=margin)
+
+    columns = consumer.fetch_hosts(threshold_days=1).get('host')
+    assert (list(columns.arrays()['cpu']) if columns else []) == expected
+
+
+def fetch_hourly_parallel_test(consumer_object, monkeypatch):
+    monkeypatch.setattr(plotter_kafka, 'WORKERS_CONTEXT', get_context('fork'))  # workers inherit the fake consumer
+    start = int((time() - 7200) * 10 ** 3)
+    messages = [
+        message(f'host{i % 2}', {'cpu': {'usage': float(i)}, 'net': {'eth0': {'in': 10.0 * i, 'out': 1.0 * i}}},
+                start + i * 30000, i, encoding='json')
+        for i in range(200)
+    ]
+    samples = {'host0': {'eth0_in': [start / 10 ** 3 - 60, 0.0]}}
+
+    buffered = consumer_object(messages).fetch_hosts_parallel(threshold_days=1, workers=2)
+    consumer = consumer_object(messages)
+    aggregated = consumer.fetch_hourly_parallel(threshold_days=1, samples=samples, workers=2)
+
+    assert sorted(aggregated) == ['host0', 'host1'] and consumer.consumed == 200
+    assert consumer.available_hosts == {'host0', 'host1'}
+
+    for host, (sums, last) in aggregated.items():
+        expected_sums, expected_last = hourly_sums(buffered[host].arrays(), previous=samples.get(host))
+        assert last == expected_last
+        assert sums.keys() == expected_sums.keys()
+        assert all(np.array_equal(sums[name], expected_sums[name]) for name in sums)
+        assert sums['count'].sum() == 100
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from Rates import RateEngine, last_samples, rates
+
+nan = np.nan
+
+
+@pytest.fixture(scope='function')
+def columns_var() -> dict:
+    return {
+        'epoch': np.array([0.0, 60.0, 120.0, 180.0]),
+        'clock': np.full(4, nan),
+        'cpu': np.array([1.0, 2.0, 3.0, 4.0]),
+        'ram': np.array([5.0, 5.0, 5.0, 5.0]),
+        'eth0_in': np.array([100.0, 200.0, 50.0, 150.0]),  # reset (i.e.: reboot or wrap) before the third sample
+        'eth1_in': np.array([nan, 10.0, 20.0, nan]),  # appears, then disappears
+        'eth2_in': np.array([5.0, nan, 25.0, 35.0]),  # missing from one message
+    }
+
+
+def rates_test(columns_var):
+    res = rates(columns_var)
+
+    assert list(res['cpu']) == [1.0, 2.0, 3.0, 4.0]
+    assert list(res['eth0_in']) == [0.0, 100.0, 50.0, 100.0]  # computed from zero after the reset
+    assert list(res['eth1_in']) == [0.0, 0.0, 10.0, 0.0]
+    assert list(res['eth2_in']) == [0.0, 0.0, 10.0, 10.0]  # over the 2 minutes since its previous sample
+
+
+def rates_clock_test(columns_var):
+    columns_var['clock'] = np.array([1000.0, 1030.0, 10.0, 40.0])  # sampled every 30 seconds, rebooted
+
+    res = rates(columns_var)
+
+    assert list(res['eth0_in']) == [0.0, 200.0, 50.0, 200.0]  # message interval across the reboot
+
+
+def rates_clock_past_previous_test(columns_var):
+    columns_var['clock'] = np.array([1000.0, 1030.0, 2000.0, 2030.0])  # rebooted, uptime grew past the old clock
+    columns_var['eth0_in'] = np.array([100.0, 200.0, 300.0, 400.0])
+
+    res = rates(columns_var)
+
+    assert list(res['eth0_in']) == [0.0, 200.0, 300.0, 200.0]  # computed from zero, over the message interval
+
+
+def rates_previous_test(columns_var):
+    res = rates(columns_var, previous={'eth0_in': (-60.0, 50.0), 'eth1_in': (-60.0, 5.0)})
+
+    assert res['eth0_in'][0] == 50.0
+    assert list(res['eth1_in']) == [0.0, 2.5, 10.0, 0.0]  # over the 2 minutes since the previous sample
+
+
+def rates_across_batches_test(columns_var):
+    first = {name: column[:2] for name, column in columns_var.items()}
+    second = {name: column[2:] for name, column in columns_var.items()}
+
+    expected = rates(columns_var)
+    res = rates(second, previous=last_samples(first))
+
+    for name in ('eth0_in', 'eth1_in', 'eth2_in'):
+        assert list(res[name]) == list(expected[name][2:])
+
+
+def last_samples_test(columns_var):
+    assert last_samples(columns_var) == {
+        'eth0_in': (180.0, 150.0),
+        'eth1_in': (120.0, 20.0),
+        'eth2_in': (180.0, 35.0),
+    }
+    assert last_samples({name: column[:1] for name, column in columns_var.items()}) == {
+        'eth0_in': (0.0, 100.0),
+        'eth2_in': (0.0, 5.0),
+    }
+
+
+def engine_update_test():
+    engine = RateEngine()
+
+    assert engine.update('host', 0, {'eth0': {'in': 100, 'out': 10}}) == {}
+    assert engine.update('host', 60, {'eth0': {'in': 200, 'out': 20}, 'eth1': {'in': 5, 'out': 5}}) == {
+        'eth0': {'in': 100.0, 'out': 10.0},  # eth1 is new
+    }
+    assert engine.update('host', 120, {'eth0': {'in': 50, 'out': 30}}) == {
+        'eth0': {'in': 50.0, 'out': 10.0},  # computed from zero after the reset of 'in'
+    }
+    assert engine.update('host', 180, {'eth1': {'in': 25, 'out': 5}}) == {
+        'eth1': {'in': 10.0, 'out': 0.0},  # over the 2 minutes since its previous sample
+    }
+
+    assert engine.update('host', 90, {'eth0': {'in': 1000, 'out': 1000}}) == {}  # older than the previous sample
+    assert engine.update('other', 240, {'eth0': {'in': 1, 'out': 1}}) == {}  # rates are kept per host
+    assert engine.update('host', 240, {'eth0': {'in': 'n/a', 'out': 40}}) == {}
+
+
+def engine_update_clock_test():
+    engine = RateEngine()
+
+    engine.update('host', 0, {'eth0': {'in': 0, 'out': 0}}, clock=1000.0, units='bytes')
+    res = engine.update('host', 60, {'eth0': {'in': 1000000, 'out': 0}}, clock=1030.0, units='bytes')
+
+    assert res == {'eth0': {'in': 16.0, 'out': 0.0}}  # 8 megabits over the 30 seconds between samples
+    assert engine.update('host', 120, {'eth0': {'in': 2000000, 'out': 0}}, clock=1090.0, units='packets') == {}
+
+
+def engine_update_rebooted_test():
+    engine = RateEngine()
+
+    engine.update('host', 0, {'eth0': {'in': 100, 'out': 0}}, clock=1000.0)
+    res = engine.update('host', 60, {'eth0': {'in': 300, 'out': 0}}, clock=5000.0)  # rebooted, uptime grew past
+
+    assert res == {'eth0': {'in': 300.0, 'out': 0.0}}  # computed from zero, over the message interval
+    res = engine.update('host', 120, {'eth0': {'in': 400, 'out': 0}}, clock=5030.0)
+    assert res == {'eth0': {'in': 200.0, 'out': 0.0}}
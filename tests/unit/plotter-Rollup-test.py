@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from Rollup import HOUR, RollupStore, hourly_sums
+
+START = 1700000000 // HOUR * HOUR
+
+
+def columns(minutes: range, eth0_in: float = 0.0) -> dict:
+    epoch = np.array([START + minute * 60.0 for minute in minutes])
+    return {
+        'epoch': epoch,
+        'clock': np.full(len(epoch), np.nan),
+        'cpu': np.full(len(epoch), 10.0),
+        'ram': np.full(len(epoch), 50.0),
+        'eth0_in': np.array([eth0_in + minute for minute in minutes], dtype=np.float64),
+        'eth0_out': np.zeros(len(epoch)),
+    }
+
+
+@pytest.fixture(scope='function')
+def store_object(tmp_path) -> RollupStore:
+    return RollupStore(tmp_path / 'rollup')
+
+
+def resume_test(store_object):
+    store_object.update('host', columns(range(0, 30)), now=START)
+    store_object.save({('telemetry', 0): 30}, {'host': {1000: {'cpu': {'usage': 1.0}}}})
+
+    resumed = RollupStore(store_object.directory)
+    assert resumed.offsets == {('telemetry', 0): 30}
+    assert resumed.keyframes == {'host': {1000: {'cpu': {'usage': 1.0}}}}
+    assert tuple(resumed.samples['host']['eth0_in']) == (START + 29 * 60.0, 29.0)
+    assert resumed.hosts() == ['host']
+
+    resumed.update('host', columns(range(30, 90)), now=START)
+    resumed.save({('telemetry', 0): 90}, resumed.keyframes)
+
+    hourly = RollupStore(store_object.directory).hourly('host')
+    assert list(hourly['hour']) == [START, START + HOUR]
+    assert list(hourly['cpu']) == [10.0, 10.0]
+    assert hourly['eth0_in'][1] == 1.0  # rates continued across runs, one counter per minute
+    assert sorted(path.name for path in store_object.directory.glob('*.npz')) == ['host.2.npz']
+
+
+def interrupted_save_test(store_object, monkeypatch):
+    store_object.update('host', columns(range(0, 30)), now=START)
+    store_object.save({('telemetry', 0): 30}, {})
+
+    def crash(self, state: dict):
+        raise OSError('interrupted')
+
+    interrupted = RollupStore(store_object.directory)
+    interrupted.update('host', columns(range(30, 60)), now=START)
+    monkeypatch.setattr(RollupStore, '_write_state', crash)
+    with pytest.raises(OSError):
+        interrupted.save({('telemetry', 0): 60}, {})
+    monkeypatch.undo()
+
+    rerun = RollupStore(store_object.directory)  # the same messages consumed again, from the saved offsets
+    assert rerun.offsets == {('telemetry', 0): 30}
+    assert sorted(path.name for path in store_object.directory.glob('*.npz')) == ['host.1.npz']
+
+    rerun.update('host', columns(range(30, 60)), now=START)
+    rerun.save({('telemetry', 0): 60}, {})
+
+    with np.load(store_object.directory / rerun.rollups['host']) as npz:
+        assert list(npz['count']) == [60.0]  # not counted twice
+
+
+def legacy_rollups_test(store_object):
+    np.savez(store_object.directory / 'host.npz', hour=np.array([START]), count=np.array([2.0]), cpu=np.array([4.0]))
+
+    store = RollupStore(store_object.directory)
+    assert store.hosts() == ['host']
+    assert list(store.hourly('host')['cpu']) == [2.0]
+
+    store.update('host', columns(range(0, 2)), now=START)
+    store.save({}, {})
+    assert list(store.hourly('host')['cpu']) == [(4.0 + 20.0) / 4]
+    assert not (store_object.directory / 'host.npz').exists()
+
+
+def hourly_sums_test(store_object):
+    sums, samples = hourly_sums(columns(list(range(0, 90)) + [89], eth0_in=1.0), previous={'eth0_in': (START - 60.0, 0.0)})
+
+    assert list(sums['hour']) == [START, START + HOUR]
+    assert list(sums['count']) == [60.0, 30.0]  # the duplicate of the last message counted once
+    assert sums['eth0_in'][0] == 60.0 and sums['cpu'][1] == 300.0
+    assert samples['eth0_in'] == (START + 89 * 60.0, 90.0)
+
+    store_object.add('host', sums, samples, now=START)
+    assert store_object.samples['host'] is samples
+    assert list(store_object.hourly('host')['eth0_in']) == [1.0, 1.0]
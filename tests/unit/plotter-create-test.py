@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('matplotlib')  # plotter requirement, see src/plotter/requirements.txt
+create = pytest.importorskip('create')
+
+HOUR = 3600
+
+
+@pytest.fixture(scope='function')
+def columns_var() -> dict:
+    epoch = np.array([0.0, 60.0, 60.0, HOUR, HOUR + 60.0])  # a duplicate, as replayed from a spool
+    return {
+        'epoch': epoch,
+        'clock': np.full(len(epoch), np.nan),
+        'cpu': np.array([10.0, 20.0, 20.0, 30.0, 40.0]),
+        'ram': np.full(len(epoch), 50.0),
+        'eth0_in': np.array([0.0, 6.0, 6.0, 10.0, 16.0]),
+        'eth0_out': np.array([0.0, 1.0, 1.0, 2.0, 3.0]),
+    }
+
+
+def frame_test(columns_var):
+    df = create.frame(columns_var)
+
+    assert len(df) == 4
+    assert list(df['moment'].astype('int64') // 10 ** 9) == [0, 60, HOUR, HOUR + 60]
+    assert list(df['hour'].astype('int64') // 10 ** 9) == [0, 0, HOUR, HOUR]
+    assert list(df['eth0_in'])[-1] == 6.0  # rates per minute, not counters
+
+
+def frame_hourly_test():
+    df = create.frame_hourly({'hour': np.array([0, HOUR]), 'cpu': np.array([15.0, 35.0])})
+    assert list(df['hour'].astype('int64') // 10 ** 9) == [0, HOUR]
+
+
+def render_test(columns_var, tmp_path, capsys):
+    create.render('host', columns_var, 'eth0', tmp_path)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['networking.host.png', 'usage.host.png']
+
+    create.render('other', columns_var, 'wlan0', tmp_path)
+    assert (tmp_path / 'usage.other.png').is_file() and not (tmp_path / 'networking.other.png').exists()
+    assert "No 'wlan0' data from other" in capsys.readouterr().out
+
+
+def render_hourly_test(tmp_path):
+    hourly = {'hour': np.array([0, HOUR]), 'cpu': np.array([15.0, 35.0]), 'ram': np.array([50.0, 50.0]),
+              'eth0_in': np.array([1.0, 2.0]), 'eth0_out': np.array([0.5, 1.0])}
+
+    create.render('host', hourly, 'eth0', tmp_path, hourly=True)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['networking.host.png', 'usage.host.png']